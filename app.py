@@ -1,47 +1,17 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, Response, stream_with_context
 import os
 from dotenv import load_dotenv
-from models import db, Course, Student, Enrollment
-from ml_service import recommender
+from models import db, Course, Student, Enrollment, IN_QUERY_CHUNK
+from ml_service import recommender, DEFAULT_SEMESTER_CREDIT_LIMIT
 from deepseek_service import chat_service
-import requests
-from bs4 import BeautifulSoup
-import re
+from http_client import pool_metrics
+from migrations import configure_database, migrate
+import crawler_service
+import crawl_jobs
 import json
+import uuid
 from flask_cors import CORS
 
-# 标记是否使用模拟模式（不依赖外部库）
-SIMULATION_MODE = True
-CV_IMPORTS_SUCCESSFUL = False
-
-# 只在非模拟模式下尝试导入计算机视觉和OCR爬虫所需的库
-if not SIMULATION_MODE:
-    try:
-        import time
-        import cv2
-        import numpy as np
-        from selenium import webdriver
-        from selenium.webdriver.chrome.service import Service
-        from selenium.webdriver.chrome.options import Options
-        from selenium.webdriver.common.by import By
-        from webdriver_manager.chrome import ChromeDriverManager
-        from PIL import Image
-        import pytesseract
-        import io
-        
-        # 配置Tesseract OCR路径（Windows环境需要）
-        import platform
-        if platform.system() == 'Windows':
-            pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-        
-        CV_IMPORTS_SUCCESSFUL = True
-        print("计算机视觉和OCR库导入成功")
-    except ImportError as e:
-        CV_IMPORTS_SUCCESSFUL = False
-        print(f"计算机视觉和OCR库导入失败: {str(e)}")
-else:
-    print("运行在模拟模式，不加载计算机视觉库")
-
 # Load environment variables at the start
 load_dotenv()
 
@@ -53,9 +23,11 @@ print("All environment variables:", list(os.environ.keys()))  # 打印所有环
 # Initialize Flask app
 app = Flask(__name__)
 
-# 确保数据库使用内存模式
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 数据库使用磁盘文件（默认 instance/studypath.db，WAL模式）或 DATABASE_URI 指定的数据库，带连接池
+configure_database(app)
+
+# 批量推荐接口单次最多接受的学生数
+RECOMMENDATION_BATCH_MAX = int(os.getenv('RECOMMENDATION_BATCH_MAX', 10000))
 
 # 添加CORS支持
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -63,46 +35,46 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # Initialize database
 db.init_app(app)
 
-# 定义一个数据库初始化函数
-def init_database():
-    with app.app_context():
-        db.create_all()
-        print("Database tables created successfully.")
-        
-        # 这里添加数据库种子数据（不再从 seed_db.py 导入）
-        from models import Course, Student
-        
-        # 添加课程
-        courses = [
-            Course(code="CS101", name="Introduction to Computer Science", credits=3, description="Basic concepts of computer science"),
-            Course(code="CS201", name="Data Structures", credits=4, description="Advanced data structures and algorithms"),
-            Course(code="MATH101", name="Calculus I", credits=4, description="Introduction to calculus"),
-            # 添加更多课程...
-        ]
-        
-        # 添加学生
-        students = [
-            Student(username="Alice Smith", email="alice@example.com", major="Computer Science"),
-            Student(username="Bob Johnson", email="bob@example.com", major="Mathematics"),
-            # 添加更多学生...
-        ]
-        
-        # 将数据添加到数据库
-        for course in courses:
-            existing = Course.query.filter_by(code=course.code).first()
-            if not existing:
-                db.session.add(course)
-        
-        for student in students:
-            existing = Student.query.filter_by(email=student.email).first()
-            if not existing:
-                db.session.add(student)
-        
-        db.session.commit()
-        print("Database seeded successfully!")
-
-# 初始化数据库
-init_database()
+# 应用尚未执行的数据库迁移（多个worker同时启动时只有一个会执行，种子数据不会重复添加）
+migrate(app)
+
+# 恢复上次进程退出时未完成的批量爬取任务
+crawl_jobs.manager.resume_incomplete()
+
+def resolve_session_id(data):
+    """返回请求中的session_id（未提供时创建新会话）；格式无效时返回None"""
+    session_id = data.get('session_id') or str(uuid.uuid4())
+    if not isinstance(session_id, str) or len(session_id) > 128:
+        return None
+    return session_id
+
+def is_code_list(value):
+    """课程代码列表：list，且每一项都是字符串"""
+    return isinstance(value, list) and all(isinstance(code, str) for code in value)
+
+def courses_by_code(codes):
+    """课程代码 -> 序列化的课程（一次数据库查询）；数据库不可用时返回空字典"""
+    try:
+        return {course["code"]: course
+                for course in Course.serialize_many(Course.query.filter(Course.code.in_(sorted(set(codes)))).all())}
+    except Exception as e:
+        print(f"Error fetching courses from database: {str(e)}")
+        return {}
+
+def recommendation_objects(codes, courses):
+    """按推荐顺序返回课程对象；数据库中找到任何课程时只返回这些课程，否则返回简单的课程代码列表"""
+    found = [courses[code] for code in codes if code in courses]
+    return found or [{"code": code, "name": f"Course {code}", "credits": 3} for code in codes]
+
+def progress_summary(credits_by_status):
+    """按状态汇总的学分 -> 学习进度"""
+    total_credits = sum(credits_by_status.values())
+    completed_credits = credits_by_status.get("completed", 0)
+    return {
+        "total_credits": total_credits,
+        "completed_credits": completed_credits,
+        "completion_percentage": (completed_credits / total_credits * 100) if total_credits > 0 else 0
+    }
 
 @app.route('/')
 def index():
@@ -110,12 +82,28 @@ def index():
 
 @app.route('/api/health')
 def health_check():
-    return jsonify({"status": "healthy"})
+    # 进程本身可用即返回200；DeepSeek不可用时标记为degraded（聊天会使用备用响应）
+    deepseek = chat_service.health_report()
+    status = "degraded" if deepseek["status"] == "unhealthy" else "healthy"
+    return jsonify({"status": status, "deepseek": deepseek})
+
+@app.route('/api/metrics')
+def metrics():
+    """上游HTTP连接池、会话存储和各缓存的运行指标"""
+    return jsonify({
+        "http_pools": pool_metrics(),
+        "chat_sessions": chat_service.conversations.stats(),
+        "response_cache": chat_service.response_cache.stats(),
+        "crawl_cache": crawler_service.program_cache.stats(),
+        "crawl_jobs": crawl_jobs.manager.stats(),
+        "browser_pool": crawler_service.browser_pool.stats() if crawler_service.browser_pool else None,
+        "recommender": recommender.update_stats()
+    })
 
 @app.route('/api/courses')
 def get_courses():
     courses = Course.query.all()
-    return jsonify([course.to_dict() for course in courses])
+    return jsonify(Course.serialize_many(courses, all_courses=True))
 
 @app.route('/api/crawl-program', methods=['POST'])
 def crawl_program():
@@ -123,220 +111,8 @@ def crawl_program():
     if not data or 'url' not in data:
         return jsonify({"error": "URL is required"}), 400
     
-    url = data['url']
-    
-    # 不再检查API密钥，直接尝试爬取
-    try:
-        print(f"尝试爬取URL: {url}")
-        # 使用更友好的请求头，模拟浏览器
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5'
-        }
-        
-        # Fetch the webpage content
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()  # Raise an exception for 4XX/5XX responses
-        
-        print(f"成功获取网页内容，长度: {len(response.text)}")
-        
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 提取所有文本内容，用于更全面的分析
-        all_text = soup.get_text()
-        print(f"提取的文本内容长度: {len(all_text)}")
-        
-        # Extract program information
-        program_info = {
-            "title": "",
-            "description": "",
-            "courses": [],
-            "requirements": [],
-            "credits": "",
-            "raw_text_sample": all_text[:1000]  # 添加原始文本样本用于调试
-        }
-        
-        # 尝试多种方式提取标题
-        title_candidates = []
-        # 方法1: 常见标题标签
-        for tag in ['h1', 'h2', 'h3']:
-            elements = soup.find_all(tag)
-            for el in elements:
-                title_text = el.get_text().strip()
-                if len(title_text) > 5 and len(title_text) < 100:  # 合理的标题长度
-                    title_candidates.append(title_text)
-        
-        # 方法2: 包含"program"、"degree"、"major"等关键词的元素
-        for keyword in ['program', 'degree', 'major', 'bachelor', 'master', 'computer science', 'curriculum']:
-            elements = soup.find_all(string=re.compile(keyword, re.IGNORECASE))
-            for el in elements:
-                if el.parent.name in ['h1', 'h2', 'h3', 'h4', 'strong', 'b', 'div', 'p']:
-                    title_text = el.parent.get_text().strip()
-                    if len(title_text) > 5 and len(title_text) < 100:  # 合理的标题长度
-                        title_candidates.append(title_text)
-        
-        # 选择最可能的标题
-        if title_candidates:
-            program_info["title"] = title_candidates[0]
-            print(f"找到标题: {program_info['title']}")
-        
-        # 提取课程信息 - 使用多种模式
-        course_patterns = [
-            r'[A-Z]{2,4}\s*\d{3,4}[A-Z]?',  # 如 CS101, MATH101A
-            r'[A-Z]{2,4}\s*\d{3,4}[A-Z]?\s*[-:]\s*[A-Za-z\s]+',  # 如 CS101 - Introduction to Programming
-            r'[A-Za-z\s]+\s*\(\s*[A-Z]{2,4}\s*\d{3,4}[A-Z]?\s*\)'  # 如 Introduction to Programming (CS101)
-        ]
-        
-        all_courses = []
-        for pattern in course_patterns:
-            # 在文本中查找
-            matches = re.findall(pattern, all_text)
-            if matches:
-                for match in matches:
-                    match = match.strip()
-                    if match not in all_courses and len(match) > 3:
-                        all_courses.append(match)
-        
-        # 限制课程数量
-        program_info["courses"] = all_courses[:20]  # 最多20门课程
-        print(f"找到课程数量: {len(program_info['courses'])}")
-        
-        # 如果没有找到课程，尝试查找列表项
-        if not program_info["courses"]:
-            list_items = soup.find_all('li')
-            for item in list_items:
-                item_text = item.get_text().strip()
-                # 如果列表项看起来像课程（包含数字和字母）
-                if re.search(r'\d+', item_text) and len(item_text) > 10 and len(item_text) < 200:
-                    program_info["courses"].append(item_text)
-                    if len(program_info["courses"]) >= 20:
-                        break
-        
-        # 提取学分要求
-        credit_patterns = [
-            r'\d+\s*credits',
-            r'\d+\s*credit\s*hours',
-            r'total\s*of\s*\d+\s*credits',
-            r'minimum\s*of\s*\d+\s*credits',
-            r'requires\s*\d+\s*credits'
-        ]
-        
-        for pattern in credit_patterns:
-            matches = re.findall(pattern, all_text, re.IGNORECASE)
-            if matches:
-                program_info["credits"] = matches[0]
-                print(f"找到学分要求: {program_info['credits']}")
-                break
-        
-        # 提取描述 - 尝试找到介绍段落
-        desc_candidates = []
-        
-        # 查找包含关键词的段落
-        for keyword in ['overview', 'introduction', 'about', 'description', 'program', 'curriculum']:
-            elements = soup.find_all(string=re.compile(keyword, re.IGNORECASE))
-            for el in elements:
-                if el.parent.name == 'p':
-                    desc_text = el.parent.get_text().strip()
-                    if len(desc_text) > 50:  # 只考虑较长的段落
-                        desc_candidates.append(desc_text)
-                elif el.parent.parent and el.parent.parent.name == 'p':
-                    desc_text = el.parent.parent.get_text().strip()
-                    if len(desc_text) > 50:
-                        desc_candidates.append(desc_text)
-        
-        # 如果没有找到，使用前几个段落
-        if not desc_candidates:
-            paragraphs = soup.find_all('p')
-            for p in paragraphs[:5]:
-                p_text = p.get_text().strip()
-                if len(p_text) > 50:  # 只考虑较长的段落
-                    desc_candidates.append(p_text)
-        
-        if desc_candidates:
-            program_info["description"] = desc_candidates[0]
-            print(f"找到描述: {program_info['description'][:100]}...")
-        
-        # 提取要求
-        req_candidates = []
-        req_keywords = ['requirement', 'prerequisite', 'admission', 'criteria', 'eligibility']
-        
-        for keyword in req_keywords:
-            elements = soup.find_all(string=re.compile(keyword, re.IGNORECASE))
-            for el in elements:
-                parent = el.parent
-                # 尝试获取包含要求的段落或列表
-                if parent.name == 'p':
-                    req_candidates.append(parent.get_text().strip())
-                elif parent.name in ['li', 'div']:
-                    req_candidates.append(parent.get_text().strip())
-                # 尝试获取父元素后的列表项
-                next_ul = parent.find_next('ul')
-                if next_ul:
-                    for li in next_ul.find_all('li'):
-                        req_text = li.get_text().strip()
-                        if len(req_text) > 10:
-                            req_candidates.append(req_text)
-        
-        # 限制要求数量
-        program_info["requirements"] = req_candidates[:10]  # 最多10个要求
-        
-        # 如果仍然没有找到足够的信息，使用默认值
-        if not program_info["title"]:
-            program_info["title"] = "Computer Science Program"
-            print("未找到标题，使用默认值")
-        
-        if not program_info["description"]:
-            program_info["description"] = "A comprehensive program covering fundamental and advanced topics in computer science."
-            print("未找到描述，使用默认值")
-        
-        if not program_info["courses"]:
-            print("未找到课程信息，使用默认数据")
-            program_info["courses"] = [
-                "Introduction to Computer Science - CS101",
-                "Data Structures - CS201",
-                "Algorithms - CS301",
-                "Database Systems - CS401",
-                "Software Engineering - CS501"
-            ]
-        
-        if not program_info["credits"]:
-            program_info["credits"] = "120 credits required for graduation"
-            print("未找到学分要求，使用默认值")
-        
-        return jsonify(program_info)
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching URL: {str(e)}")
-        return jsonify({
-            "error": f"Failed to fetch URL: {str(e)}",
-            "title": "Computer Science Program",
-            "description": "A comprehensive program covering fundamental and advanced topics in computer science.",
-            "courses": [
-                "Introduction to Computer Science - CS101",
-                "Data Structures - CS201",
-                "Algorithms - CS301",
-                "Database Systems - CS401",
-                "Software Engineering - CS501"
-            ],
-            "credits": "120 credits required for graduation"
-        }), 200  # 返回200而不是500，这样前端仍然可以继续
-    except Exception as e:
-        print(f"Error processing webpage: {str(e)}")
-        return jsonify({
-            "error": f"Error processing webpage: {str(e)}",
-            "title": "Computer Science Program",
-            "description": "A comprehensive program covering fundamental and advanced topics in computer science.",
-            "courses": [
-                "Introduction to Computer Science - CS101",
-                "Data Structures - CS201",
-                "Algorithms - CS301",
-                "Database Systems - CS401",
-                "Software Engineering - CS501"
-            ],
-            "credits": "120 credits required for graduation"
-        }), 200  # 返回200而不是500，这样前端仍然可以继续
+    payload, status = crawler_service.crawl_program(data['url'])
+    return jsonify(payload), status
 
 @app.route('/api/recommendations', methods=['POST'])
 def get_recommendations():
@@ -351,21 +127,122 @@ def get_recommendations():
         'gpa': data.get('gpa', 3.0)
     }
     
-    # 调用推荐器
+    # 调用推荐器（与批量接口共用同一实现）
     recommendations = recommender.recommend_courses(student_data)
+    return jsonify(recommendation_objects(recommendations, courses_by_code(recommendations)))
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+def get_recommendations_batch():
+    """Recommendations for a whole cohort, streamed back as NDJSON
+    
+    Body: {"students": [{"major": ..., "completed_courses": [...], "student_id": ...}, ...]}
+    Each output line is {"index": i, "student_id": ..., "recommendations": [...]} in input order,
+    with the same course objects /api/recommendations returns.
+    """
+    data = request.json
+    students = data.get('students') if isinstance(data, dict) else None
+    if not isinstance(students, list) or not students:
+        return jsonify({"error": "students must be a non-empty list"}), 400
+    if len(students) > RECOMMENDATION_BATCH_MAX:
+        return jsonify({"error": f"At most {RECOMMENDATION_BATCH_MAX} students per batch"}), 400
+    if not all(isinstance(s, dict) for s in students):
+        return jsonify({"error": "Each student must be an object"}), 400
+    
+    # 一次向量化计算全部学生的推荐
+    batch = recommender.recommend_courses_batch(students)
+    
+    # 所有推荐课程只查询一次数据库，每门课程只序列化一次
+    courses = courses_by_code([code for codes in batch for code in codes])
+    
+    def generate():
+        for i, (student, codes) in enumerate(zip(students, batch)):
+            yield json.dumps({
+                "index": i,
+                "student_id": student.get('student_id'),
+                "recommendations": recommendation_objects(codes, courses)
+            }) + "\n"
     
-    # 如果recommendations是课程代码列表，尝试获取完整课程信息
-    if recommendations and isinstance(recommendations[0], str):
-        # 尝试从数据库获取课程信息
-        try:
-            recommended_courses = Course.query.filter(Course.code.in_(recommendations)).all()
-            if recommended_courses:
-                return jsonify([course.to_dict() for course in recommended_courses])
-        except Exception as e:
-            print(f"Error fetching courses from database: {str(e)}")
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/recommender/students', methods=['POST'])
+def update_recommender_students():
+    """在线新增或更新学生记录（例如选课完成后），几秒内反映到推荐结果中，无需重新训练
+    
+    Body: {"students": [{"student_id": 1, "major": "CS", "semester": 3, "gpa": 3.4,
+                         "completed_courses": [...], "grades": {...}}, ...]}
+    """
+    data = request.json
+    students = data.get('students') if isinstance(data, dict) else None
+    if not isinstance(students, list) or not students:
+        return jsonify({"error": "students must be a non-empty list"}), 400
+    if not all(isinstance(s, dict) for s in students):
+        return jsonify({"error": "Each student must be an object"}), 400
     
-    # 如果无法从数据库获取，或者推荐不是课程代码列表，返回简单的课程代码列表
-    return jsonify([{"code": code, "name": f"Course {code}", "credits": 3} for code in recommendations])
+    try:
+        pending = recommender.upsert_students(students)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"updated": len(students), "pending_updates": pending})
+
+@app.route('/api/plan', methods=['POST'])
+def plan_degree():
+    """Semester-by-semester plan to graduation, computed from the prerequisite graph
+    
+    Body: {"major": "CS", "completed_courses": [...], "credit_limit": 16, "start_term": "Fall 2025",
+           "required_courses": [...]}  (required_courses defaults to every course of the major)
+    """
+    data = request.json
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    
+    required = data.get('required_courses')
+    if required is not None and not is_code_list(required):
+        return jsonify({"error": "required_courses must be a list of course codes"}), 400
+    completed = data.get('completed_courses', [])
+    if not is_code_list(completed):
+        return jsonify({"error": "completed_courses must be a list of course codes"}), 400
+    major = data.get('major', 'CS')
+    if not isinstance(major, str):
+        return jsonify({"error": "major must be a string"}), 400
+    required = required or recommender.degree_requirements(major)
+    if not required:
+        return jsonify({"error": "Unknown major"}), 400
+    credit_limit = data.get('credit_limit', DEFAULT_SEMESTER_CREDIT_LIMIT)
+    if not isinstance(credit_limit, int) or isinstance(credit_limit, bool) or credit_limit <= 0:
+        return jsonify({"error": "credit_limit must be a positive integer"}), 400
+    
+    # 课程学分从数据库一次查出；数据库中没有的课程使用默认学分
+    credits = {}
+    try:
+        pending = recommender.planner.pending_courses(required, completed)
+        credits = dict(db.session.query(Course.code, Course.credits).filter(Course.code.in_(pending)).all())
+    except Exception as e:
+        print(f"Error fetching course credits from database: {str(e)}")
+    
+    try:
+        plan = recommender.planner.plan(required, completed, credit_limit=credit_limit, credits=credits,
+                                        start_term=data.get('start_term'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(plan)
+
+@app.route('/api/students/visualization')
+def student_visualization():
+    """学生数据可视化PNG；同一模型版本的图片不变，用模型版本作为ETag"""
+    etag = recommender.model_version
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    
+    png = recommender.visualization_png()
+    if png is None:
+        # 后台仍在绘制
+        return jsonify({"status": "rendering"}), 202, {'Retry-After': '5'}
+    
+    response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -374,12 +251,45 @@ def chat():
         return jsonify({"error": "No message provided"}), 400
     
     message = data['message']
-    response = chat_service.send_message(message)
+    # 每个会话单独保存历史；未提供session_id时创建新会话并返回给客户端
+    session_id = resolve_session_id(data)
+    if session_id is None:
+        return jsonify({"error": "Invalid session_id"}), 400
+    
+    response = chat_service.send_message(message, session_id=session_id)
     
     if response is None:
         return jsonify({"error": "Failed to get response from API"}), 500
     
-    return jsonify({"response": response})
+    return jsonify({"response": response, "session_id": session_id})
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """与 /api/chat 相同的请求格式，但以server-sent events逐段返回回复"""
+    data = request.json
+    if not data or 'message' not in data:
+        return jsonify({"error": "No message provided"}), 400
+    
+    message = data['message']
+    session_id = resolve_session_id(data)
+    if session_id is None:
+        return jsonify({"error": "Invalid session_id"}), 400
+    
+    def generate():
+        # 先发送会话ID，客户端可用于后续请求
+        yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        for chunk in chat_service.stream_message(message, session_id=session_id):
+            yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁止反向代理缓冲
+        }
+    )
 
 @app.route('/api/feedback', methods=['POST'])
 def submit_feedback():
@@ -392,269 +302,92 @@ def submit_feedback():
 
 @app.route('/api/student/<int:student_id>/progress')
 def get_student_progress(student_id):
-    student = Student.query.get_or_404(student_id)
-    enrollments = Enrollment.query.filter_by(student_id=student_id).all()
+    Student.query.get_or_404(student_id)
     
-    total_credits = sum(e.course.credits for e in enrollments)
-    completed_credits = sum(e.course.credits for e in enrollments if e.status == "completed")
+    # 学分在数据库中按状态汇总，不再逐条加载选课记录和课程
+    credits_by_status = Enrollment.credit_totals([student_id])[student_id]
+    return jsonify(progress_summary(credits_by_status))
+
+@app.route('/api/students/progress', methods=['POST'])
+def get_students_progress():
+    """多个学生的学习进度（用于仪表盘），一次请求只需两次查询
     
+    Body: {"student_ids": [1, 2, ...]}; returns {"progress": {"<id>": {...}}, "missing": [ids not found]}
+    """
+    data = request.json
+    student_ids = data.get('student_ids') if isinstance(data, dict) else None
+    if not isinstance(student_ids, list) or not student_ids:
+        return jsonify({"error": "student_ids must be a non-empty list"}), 400
+    if len(student_ids) > RECOMMENDATION_BATCH_MAX:
+        return jsonify({"error": f"At most {RECOMMENDATION_BATCH_MAX} students per batch"}), 400
+    if not all(isinstance(i, int) for i in student_ids):
+        return jsonify({"error": "student_ids must be integers"}), 400
+    
+    student_ids = list(dict.fromkeys(student_ids))
+    existing = set()
+    for start in range(0, len(student_ids), IN_QUERY_CHUNK):
+        chunk = student_ids[start:start + IN_QUERY_CHUNK]
+        existing.update(i for (i,) in db.session.query(Student.id).filter(Student.id.in_(chunk)).all())
+    
+    found = [i for i in student_ids if i in existing]
+    totals = Enrollment.credit_totals(found)
     return jsonify({
-        "total_credits": total_credits,
-        "completed_credits": completed_credits,
-        "completion_percentage": (completed_credits / total_credits * 100) if total_credits > 0 else 0
+        "progress": {str(i): progress_summary(totals[i]) for i in found},
+        "missing": [i for i in student_ids if i not in existing]
     })
 
+@app.route('/api/crawl-jobs', methods=['POST'])
+def create_crawl_job():
+    """批量爬取项目页面（例如整个院系的课程目录），在后台运行
+    
+    Body: {"urls": [...]} or {"sitemap": "https://.../sitemap.xml"}
+    Returns 202 with the job id; poll /api/crawl-jobs/<id> for progress and read
+    /api/crawl-jobs/<id>/results for the per-URL results as NDJSON.
+    """
+    data = request.json
+    if not isinstance(data, dict) or ('urls' not in data and 'sitemap' not in data):
+        return jsonify({"error": "urls or sitemap is required"}), 400
+    
+    try:
+        job_id = crawl_jobs.manager.create_job(urls=data.get('urls'), sitemap=data.get('sitemap'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/api/crawl-jobs/{job_id}",
+        "results_url": f"/api/crawl-jobs/{job_id}/results"
+    }), 202
+
+@app.route('/api/crawl-jobs/<job_id>')
+def get_crawl_job(job_id):
+    """任务状态和进度（total、done、succeeded、failed、progress）"""
+    job = crawl_jobs.manager.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Crawl job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/crawl-jobs/<job_id>/results')
+def get_crawl_job_results(job_id):
+    """Per-URL results as NDJSON, in completion order, streamed until the job finishes
+    
+    Each line is {"index", "url", "status": "ok"|"error", "source", "program"|"error", "elapsed_ms"}.
+    ?offset=N skips the first N lines, so a client can reconnect where it stopped.
+    """
+    if crawl_jobs.manager.get_job(job_id) is None:
+        return jsonify({"error": "Crawl job not found"}), 404
+    offset = request.args.get('offset', 0, type=int)
+    return Response(stream_with_context(crawl_jobs.manager.stream_results(job_id, offset=max(offset, 0))),
+                    mimetype='application/x-ndjson')
+
 @app.route('/api/vision-crawler', methods=['POST'])
 def vision_crawler():
-    # 如果在模拟模式下或计算机视觉库导入失败
-    if SIMULATION_MODE or not CV_IMPORTS_SUCCESSFUL:
-        data = request.json
-        if not data or 'url' not in data:
-            return jsonify({"error": "URL is required"}), 400
-        
-        url = data['url']
-        print(f"模拟计算机视觉爬取URL: {url}")
-        
-        # 尝试获取网页内容（不使用Selenium和OCR）
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            # 使用BeautifulSoup解析HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            all_text = soup.get_text()
-            
-            # 提取标题
-            title = ""
-            for tag in ['h1', 'h2', 'h3']:
-                elements = soup.find_all(tag)
-                for el in elements:
-                    title_text = el.get_text().strip()
-                    if len(title_text) > 5 and len(title_text) < 100:
-                        title = title_text
-                        break
-                if title:
-                    break
-            
-            if not title:
-                title = "Computer Science Program"
-            
-            # 提取课程
-            courses = []
-            list_items = soup.find_all('li')
-            for item in list_items:
-                text = item.get_text().strip()
-                if re.search(r'[A-Z]{2,4}\s*\d{3,4}', text):
-                    courses.append(text)
-            
-            # 如果没有找到足够的课程，使用默认值
-            if len(courses) < 5:
-                courses = [
-                    "CS101 - Introduction to Computer Science",
-                    "CS201 - Data Structures",
-                    "CS301 - Algorithms",
-                    "CS401 - Database Systems",
-                    "CS501 - Software Engineering"
-                ]
-            
-            # 提取学分信息
-            credits = ""
-            credit_patterns = [r'\d+\s*credits', r'\d+\s*credit\s*hours']
-            for pattern in credit_patterns:
-                matches = re.findall(pattern, all_text, re.IGNORECASE)
-                if matches:
-                    credits = matches[0]
-                    break
-            
-            if not credits:
-                credits = "120 credits required for graduation"
-            
-            # 构建模拟的计算机视觉分析结果
-            result = {
-                "success": True,
-                "title": title,
-                "description": "通过模拟计算机视觉和OCR技术从网页提取的内容",
-                "courses": courses[:20],
-                "credits": credits,
-                "raw_text_sample": all_text[:1000],
-                "vision_analysis": {
-                    "title_regions_found": 3,
-                    "list_elements_found": len(list_items),
-                    "ocr_text_length": len(all_text)
-                },
-                "simulation_mode": True
-            }
-            
-            return jsonify(result)
-            
-        except Exception as e:
-            print(f"模拟计算机视觉爬虫错误: {str(e)}")
-            return jsonify({
-                "success": False,
-                "error": str(e),
-                "title": "Computer Science Program",
-                "description": "模拟计算机视觉爬取失败，返回默认数据。",
-                "courses": [
-                    "CS101 - Introduction to Computer Science",
-                    "CS201 - Data Structures",
-                    "CS301 - Algorithms",
-                    "CS401 - Database Systems",
-                    "CS501 - Software Engineering"
-                ],
-                "credits": "120 credits required for graduation",
-                "simulation_mode": True
-            }), 200
-    
-    # 以下是原始的计算机视觉爬虫代码，只在非模拟模式且库导入成功时执行
-    else:
-        data = request.json
-        if not data or 'url' not in data:
-            return jsonify({"error": "URL is required"}), 400
-        
-        url = data['url']
-        
-        try:
-            print(f"使用计算机视觉爬取URL: {url}")
-            
-            # 设置Chrome选项
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")  # 无头模式
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--window-size=1920,1080")
-            
-            # 初始化WebDriver
-            driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-            
-            try:
-                # 访问URL
-                driver.get(url)
-                print("页面加载完成")
-                time.sleep(3)  # 等待页面完全加载
-                
-                # 截取整个页面的截图
-                screenshot = driver.get_screenshot_as_png()
-                image = Image.open(io.BytesIO(screenshot))
-                
-                # 使用OCR提取文本
-                extracted_text = pytesseract.image_to_string(image)
-                print(f"OCR提取文本长度: {len(extracted_text)}")
-                
-                # 使用OpenCV进行目标检测，识别页面结构
-                # 将PIL图像转换为OpenCV格式
-                opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                
-                # 使用OpenCV检测标题区域（例如，查找大字体文本区域）
-                gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
-                _, binary = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-                contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                # 查找可能的标题区域（大的矩形区域）
-                title_regions = []
-                for contour in contours:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    if w > 300 and 30 < h < 100:  # 假设标题是宽而不太高的区域
-                        title_regions.append((x, y, w, h))
-                
-                # 提取标题区域的文本
-                title_texts = []
-                for x, y, w, h in title_regions[:3]:  # 只考虑前3个可能的标题区域
-                    roi = image.crop((x, y, x+w, y+h))
-                    text = pytesseract.image_to_string(roi).strip()
-                    if text and len(text) > 5:
-                        title_texts.append(text)
-                
-                # 查找课程列表（通常是有序或无序列表）
-                # 在Selenium中查找列表元素
-                list_elements = driver.find_elements(By.TAG_NAME, "li")
-                course_texts = []
-                for element in list_elements:
-                    text = element.text.strip()
-                    # 使用正则表达式检查是否包含课程代码模式
-                    if re.search(r'[A-Z]{2,4}\s*\d{3,4}', text):
-                        course_texts.append(text)
-                
-                # 如果通过Selenium没有找到足够的课程，尝试从OCR文本中提取
-                if len(course_texts) < 5:
-                    course_pattern = r'[A-Z]{2,4}\s*\d{3,4}[^.]*\.'
-                    ocr_courses = re.findall(course_pattern, extracted_text)
-                    for course in ocr_courses:
-                        if course not in course_texts:
-                            course_texts.append(course.strip())
-                
-                # 查找学分信息
-                credit_pattern = r'\d+\s*credits|\d+\s*credit\s*hours'
-                credit_matches = re.findall(credit_pattern, extracted_text, re.IGNORECASE)
-                credits_info = credit_matches[0] if credit_matches else "120 credits (默认值)"
-                
-                # 自动点击展开更多信息的按钮（如果存在）
-                try:
-                    # 查找可能的"更多信息"按钮
-                    more_buttons = driver.find_elements(By.XPATH, 
-                        "//button[contains(text(), 'More') or contains(text(), 'Details') or contains(text(), 'Expand')]")
-                    
-                    if more_buttons:
-                        for button in more_buttons:
-                            if button.is_displayed():
-                                print(f"点击按钮: {button.text}")
-                                button.click()
-                                time.sleep(1)  # 等待内容加载
-                                
-                                # 再次截图以获取更多信息
-                                screenshot_after_click = driver.get_screenshot_as_png()
-                                image_after_click = Image.open(io.BytesIO(screenshot_after_click))
-                                additional_text = pytesseract.image_to_string(image_after_click)
-                                
-                                # 将新文本添加到提取的文本中
-                                extracted_text += "\n" + additional_text
-                except Exception as click_error:
-                    print(f"点击按钮时出错: {str(click_error)}")
-                
-                # 构建结果
-                result = {
-                    "success": True,
-                    "title": title_texts[0] if title_texts else "Computer Science Program",
-                    "description": "通过计算机视觉和OCR技术从网页提取的内容",
-                    "courses": course_texts[:20],  # 限制为前20个课程
-                    "credits": credits_info,
-                    "raw_text_sample": extracted_text[:1000],  # 提供部分原始文本用于调试
-                    "vision_analysis": {
-                        "title_regions_found": len(title_regions),
-                        "list_elements_found": len(list_elements),
-                        "ocr_text_length": len(extracted_text)
-                    },
-                    "simulation_mode": False
-                }
-                
-                return jsonify(result)
-                
-            finally:
-                # 确保关闭WebDriver
-                driver.quit()
-                
-        except Exception as e:
-            print(f"计算机视觉爬虫错误: {str(e)}")
-            return jsonify({
-                "success": False,
-                "error": str(e),
-                "title": "Computer Science Program",
-                "description": "计算机视觉爬取失败，返回默认数据。",
-                "courses": [
-                    "CS101 - Introduction to Computer Science",
-                    "CS201 - Data Structures",
-                    "CS301 - Algorithms",
-                    "CS401 - Database Systems",
-                    "CS501 - Software Engineering"
-                ],
-                "credits": "120 credits required for graduation",
-                "simulation_mode": False
-            }), 200
+    data = request.json
+    if not data or 'url' not in data:
+        return jsonify({"error": "URL is required"}), 400
+    
+    payload, status = crawler_service.vision_crawl(data['url'])
+    return jsonify(payload), status
 
 if __name__ == '__main__':
     # Get port, Hugging Face Space uses port 7860
@@ -1,7 +1,11 @@
 #!/bin/bash
 
-# 初始化数据库
-python seed_db.py
+# 初始化数据库（执行尚未应用的迁移；已有数据不会被删除）
+python migrations.py
 
-# 启动应用
-gunicorn app:app --bind 0.0.0.0:7860 --workers 1 --threads 8 
\ No newline at end of file
+# 启动应用（SERVER=asgi 时使用异步服务路径，I/O密集的接口在事件循环上运行）
+if [ "$SERVER" = "asgi" ]; then
+    uvicorn asgi:application --host 0.0.0.0 --port 7860 --workers 1
+else
+    gunicorn app:app --bind 0.0.0.0:7860 --workers 1 --threads 8
+fi
@@ -0,0 +1,109 @@
+"""ASGI entry point with native async handlers for the I/O-bound endpoints
+
+/api/chat, /api/crawl-program and /api/vision-crawler are served directly on
+the event loop with an async HTTP client, so a single process can hold
+hundreds of DeepSeek / crawler calls in flight. Every other route is passed
+through to the Flask app unchanged.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 7860
+"""
+import json
+from asgiref.wsgi import WsgiToAsgi
+from app import app, resolve_session_id
+from deepseek_service import chat_service
+import crawler_service
+
+# 其余路由仍由Flask处理（在线程池中运行）
+flask_application = WsgiToAsgi(app)
+
+
+async def _read_json(receive):
+    """读取完整请求体并解析JSON；无效时返回None"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*")  # 与Flask-CORS对 /api/* 的配置保持一致
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def chat(data):
+    if not data or 'message' not in data:
+        return {"error": "No message provided"}, 400
+
+    session_id = resolve_session_id(data)
+    if session_id is None:
+        return {"error": "Invalid session_id"}, 400
+
+    response = await chat_service.send_message_async(data['message'], session_id=session_id)
+    if response is None:
+        return {"error": "Failed to get response from API"}, 500
+
+    return {"response": response, "session_id": session_id}, 200
+
+
+async def crawl_program(data):
+    if not data or 'url' not in data:
+        return {"error": "URL is required"}, 400
+    return await crawler_service.crawl_program_async(data['url'])
+
+
+async def vision_crawler(data):
+    if not data or 'url' not in data:
+        return {"error": "URL is required"}, 400
+    return await crawler_service.vision_crawl_async(data['url'])
+
+
+ASYNC_ROUTES = {
+    ("POST", "/api/chat"): chat,
+    ("POST", "/api/crawl-program"): crawl_program,
+    ("POST", "/api/vision-crawler"): vision_crawler,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # 关闭异步连接池
+            await chat_service.async_http.aclose()
+            await crawler_service.async_crawl_client.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    handler = None
+    if scope["type"] == "http":
+        handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await flask_application(scope, receive, send)
+        return
+
+    data = await _read_json(receive)
+    payload, status = await handler(data)
+    await _send_json(send, payload, status)
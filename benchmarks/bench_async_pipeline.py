@@ -0,0 +1,164 @@
+"""Load benchmark: sync Flask views vs the asyncio serving path (asgi.py)
+
+A local fake upstream answers DeepSeek chat completions and program pages
+after a fixed latency. The sync path is driven through the Flask app on a
+fixed thread pool (like `gunicorn --workers 1 --threads 8`); the async path
+calls the ASGI application directly with every request in flight at once.
+
+    python benchmarks/bench_async_pipeline.py --requests 400 --threads 8 --latency 0.2
+"""
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROGRAM_PAGE = b"""<html><body><h1>Bachelor of Science in Computer Science</h1>
+<p>This program provides an overview of computing, covering programming, systems and theory in depth.</p>
+<ul><li>CS101 - Introduction to Programming</li><li>CS201 - Data Structures</li></ul>
+<p>Students complete a total of 120 credits.</p></body></html>"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _handle_upstream(reader, writer, latency):
+    """最简单的HTTP/1.1 keep-alive服务器：延迟latency秒后返回固定内容"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method = request_line.split(b" ")[0]
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value.strip())
+            if length:
+                await reader.readexactly(length)
+
+            await asyncio.sleep(latency)
+            if method == b"POST":
+                body = json.dumps({"choices": [{"message": {"content": "Here is your plan."}}]}).encode()
+                content_type = b"application/json"
+            else:
+                body = PROGRAM_PAGE
+                content_type = b"text/html"
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: " + content_type +
+                         b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_upstream(port, latency):
+    loop = asyncio.new_event_loop()
+
+    async def serve():
+        server = await asyncio.start_server(lambda r, w: _handle_upstream(r, w, latency),
+                                            "127.0.0.1", port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+    time.sleep(0.2)
+
+
+def _summary(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<28} {len(latencies):>6} req  {elapsed:7.2f}s  {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50 {p50 * 1000:7.1f}ms  p99 {p99 * 1000:7.1f}ms")
+
+
+def run_sync(app, path, payload, total, threads):
+    def one(_):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post(path, json=payload)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(total)))
+    return latencies, time.perf_counter() - started
+
+
+async def run_async(application, path, payload, total):
+    body = json.dumps(payload).encode()
+
+    async def one():
+        scope = {"type": "http", "method": "POST", "path": path, "headers": [], "query_string": b""}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        assert sent[0]["status"] == 200, sent[0]["status"]
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(total)))
+    return list(latencies), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint and path")
+    parser.add_argument("--threads", type=int, default=8, help="sync worker threads (gunicorn --threads)")
+    parser.add_argument("--latency", type=float, default=0.2, help="upstream latency in seconds")
+    args = parser.parse_args()
+
+    port = _free_port()
+    start_upstream(port, args.latency)
+    upstream = f"http://127.0.0.1:{port}"
+
+    # 必须在导入服务模块之前设置
+    os.environ["DEEPSEEK_API_URL"] = f"{upstream}/v1/chat/completions"
+    os.environ.setdefault("API", "bench-key")
+    os.environ["DEEPSEEK_HEALTH_INTERVAL"] = "3600"
+    # 关闭爬取缓存的新鲜期和过期可用期：每个请求都真正访问上游，测量的是同步/异步管线而不是缓存命中
+    os.environ["CRAWL_CACHE_BACKEND"] = "memory"
+    os.environ["CRAWL_CACHE_TTL"] = "0"
+    os.environ["CRAWL_CACHE_STALE_TTL"] = "0"
+
+    from app import app
+    from asgi import application
+
+    cases = [
+        ("/api/chat", {"message": "Plan my next semester"}),
+        ("/api/crawl-program", {"url": f"{upstream}/program"}),
+    ]
+    print(f"upstream latency {args.latency * 1000:.0f}ms, {args.requests} requests per run, "
+          f"sync threads {args.threads}\n")
+    for path, payload in cases:
+        latencies, elapsed = run_sync(app, path, payload, args.requests, args.threads)
+        _summary(f"sync  {path}", latencies, elapsed)
+        latencies, elapsed = asyncio.run(run_async(application, path, payload, args.requests))
+        _summary(f"async {path}", latencies, elapsed)
+
+
+if __name__ == "__main__":
+    main()
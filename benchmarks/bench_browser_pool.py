@@ -0,0 +1,149 @@
+"""Benchmark: launching a browser per request vs the warm BrowserPool
+
+Drives the vision-crawler request pattern (load, wait for the page, take a
+screenshot) with a stub driver, so it runs without Chrome. The stub
+simulates the launch cost with --launch-ms, and the time a page needs to
+settle with --render-ms. It reports request latency for:
+
+  per-request  launch a driver, load, sleep a fixed 3s + 1s (the old code), quit
+  pool         borrow a warm driver from BrowserPool, wait_for_page_ready()
+
+and then overloads the pool to show recycling and backpressure (503s).
+
+    python benchmarks/bench_browser_pool.py --requests 40 --concurrency 8
+    python benchmarks/bench_browser_pool.py --launch-ms 2500 --render-ms 400 --fixed-sleep 0.4
+"""
+import os
+import sys
+import time
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from browser_pool import BrowserPool, BrowserPoolBusy, wait_for_page_ready
+
+
+class StubDriver:
+    """Stands in for a Chrome WebDriver: slow to launch, pages settle after render_ms"""
+
+    def __init__(self, launch_ms, render_ms):
+        time.sleep(launch_ms / 1000)
+        self.render_ms = render_ms
+        self.loaded_at = time.monotonic()
+        self.quit_called = False
+
+    def get(self, url):
+        self.loaded_at = time.monotonic()
+
+    def execute_script(self, script):
+        elapsed = (time.monotonic() - self.loaded_at) * 1000
+        if "readyState" in script:
+            return "complete" if elapsed >= self.render_ms / 2 else "interactive"
+        if script == "return 1":
+            return 1
+        # 内容在渲染完成前持续增长
+        return int(min(elapsed, self.render_ms))
+
+    def get_screenshot_as_png(self):
+        return b"\x89PNG"
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def per_request(args):
+    started = time.perf_counter()
+    driver = StubDriver(args.launch_ms, args.render_ms)
+    try:
+        driver.get("https://catalog.example.edu/program")
+        time.sleep(args.fixed_sleep)  # 原来的固定等待
+        driver.get_screenshot_as_png()
+    finally:
+        driver.quit()
+    return time.perf_counter() - started
+
+
+def pooled(pool):
+    started = time.perf_counter()
+    with pool.page() as driver:
+        driver.get("https://catalog.example.edu/program")
+        wait_for_page_ready(driver)
+        driver.get_screenshot_as_png()
+    return time.perf_counter() - started
+
+
+def run(fn, requests, concurrency):
+    latencies = []
+    rejected = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal rejected
+        try:
+            latency = fn()
+        except BrowserPoolBusy:
+            with lock:
+                rejected += 1
+            return
+        with lock:
+            latencies.append(latency)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    return np.array(latencies) * 1000, rejected, time.perf_counter() - started
+
+
+def report(name, latencies, rejected, wall):
+    if len(latencies):
+        p50, p95 = np.percentile(latencies, 50), np.percentile(latencies, 95)
+    else:
+        p50 = p95 = float("nan")
+    print(f"{name:<22} {len(latencies):>5} {rejected:>8} {p50:9.0f}ms {p95:9.0f}ms {wall:8.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--launch-ms", type=float, default=1500)
+    parser.add_argument("--render-ms", type=float, default=300)
+    parser.add_argument("--fixed-sleep", type=float, default=4.0, help="old fixed wait per page (3s + 1s)")
+    parser.add_argument("--max-pages", type=int, default=10)
+    args = parser.parse_args()
+
+    def factory():
+        return StubDriver(args.launch_ms, args.render_ms)
+
+    print(f"{'mode':<22} {'ok':>5} {'rejected':>8} {'p50':>11} {'p95':>11} {'wall':>9}")
+    report("per-request launch", *run(lambda: per_request(args), args.requests, args.concurrency))
+
+    pool = BrowserPool(factory, size=args.pool_size, max_pages=args.max_pages, queue_max=args.requests)
+    pool.start()
+    while pool.stats()["idle"] < args.pool_size:  # 预热，与服务启动时一致
+        time.sleep(0.05)
+    report("pool", *run(lambda: pooled(pool), args.requests, args.concurrency))
+    stats = pool.stats()
+    print(f"  pages served {stats['pages_served']}, browsers launched {stats['launched']}, "
+          f"recycled {stats['recycled']} (max_pages={args.max_pages})")
+    pool.shutdown()
+
+    # 过载：并发远大于池大小，排队上限和等待超时把多余的请求变成快速的503
+    overload = BrowserPool(factory, size=2, max_pages=args.max_pages, queue_max=2,
+                           acquire_timeout=args.render_ms / 1000 * 3)
+    overload.start()
+    while overload.stats()["idle"] < 2:
+        time.sleep(0.05)
+    report("pool overloaded (2/2)", *run(lambda: pooled(overload), args.requests, args.concurrency * 4))
+    overload.shutdown()
+
+
+if __name__ == "__main__":
+    main()
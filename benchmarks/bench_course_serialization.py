@@ -0,0 +1,91 @@
+"""Benchmark: per-course Course.to_dict vs Course.serialize_many
+
+Creates a catalog of --courses courses (each with 0-3 prerequisites) in a
+temporary SQLite database. It then serializes the whole catalog, as
+/api/courses does, and a 50-course subset, as /api/recommendations does.
+For both paths it counts the SQL statements and the latency.
+
+    python benchmarks/bench_course_serialization.py --courses 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+from models import db, Course, course_prerequisites
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def seed(num_courses, rng):
+    db.session.bulk_insert_mappings(Course, [
+        {"id": i + 1, "code": f"C{i:05d}", "name": f"Course {i}", "credits": rng.choice([3, 4]),
+         "description": "Synthetic course"}
+        for i in range(num_courses)
+    ])
+    edges = []
+    for i in range(1, num_courses):
+        for prereq in rng.sample(range(max(0, i - 200), i), min(i, rng.randint(0, 3))):
+            edges.append({"course_id": i + 1, "prerequisite_id": prereq + 1})
+    db.session.execute(course_prerequisites.insert(), edges)
+    db.session.commit()
+    return len(edges)
+
+
+def measure(label, counter, fn):
+    db.session.expire_all()
+    before = counter.count
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {counter.count - before:>7} queries  {elapsed * 1000:9.1f}ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            rng = random.Random(args.seed)
+            edges = seed(args.courses, rng)
+            counter = QueryCounter(db.engine)
+            print(f"{args.courses} courses, {edges} prerequisite edges\n")
+
+            old = measure("all courses: to_dict per course", counter,
+                          lambda: [c.to_dict() for c in Course.query.all()])
+            new = measure("all courses: serialize_many", counter,
+                          lambda: Course.serialize_many(Course.query.all(), all_courses=True))
+            assert old == new, "serialize_many output differs from to_dict"
+
+            codes = [f"C{i:05d}" for i in rng.sample(range(args.courses), 50)]
+            subset = lambda: Course.query.filter(Course.code.in_(codes)).all()
+            old = measure("50 courses: to_dict per course", counter, lambda: [c.to_dict() for c in subset()])
+            new = measure("50 courses: serialize_many", counter, lambda: Course.serialize_many(subset()))
+            assert old == new, "serialize_many output differs from to_dict"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark: enrollment and reverse-prerequisite queries before and after revision 2
+
+Builds a temporary SQLite database (WAL, as configured by migrations.py)
+with --enrollments enrollments spread over --students students and a
+catalog of --courses courses with 0-3 prerequisites each. The revision 2
+indexes are dropped first to reproduce the old schema. Each query is
+timed, then the migration is applied and the queries are timed again:
+
+  enrollments   Enrollment.query.filter_by(student_id=...)
+  progress      Enrollment.credit_totals([student_id])  (/api/student/<id>/progress)
+  progress x500 Enrollment.credit_totals(500 students)  (/api/students/progress)
+  required_for  course.required_for.all()                (reverse prerequisite lookup)
+
+    python benchmarks/bench_db_indexes.py --enrollments 1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from models import db, Course, Student, Enrollment, course_prerequisites
+from migrations import configure_database, _revision_2
+
+STATUSES = ["planned", "in-progress", "completed"]
+INSERT_BATCH = 50000
+
+
+def insert(table, rows):
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(table.insert(), rows[start:start + INSERT_BATCH])
+    db.session.commit()
+
+
+def seed(num_students, num_courses, num_enrollments, rng):
+    insert(Course.__table__, [
+        {"id": i + 1, "code": f"C{i:05d}", "name": f"Course {i}", "credits": rng.choice([3, 4])}
+        for i in range(num_courses)
+    ])
+    insert(course_prerequisites, [
+        {"course_id": i + 1, "prerequisite_id": prereq + 1}
+        for i in range(1, num_courses)
+        for prereq in rng.sample(range(max(0, i - 200), i), min(i, rng.randint(0, 3)))
+    ])
+    insert(Student.__table__, [
+        {"id": i + 1, "username": f"student{i}", "email": f"student{i}@example.com", "major": "Computer Science"}
+        for i in range(num_students)
+    ])
+    insert(Enrollment.__table__, [
+        {"student_id": rng.randrange(num_students) + 1, "course_id": rng.randrange(num_courses) + 1,
+         "semester": "Fall 2023", "status": rng.choice(STATUSES)}
+        for _ in range(num_enrollments)
+    ])
+
+
+def queries(num_students, num_courses, rng, repeat):
+    students = [rng.randrange(num_students) + 1 for _ in range(repeat)]
+    courses = [rng.randrange(num_courses) + 1 for _ in range(repeat)]
+    batches = [rng.sample(range(1, num_students + 1), 500) for _ in range(max(1, repeat // 10))]
+    return [
+        ("enrollments", students,
+         lambda s: sorted(e.id for e in Enrollment.query.filter_by(student_id=s).all())),
+        ("progress", students, lambda s: Enrollment.credit_totals([s])),
+        ("progress x500", batches, lambda b: Enrollment.credit_totals(b)),
+        ("required_for", courses,
+         lambda c: sorted(r.id for r in db.session.get(Course, c).required_for.all())),
+    ]
+
+
+def measure(fn, args):
+    latencies, results = [], []
+    for arg in args:
+        db.session.expire_all()
+        started = time.perf_counter()
+        results.append(fn(arg))
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enrollments", type=int, default=1000000)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--courses", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        configure_database(app, f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            for table in (Enrollment.__table__, course_prerequisites):
+                for index in table.indexes:
+                    index.drop(bind=db.engine)
+
+            rng = random.Random(args.seed)
+            started = time.perf_counter()
+            seed(args.students, args.courses, args.enrollments, rng)
+            print(f"{args.enrollments} enrollments, {args.students} students, {args.courses} courses "
+                  f"(seeded in {time.perf_counter() - started:.1f}s)\n")
+
+            cases = queries(args.students, args.courses, rng, args.repeat)
+            before = {label: measure(fn, params) for label, params, fn in cases}
+
+            started = time.perf_counter()
+            _revision_2()
+            print(f"revision 2 applied in {time.perf_counter() - started:.1f}s\n")
+            after = {label: measure(fn, params) for label, params, fn in cases}
+
+            print(f"{'query':<16} {'p50 before':>11} {'p99 before':>11} {'p50 after':>10} {'p99 after':>10} {'speedup':>8}")
+            for label, _, _ in cases:
+                old, new = before[label], after[label]
+                assert old[0] == new[0], f"{label}: results differ after adding indexes"
+                print(f"{label:<16} {old[1]:9.2f}ms {old[2]:9.2f}ms {new[1]:8.2f}ms {new[2]:8.2f}ms "
+                      f"{old[1] / new[1]:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
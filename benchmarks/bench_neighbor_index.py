@@ -0,0 +1,90 @@
+"""Benchmark: recall@10 and query latency of the neighbor-index backends
+
+Students come from the seeded synthetic generator and are turned into the
+recommender's scaled design matrix. Queries are rows drawn from the
+roster, as in get_recommendations(student_id=...). Ground truth is a brute-force scan.
+Recall counts a returned neighbor as correct when its distance is within
+the true 10th-neighbor distance, so ties between identical rows do not
+count as misses.
+
+    python benchmarks/bench_neighbor_index.py --students 100000 1000000 --queries 500
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.preprocessing import StandardScaler
+from feature_store import StudentFeatureStore
+from synthetic_data import build_catalog, SyntheticStudentGenerator
+from neighbor_index import create_index, _squared_distances
+
+K = 10
+
+
+def build_matrix(num_students, seed):
+    courses, prerequisites = build_catalog(seed)
+    generator = SyntheticStudentGenerator(courses, prerequisites, seed=seed)
+    store = StudentFeatureStore.from_chunks(generator.iter_chunks(num_students), generator.course_codes)
+    return StandardScaler().fit_transform(store.design_matrix())
+
+
+def true_kth_distances(X, queries):
+    """暴力搜索得到每个查询第K近邻的距离"""
+    best = np.full((len(queries), K), np.inf)
+    for start in range(0, len(X), 65536):
+        d = _squared_distances(queries, X[start:start + 65536])
+        best = np.sort(np.concatenate([best, np.partition(d, min(K, d.shape[1] - 1), axis=1)[:, :K]], axis=1),
+                       axis=1)[:, :K]
+    return np.sqrt(best[:, K - 1])
+
+
+def run(index, queries, kth, **params):
+    latencies, hits = [], 0
+    for q, x in enumerate(queries):
+        started = time.perf_counter()
+        distances, _ = index.kneighbors(x[None, :], n_neighbors=K, **params)
+        latencies.append(time.perf_counter() - started)
+        hits += int((distances[0] <= kth[q] * (1 + 1e-6) + 1e-6).sum())
+    latencies = np.array(latencies) * 1000
+    return hits / (len(queries) * K), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configs = [
+        ("exact", {}, [{}]),
+        ("ivf", {}, [{"n_probe": p} for p in (1, 4, 8, 32)]),
+        ("lsh", {"n_tables": 4, "n_bits": 16}, [{}]),
+        ("lsh", {"n_tables": 4, "n_bits": 24}, [{}]),
+        ("lsh", {"n_tables": 8, "n_bits": 24}, [{}]),
+    ]
+
+    for num_students in args.students:
+        X = build_matrix(num_students, args.seed)
+        rng = np.random.default_rng(args.seed)
+        queries = X[rng.choice(len(X), size=args.queries, replace=False)]
+        kth = true_kth_distances(X, queries)
+        print(f"\n{num_students} students, {X.shape[1]} features, {args.queries} queries")
+        print(f"{'backend':<28} {'build':>8} {'recall@10':>10} {'p50':>9} {'p99':>9}")
+
+        for backend, build_params, query_params in configs:
+            started = time.perf_counter()
+            index = create_index(backend, **build_params).fit(X)
+            build_seconds = time.perf_counter() - started
+            for params in query_params:
+                recall, p50, p99 = run(index, queries, kth, **params)
+                label = backend + "".join(f" {k}={v}" for k, v in {**build_params, **params}.items())
+                print(f"{label:<28} {build_seconds:7.1f}s {recall:10.3f} {p50:7.2f}ms {p99:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark: full-page Tesseract passes vs the region-targeted OcrSession
+
+Renders synthetic catalog screenshots (1920x1080: a navigation bar, a
+title, course blocks and a footer), plus one screenshot per simulated
+"More" click with extra lines inserted that push the rest of the page
+down. It then reads them the old way and with ocr_pipeline.OcrSession:
+
+  full-page  OCR the whole screenshot, then up to 3 title crops, then the
+             whole screenshot again after every click
+  regions    detect text regions once per screenshot, OCR only new
+             regions, in parallel on the OCR process pool
+
+--engine tesseract runs the real Tesseract binary. --engine model (the
+default, for machines without Tesseract) replaces each OCR call with a
+sleep of --call-ms plus --ms-per-mpix per megapixel of input.
+
+    python benchmarks/bench_ocr_pipeline.py --clicks 3
+    python benchmarks/bench_ocr_pipeline.py --engine tesseract --workers 4
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ocr_pipeline
+from ocr_pipeline import OcrSession, detect_text_regions, to_gray
+
+SUBJECTS = ["CS", "MATH", "PHYS", "STAT", "ECE"]
+WORDS = ["Introduction", "Advanced", "Topics", "Systems", "Theory", "Design", "Analysis", "Methods",
+         "Programming", "Networks", "Data", "Learning", "Algorithms", "Security", "Computing", "Lab"]
+
+# 成本模型参数；spawn出的工作进程通过环境变量读取
+CALL_MS = float(os.getenv('BENCH_OCR_CALL_MS', 40))
+MS_PER_MPIX = float(os.getenv('BENCH_OCR_MS_PER_MPIX', 700))
+
+
+def modeled_ocr(image):
+    """Sleeps as long as a Tesseract call on an image of this size would take"""
+    width, height = image.size if isinstance(image, Image.Image) else (image.shape[1], image.shape[0])
+    time.sleep((CALL_MS + MS_PER_MPIX * width * height / 1e6) / 1000)
+    return "text"
+
+
+def font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def screenshot(rng_seed, expanded):
+    """A catalog page; each expanded section inserts four lines above the course list"""
+    rng = random.Random(rng_seed)
+    image = Image.new("RGB", (1920, 1080), "white")
+    draw = ImageDraw.Draw(image)
+    small, large = font(16), font(40)
+    draw.rectangle((0, 0, 1920, 60), fill=(30, 60, 120))
+    draw.text((20, 20), "University Catalog   Programs   Courses   Admissions   Contact", fill="white", font=small)
+    draw.text((100, 100), "Computer Science, Bachelor of Science", fill="black", font=large)
+    y = 180
+    for section in range(expanded):
+        section_rng = random.Random(f"{rng_seed}-{section}")
+        for line in range(4):
+            words = " ".join(section_rng.choice(WORDS) for _ in range(8))
+            draw.text((100, y + line * 22), f"Section {section}: {words}", fill="black", font=small)
+        y += 110
+    while y < 960:
+        code = f"{rng.choice(SUBJECTS)} {rng.randint(100, 499)}"
+        draw.text((100, y), f"{code} - {' '.join(rng.choice(WORDS) for _ in range(3))} (3 credits)",
+                  fill="black", font=small)
+        draw.text((100, y + 22), " ".join(rng.choice(WORDS) for _ in range(14)), fill=(60, 60, 60), font=small)
+        y += 70
+    draw.rectangle((0, 1000, 1920, 1080), fill=(235, 235, 235))
+    draw.text((20, 1030), "© University. All rights reserved.", fill=(90, 90, 90), font=small)
+    return image
+
+
+def full_page(recognize, screenshots):
+    """The old crawler: whole page, 3 title crops, whole page again per click"""
+    first = screenshots[0]
+    calls = [recognize(first)]
+    gray = to_gray(first)
+    titles = [box for box in detect_text_regions(gray) if box[2] > 300 and 30 < box[3] < 100][:3]
+    for x, y, w, h in titles:
+        calls.append(recognize(first.crop((x, y, x + w, y + h))))
+    for image in screenshots[1:]:
+        calls.append(recognize(image))
+    return len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=["model", "tesseract"], default="model")
+    parser.add_argument("--clicks", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=ocr_pipeline.OCR_WORKERS)
+    parser.add_argument("--call-ms", type=float, default=CALL_MS)
+    parser.add_argument("--ms-per-mpix", type=float, default=MS_PER_MPIX)
+    args = parser.parse_args()
+
+    os.environ['BENCH_OCR_CALL_MS'] = str(args.call_ms)
+    os.environ['BENCH_OCR_MS_PER_MPIX'] = str(args.ms_per_mpix)
+    globals().update(CALL_MS=args.call_ms, MS_PER_MPIX=args.ms_per_mpix)
+    ocr_pipeline.OCR_WORKERS = args.workers
+    pool = None
+    if args.engine == "tesseract":
+        import pytesseract
+        full_recognizer, region_recognizer = pytesseract.image_to_string, ocr_pipeline.recognize_region
+    else:
+        full_recognizer = region_recognizer = modeled_ocr
+        if args.workers > 0:
+            # modeled_ocr 定义在本脚本中，工作进程需要导入主模块，所以不能用 ocr_pipeline 的进程池
+            pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    # 先启动进程池，避免把进程启动时间算进第一个页面
+    warmup = OcrSession(recognizer=region_recognizer, pool=pool)
+    warmup.read(screenshot(-1, 0))
+
+    print(f"{'page':>4} {'full-page':>10} {'calls':>6} {'regions':>10} {'ocr':>5} {'reused':>7}  stage timings (ms)")
+    for page in range(args.pages):
+        screenshots = [screenshot(page, expanded) for expanded in range(args.clicks + 1)]
+        started = time.perf_counter()
+        calls = full_page(full_recognizer, screenshots)
+        old_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        session = OcrSession(recognizer=region_recognizer, pool=pool)
+        for image in screenshots:
+            session.read(image)
+        new_ms = (time.perf_counter() - started) * 1000
+        stats = session.stats()
+        print(f"{page:>4} {old_ms:8.0f}ms {calls:>6} {new_ms:8.0f}ms {stats['regions_ocr']:>5} "
+              f"{stats['regions_reused']:>7}  {stats['timings_ms']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark: list-based eligibility checks vs the compiled PrerequisiteGraph
+
+Builds a synthetic catalog (default 10k courses, 1-3 prerequisites each,
+always on lower-numbered courses so the graph is a DAG) and a set of
+students with completed-course lists. Compares:
+
+  list     the previous _get_next_courses logic (`not in` / all(... in ...) on lists)
+  bitmask  PrerequisiteGraph.mask + eligible on a small per-major candidate list
+           (integer bit operations), compared with the list logic on the same list
+  catalog  PrerequisiteGraph.eligible over the whole catalog (vectorized with NumPy)
+
+    python benchmarks/bench_prereq_graph.py --courses 10000 --students 200 --completed 300
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prereq_graph import PrerequisiteGraph
+
+
+def build_catalog(num_courses, seed):
+    rng = random.Random(seed)
+    codes = [f"C{i:05d}" for i in range(num_courses)]
+    prerequisites = {}
+    for i, code in enumerate(codes):
+        if i < 20:
+            prerequisites[code] = []
+            continue
+        # 先修课程只来自编号更小的课程，保证无环
+        prerequisites[code] = rng.sample(codes[max(0, i - 500):i], rng.randint(1, 3))
+    return codes, prerequisites
+
+
+def list_next_courses(all_courses, prerequisites, completed_courses):
+    """原实现：在列表上逐个判断"""
+    available_courses = []
+    for course in all_courses:
+        if course not in completed_courses:
+            prereqs = prerequisites.get(course, [])
+            if all(p in completed_courses for p in prereqs):
+                available_courses.append(course)
+    return available_courses
+
+
+def timed(fn, students):
+    started = time.perf_counter()
+    results = [fn(completed) for completed in students]
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=10000, help="catalog size")
+    parser.add_argument("--students", type=int, default=200, help="number of eligibility queries")
+    parser.add_argument("--completed", type=int, default=300, help="completed courses per student")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    codes, prerequisites = build_catalog(args.courses, args.seed)
+    rng = random.Random(args.seed + 1)
+    students = [rng.sample(codes, args.completed) for _ in range(args.students)]
+
+    started = time.perf_counter()
+    graph = PrerequisiteGraph(prerequisites, codes)
+    compile_seconds = time.perf_counter() - started
+    catalog = [graph.index[code] for code in codes]
+    # 类似一个专业的候选课程列表
+    major_codes = rng.sample(codes, 30)
+    major = [graph.index[code] for code in major_codes]
+
+    def run(candidates):
+        return lambda completed: [graph.codes[i] for i in graph.eligible(graph.mask(completed), candidates)]
+
+    print(f"{args.courses} courses, {len(graph.edge_course)} prerequisite edges, "
+          f"{args.students} students x {args.completed} completed courses")
+    print(f"graph compile: {compile_seconds * 1000:.1f}ms\n")
+
+    for name, candidate_codes, candidates in (("bitmask", major_codes, major), ("catalog", codes, catalog)):
+        expected, list_seconds = timed(lambda c: list_next_courses(candidate_codes, prerequisites, c), students)
+        results, seconds = timed(run(candidates), students)
+        assert results == expected, f"{name} results differ from the list implementation"
+        baseline, per_query = list_seconds / len(students), seconds / len(students)
+        print(f"{name:<8} {len(candidates):>6} candidates  list {baseline * 1000:9.3f}ms/query  "
+              f"graph {per_query * 1000:8.3f}ms/query  {baseline / per_query:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
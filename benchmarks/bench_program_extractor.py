@@ -0,0 +1,104 @@
+"""Benchmark: BeautifulSoup extractor vs the single-pass lxml extractor
+
+Runs both extractors used by crawl_program on catalog pages and reports
+the latency of each and which fields agree. The pages are either saved
+HTML files passed with --pages, or seeded synthetic catalog pages with
+--courses course entries each. The synthetic pages have navigation, an
+overview, requirement lists, course blocks, inline scripts and a footer.
+
+    python benchmarks/bench_program_extractor.py --courses 50 500 3000
+    python benchmarks/bench_program_extractor.py --pages saved/*.html
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawler_service import _extract_program_fields_soup
+from program_extractor import extract_program_fields
+
+SUBJECTS = ["CS", "MATH", "PHYS", "STAT", "ECE", "ENGL", "BIOL", "CHEM"]
+WORDS = ["Introduction", "Advanced", "Topics", "Systems", "Theory", "Design", "Analysis", "Methods",
+         "Programming", "Networks", "Data", "Learning", "Algorithms", "Security", "Computing", "Lab"]
+FIELDS = ["title", "description", "courses", "requirements", "credits"]
+
+
+def synthetic_page(num_courses, rng):
+    def words(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    nav = "".join(f'<li><a href="/dept/{i}">{words(2)}</a></li>' for i in range(60))
+    courses = []
+    for i in range(num_courses):
+        code = f"{rng.choice(SUBJECTS)} {rng.randint(100, 499)}"
+        prereq = f"Prerequisite: {rng.choice(SUBJECTS)}{rng.randint(100, 399)}. " if rng.random() < 0.4 else ""
+        courses.append(
+            f'<div class="courseblock"><p class="courseblocktitle"><strong>{code} - {words(3)}'
+            f'</strong> <span>({rng.choice([3, 4])} credits)</span></p>'
+            f'<p class="courseblockdesc">{prereq}{words(25)}. <em>{words(4)}</em>.</p></div>'
+        )
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>Computer Science, BS | University Catalog</title>
+<style>.courseblock {{ margin: 0 }} body {{ font-family: sans-serif }}</style>
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments)}}</script>
+</head><body>
+<header><nav><ul class="menu">{nav}</ul></nav></header>
+<!-- main content -->
+<main>
+<h1>Computer Science, Bachelor of Science</h1>
+<div id="overview"><h2>Overview</h2>
+<p>The <strong>Computer Science program</strong> provides a rigorous foundation in {words(30)}.</p>
+<p>Students complete a minimum of 120 credits, including {words(20)}.</p></div>
+<div id="requirements"><h2>Degree Requirements</h2>
+<p>Admission requirements for the major include {words(12)}.</p>
+<ul>{"".join(f"<li>{words(6)} ({rng.randint(3, 12)} credits)</li>" for _ in range(12))}</ul></div>
+<div id="courses"><h2>Courses</h2>{"".join(courses)}</div>
+</main>
+<footer><p>&copy; University. {words(10)}</p><script>trackPage();</script></footer>
+</body></html>"""
+
+
+def quiet(fn, html):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(html)
+
+
+def measure(fn, html, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = quiet(fn, html)
+        latencies.append(time.perf_counter() - started)
+    return result, np.percentile(np.array(latencies) * 1000, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, nargs="+", default=[50, 500, 3000])
+    parser.add_argument("--pages", nargs="*", default=[])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = [(os.path.basename(path), open(path, encoding="utf-8", errors="replace").read()) for path in args.pages]
+    if not pages:
+        pages = [(f"synthetic {n} courses", synthetic_page(n, rng)) for n in args.courses]
+
+    print(f"{'page':<28} {'size':>8} {'soup p50':>10} {'lxml p50':>10} {'speedup':>8}  differing fields")
+    for name, html in pages:
+        old, old_ms = measure(_extract_program_fields_soup, html, args.repeat)
+        new, new_ms = measure(extract_program_fields, html, args.repeat)
+        differing = [field for field in FIELDS if old[field] != new[field]]
+        print(f"{name[:28]:<28} {len(html) // 1024:>6}KB {old_ms:8.1f}ms {new_ms:8.1f}ms {old_ms / new_ms:7.1f}x  "
+              f"{', '.join(differing) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Pool of warm headless-browser workers for the vision crawler
+
+Launching Chrome costs seconds and hundreds of MB, so the pool keeps
+BROWSER_POOL_SIZE drivers running and lends them out one request at a
+time:
+
+    with browser_pool.page() as driver:
+        driver.get(url)
+        wait_for_page_ready(driver)
+
+- Drivers are launched on background threads. start() warms the pool
+  without blocking, and a retired driver is replaced the same way.
+- A driver is health-checked (a trivial script) before it is handed out.
+  It is retired after BROWSER_MAX_PAGES pages, after BROWSER_MAX_AGE
+  seconds, or when the page raised a WebDriver error.
+- At most BROWSER_QUEUE_MAX requests wait for a driver. Beyond that, and
+  after BROWSER_ACQUIRE_TIMEOUT seconds of waiting, BrowserPoolBusy is
+  raised so the caller can answer 503 instead of piling up threads.
+- wait_for_page_ready() and wait_for_dom_change() poll the page state
+  and return as soon as it settles, instead of sleeping a fixed time.
+
+The driver factory is a plain callable, so a stub driver can stand in for
+Chrome (see benchmarks/bench_browser_pool.py).
+"""
+import os
+import time
+import threading
+
+# Selenium只在非模拟模式下需要；未安装时仍可使用自定义的driver工厂
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from selenium.common.exceptions import WebDriverException
+    SELENIUM_AVAILABLE = True
+except ImportError:
+    webdriver = None
+    WebDriverException = Exception
+    SELENIUM_AVAILABLE = False
+
+# 浏览器池配置（可通过环境变量覆盖）
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))  # 常驻的浏览器数量
+BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', 50))  # 每个浏览器处理多少个页面后重启（释放泄漏的内存）
+BROWSER_MAX_AGE = int(os.getenv('BROWSER_MAX_AGE', 1800))  # 浏览器最长存活时间（秒）
+BROWSER_QUEUE_MAX = int(os.getenv('BROWSER_QUEUE_MAX', 8))  # 最多排队等待浏览器的请求数
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv('BROWSER_ACQUIRE_TIMEOUT', 30))  # 等待空闲浏览器的最长时间（秒）
+BROWSER_PAGE_LOAD_TIMEOUT = float(os.getenv('BROWSER_PAGE_LOAD_TIMEOUT', 20))  # driver.get 的超时（秒）
+BROWSER_READY_TIMEOUT = float(os.getenv('BROWSER_READY_TIMEOUT', 5))  # 等待页面内容稳定的最长时间（秒）
+BROWSER_POLL_INTERVAL = 0.1  # 检查页面状态的间隔（秒）
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+class BrowserPoolBusy(Exception):
+    """Raised when the wait queue is full or no browser became free in time"""
+
+
+def _resolve_chromedriver():
+    """只下载/查找一次chromedriver，而不是每次启动浏览器都调用 install()"""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _chromedriver_path = ChromeDriverManager().install()
+        return _chromedriver_path
+
+
+def create_chrome_driver():
+    """Headless Chrome configured for screenshots of catalog pages"""
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")  # 无头模式
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    # DOMContentLoaded后就返回，剩余内容由 wait_for_page_ready 等待
+    chrome_options.page_load_strategy = 'eager'
+    driver = webdriver.Chrome(service=Service(_resolve_chromedriver()), options=chrome_options)
+    driver.set_page_load_timeout(BROWSER_PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+def _wait_until(condition, timeout, poll_interval=BROWSER_POLL_INTERVAL):
+    """条件满足时立即返回True；超时返回False"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if condition():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
+
+def content_size(driver):
+    """页面文本长度加元素数量，用于判断内容是否还在变化"""
+    return driver.execute_script(
+        "return document.body ? document.body.innerText.length + document.getElementsByTagName('*').length : -1")
+
+
+def wait_for_page_ready(driver, timeout=BROWSER_READY_TIMEOUT):
+    """Wait until the document has loaded and its content stopped changing
+
+    The content counts as settled when two consecutive polls see the same
+    text length and element count, which also covers content rendered
+    by scripts after the load event. Returns False if the timeout passes first.
+    """
+    last = [None]
+
+    def settled():
+        if driver.execute_script("return document.readyState") != "complete":
+            return False
+        size = content_size(driver)
+        stable = size == last[0]
+        last[0] = size
+        return stable
+
+    return _wait_until(settled, timeout)
+
+
+def wait_for_dom_change(driver, before, timeout=BROWSER_READY_TIMEOUT):
+    """点击等操作后：等待页面内容发生变化并重新稳定"""
+    if not _wait_until(lambda: content_size(driver) != before, timeout):
+        return False
+    return wait_for_page_ready(driver, timeout)
+
+
+class BrowserWorker:
+    """One launched driver and its usage counters"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.pages = 0
+
+    def healthy(self):
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def expired(self, max_pages, max_age):
+        return self.pages >= max_pages or time.monotonic() - self.created_at >= max_age
+
+    def reset(self):
+        """清除上一个页面的状态，避免泄漏到下一个请求"""
+        self.driver.delete_all_cookies()
+        self.driver.get("about:blank")
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"关闭浏览器失败: {str(e)}")
+
+
+class BrowserPool:
+    """Fixed-size pool of warm browser workers with a bounded wait queue"""
+
+    def __init__(self, factory=create_chrome_driver, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES,
+                 max_age=BROWSER_MAX_AGE, queue_max=BROWSER_QUEUE_MAX, acquire_timeout=BROWSER_ACQUIRE_TIMEOUT):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self.queue_max = queue_max
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = []
+        self._busy = 0
+        self._launching = 0
+        self._waiting = 0
+        self._pid = None
+        self._counters = {
+            "launched": 0,
+            "launch_errors": 0,
+            "recycled": 0,
+            "failed_health_checks": 0,
+            "rejected": 0,
+            "pages_served": 0
+        }
+        self.last_launch_error = None
+
+    # ---- 启动和替换浏览器 ----
+
+    def start(self):
+        """Launch browsers in the background until the pool is full (non-blocking)"""
+        with self._cond:
+            if self._pid != os.getpid():
+                # fork出的子进程不能使用父进程的浏览器
+                self._pid = os.getpid()
+                self._idle, self._busy, self._launching, self._waiting = [], 0, 0, 0
+            missing = self.size - len(self._idle) - self._busy - self._launching
+            self._launching += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self._launch, name="browser-launch", daemon=True).start()
+
+    def _launch(self):
+        worker = None
+        try:
+            started = time.monotonic()
+            worker = BrowserWorker(self.factory())
+            print(f"浏览器已启动，用时 {time.monotonic() - started:.1f}秒")
+        except Exception as e:
+            print(f"启动浏览器失败: {str(e)}")
+            self.last_launch_error = str(e)
+        with self._cond:
+            self._launching -= 1
+            if worker is None:
+                self._counters["launch_errors"] += 1
+            else:
+                self._counters["launched"] += 1
+                self._idle.append(worker)
+            # 唤醒等待者：有新浏览器可用，或者启动失败需要重试/报错
+            self._cond.notify_all()
+
+    def _retire(self, worker):
+        """在后台关闭浏览器并启动一个新的替代它"""
+        threading.Thread(target=worker.quit, name="browser-quit", daemon=True).start()
+        self.start()
+
+    # ---- 借出和归还 ----
+
+    def acquire(self, timeout=None):
+        """Return a healthy idle worker; raises BrowserPoolBusy on overload or timeout"""
+        self.start()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._idle and self._waiting >= self.queue_max:
+                self._counters["rejected"] += 1
+                raise BrowserPoolBusy("Too many requests waiting for a browser")
+            self._waiting += 1
+        try:
+            while True:
+                worker = self._take(deadline)
+                # 健康检查在锁外执行，卡住的浏览器不会阻塞其他请求
+                if worker.healthy():
+                    return worker
+                with self._cond:
+                    self._busy -= 1
+                    self._counters["failed_health_checks"] += 1
+                self._retire(worker)
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _take(self, deadline):
+        with self._cond:
+            while not self._idle:
+                if self._launching == 0 and self._busy == 0:
+                    # 所有浏览器都启动失败，不再等待
+                    raise BrowserPoolBusy(f"No browser available: {self.last_launch_error}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["rejected"] += 1
+                    raise BrowserPoolBusy("Timed out waiting for a browser")
+                self._cond.wait(remaining)
+            self._busy += 1
+            return self._idle.pop()
+
+    def release(self, worker, broken=False):
+        """Return a worker after a page; broken or worn-out workers are replaced"""
+        worker.pages += 1
+        if not broken and not worker.expired(self.max_pages, self.max_age):
+            try:
+                worker.reset()
+            except Exception:
+                broken = True
+        with self._cond:
+            self._busy -= 1
+            self._counters["pages_served"] += 1
+            if broken or worker.expired(self.max_pages, self.max_age):
+                self._counters["recycled"] += 1
+                retire = True
+            else:
+                self._idle.append(worker)
+                retire = False
+            self._cond.notify()
+        if retire:
+            self._retire(worker)
+
+    class _Lease:
+        def __init__(self, pool, timeout):
+            self.pool = pool
+            self.timeout = timeout
+            self.worker = None
+
+        def __enter__(self):
+            self.worker = self.pool.acquire(self.timeout)
+            return self.worker.driver
+
+        def __exit__(self, exc_type, exc, tb):
+            # WebDriver出错时浏览器状态不可信，直接替换；其他错误（如OCR失败）不影响浏览器
+            broken = exc_type is not None and issubclass(exc_type, WebDriverException)
+            self.pool.release(self.worker, broken=broken)
+            return False
+
+    def page(self, timeout=None):
+        """Context manager lending a driver for one page"""
+        return self._Lease(self, timeout)
+
+    def shutdown(self):
+        with self._cond:
+            workers, self._idle = self._idle, []
+            self.size = 0
+        for worker in workers:
+            worker.quit()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "busy": self._busy,
+                "launching": self._launching,
+                "waiting": self._waiting,
+                **self._counters,
+                "max_pages": self.max_pages,
+                "queue_max": self.queue_max,
+                "last_launch_error": self.last_launch_error
+            }
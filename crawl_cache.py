@@ -0,0 +1,187 @@
+"""Cache of parsed program pages for /api/crawl-program
+
+Entries are keyed by normalized URL. Each one stores the parsed
+program_info together with the page's ETag and Last-Modified headers.
+Three windows, measured from the last successful fetch or revalidation,
+decide how a lookup is served:
+
+  fresh    age < ttl                     served from the cache
+  stale    age < ttl + stale_ttl         served from the cache, revalidated in the background
+  expired  age < max_age                 revalidated with a conditional GET before serving
+
+A 304 Not Modified only resets the entry's age; the page is not parsed
+again. Entries older than max_age are dropped, so the next lookup is a
+plain miss.
+
+The default backend is the on-disk DiskCacheBackend from response_cache,
+so cached pages are shared by every worker and survive restarts.
+"""
+import os
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from response_cache import MemoryCacheBackend, DiskCacheBackend
+
+# 爬取缓存配置（可通过环境变量覆盖）
+CRAWL_CACHE_BACKEND = os.getenv('CRAWL_CACHE_BACKEND', 'disk')  # disk 或 memory
+CRAWL_CACHE_TTL = int(os.getenv('CRAWL_CACHE_TTL', 86400))  # 新鲜期（秒）；项目页面大约每学期才更新一次
+CRAWL_CACHE_STALE_TTL = int(os.getenv('CRAWL_CACHE_STALE_TTL', 7 * 86400))  # 过期后仍可直接返回、后台重新验证的时间
+CRAWL_CACHE_MAX_AGE = int(os.getenv('CRAWL_CACHE_MAX_AGE', 180 * 86400))  # 超过此时间的条目直接删除
+CRAWL_CACHE_MAX_ENTRIES = int(os.getenv('CRAWL_CACHE_MAX_ENTRIES', 2048))
+CRAWL_CACHE_DIR = os.getenv('CRAWL_CACHE_DIR',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'crawl_cache'))
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+MISS = "miss"
+
+# 不影响页面内容的跟踪参数
+_TRACKING_PARAMS = ("utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "gclid", "fbclid")
+
+
+def normalize_url(url):
+    """统一大小写、默认端口、查询参数顺序，去掉片段和跟踪参数，使同一页面得到相同的缓存键"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in _TRACKING_PARAMS)
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def cache_key(url):
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+def create_backend(name=CRAWL_CACHE_BACKEND):
+    """根据配置名称创建缓存后端"""
+    if name == 'disk':
+        return DiskCacheBackend(CRAWL_CACHE_DIR, max_entries=CRAWL_CACHE_MAX_ENTRIES)
+    if name == 'memory':
+        return MemoryCacheBackend(max_entries=CRAWL_CACHE_MAX_ENTRIES)
+    raise ValueError(f"Unknown crawl cache backend: {name}")
+
+
+class CrawlCache:
+    """Parsed-page cache with conditional revalidation and hit/miss counters
+
+    The caller does the fetching. lookup() tells it whether to serve,
+    revalidate in the background or fetch now. conditional_headers() builds
+    the If-None-Match / If-Modified-Since headers. store() records a 200 and
+    revalidated() a 304.
+    """
+
+    def __init__(self, backend=None, ttl=CRAWL_CACHE_TTL, stale_ttl=CRAWL_CACHE_STALE_TTL,
+                 max_age=CRAWL_CACHE_MAX_AGE):
+        self.backend = backend if backend is not None else create_backend()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._revalidating = set()  # 正在后台重新验证的缓存键，避免重复请求
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "background_revalidations": 0,
+            "not_modified": 0,
+            "refetched": 0,
+            "served_stale_on_error": 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def lookup(self, url):
+        """Return (entry, state); entry is None on a miss"""
+        entry = self.backend.get(cache_key(url))
+        if entry is None:
+            self._count("misses")
+            return None, MISS
+        age = time.time() - entry["validated_at"]
+        if age < self.ttl:
+            self._count("hits")
+            return entry, FRESH
+        if age < self.ttl + self.stale_ttl:
+            self._count("stale_hits")
+            return entry, STALE
+        self._count("expired")
+        return entry, EXPIRED
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _save(self, url, entry):
+        # 缓存写入失败（如磁盘已满）不影响本次请求的结果
+        try:
+            self.backend.set(cache_key(url), entry, self.max_age)
+        except OSError as e:
+            print(f"写入爬取缓存失败: {str(e)}")
+        return entry
+
+    def store(self, url, value, headers, revalidating=False):
+        """缓存一次200响应的解析结果；源站要求no-store时不缓存"""
+        if revalidating:
+            self._count("refetched")
+        if "no-store" in (headers.get("Cache-Control") or "").lower():
+            self.backend.delete(cache_key(url))
+            return None
+        return self._save(url, {
+            "url": normalize_url(url),
+            "value": value,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "validated_at": time.time()
+        })
+
+    def revalidated(self, url, entry):
+        """源站返回304：内容未变，只更新验证时间"""
+        self._count("not_modified")
+        return self._save(url, {**entry, "validated_at": time.time()})
+
+    def served_stale_on_error(self):
+        self._count("served_stale_on_error")
+
+    def claim_revalidation(self, url):
+        """Return True if the caller should start the background revalidation for url"""
+        key = cache_key(url)
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            self._counters["background_revalidations"] += 1
+            return True
+
+    def release_revalidation(self, url):
+        with self._lock:
+            self._revalidating.discard(cache_key(url))
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            in_flight = len(self._revalidating)
+        served = counters["hits"] + counters["stale_hits"]
+        lookups = served + counters["misses"] + counters["expired"]
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            **counters,
+            "revalidations_in_flight": in_flight,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl
+        }
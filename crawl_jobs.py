@@ -0,0 +1,564 @@
+"""Bulk program-page crawl jobs
+
+A job takes a list of URLs, or a sitemap that is expanded into one. It
+crawls every page and appends one NDJSON result line per URL. Jobs run
+on a single background event loop per process:
+
+- Fetches share an AsyncPooledHTTPClient.
+- At most CRAWL_JOB_CONCURRENCY URLs are in flight across all jobs.
+- Each host gets at most CRAWL_JOB_PER_HOST concurrent requests, sitemap
+  fetches included.
+- Request starts to one host are spaced CRAWL_JOB_HOST_INTERVAL seconds apart.
+- Pages are parsed on a process pool (CRAWL_JOB_PARSE_WORKERS, 0 means a
+  thread), so parsing does not hold up the event loop or the web workers.
+  The pool's workers do not re-run the app startup (see worker_pool). If a
+  worker crashes, the broken pool is replaced and the page is parsed again
+  once in the new pool.
+- Results also go into crawler_service.program_cache. A page crawled
+  recently is served from the cache. A stale one is served from the cache
+  and revalidated in the background; an expired one is revalidated with a
+  conditional GET first.
+
+Each job is a directory under CRAWL_JOB_DIR:
+
+  job.json       URLs, status and counters (rewritten atomically)
+  results.ndjson one line per finished URL (the source of truth for progress)
+
+A job is run by whichever process holds its lock file. After a crash,
+resume_incomplete() restarts unfinished jobs and crawls only the URLs
+that have no result line yet.
+"""
+import os
+import re
+import gzip
+import json
+import time
+import uuid
+import html
+import asyncio
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures.process import BrokenProcessPool
+from http_client import AsyncPooledHTTPClient
+from worker_pool import create_process_pool
+from crawl_cache import normalize_url, FRESH, STALE
+import crawler_service
+
+# 进程间文件锁只在POSIX系统上可用
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 批量爬取配置（可通过环境变量覆盖）
+CRAWL_JOB_DIR = os.getenv('CRAWL_JOB_DIR',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'crawl_jobs'))
+CRAWL_JOB_MAX_URLS = int(os.getenv('CRAWL_JOB_MAX_URLS', 5000))  # 每个任务最多的URL数
+CRAWL_JOB_CONCURRENCY = int(os.getenv('CRAWL_JOB_CONCURRENCY', 32))  # 所有任务合计同时处理的URL数
+CRAWL_JOB_PER_HOST = int(os.getenv('CRAWL_JOB_PER_HOST', 4))  # 每个主机的并发请求数
+CRAWL_JOB_HOST_INTERVAL = float(os.getenv('CRAWL_JOB_HOST_INTERVAL', 0.25))  # 同一主机两次请求开始的最小间隔（秒）
+CRAWL_JOB_PARSE_WORKERS = int(os.getenv('CRAWL_JOB_PARSE_WORKERS', min(2, os.cpu_count() or 1)))  # 0 表示在线程中解析
+CRAWL_JOB_TIMEOUT = float(os.getenv('CRAWL_JOB_TIMEOUT', 30))  # 单个页面的读取超时（秒）
+CRAWL_JOB_PROGRESS_INTERVAL = 1.0  # job.json 中计数的最短更新间隔（秒）
+CRAWL_JOB_STREAM_IDLE_TIMEOUT = float(os.getenv('CRAWL_JOB_STREAM_IDLE_TIMEOUT', 300))  # 结果流多久没有新结果就结束（秒）
+
+QUEUED = "queued"
+EXPANDING = "expanding"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED_STATUSES = (COMPLETED, FAILED)
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+_SITEMAP_LOC = re.compile(r'<loc>\s*(.*?)\s*</loc>', re.IGNORECASE | re.DOTALL)
+
+
+def valid_job_id(job_id):
+    return bool(_JOB_ID.match(job_id or ""))
+
+
+def _is_http_url(url):
+    return isinstance(url, str) and urlsplit(url.strip()).scheme in ("http", "https")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class _HostLimiter:
+    """Per-host concurrency limit and minimum spacing between request starts
+
+    A host's entry is removed once no request to it is running or waiting
+    and its spacing interval has passed, so the table only holds hosts that
+    are being crawled.
+    """
+
+    def __init__(self, per_host=CRAWL_JOB_PER_HOST, interval=CRAWL_JOB_HOST_INTERVAL):
+        self.per_host = per_host
+        self.interval = interval
+        self._hosts = {}  # host -> [semaphore, lock, 下一次允许开始请求的时间, 正在运行或等待的请求数]
+
+    def _state(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = [asyncio.Semaphore(self.per_host), asyncio.Lock(), 0.0, 0]
+        return self._hosts[host]
+
+    async def acquire(self, host):
+        state = self._state(host)
+        state[3] += 1
+        acquired = False
+        try:
+            await state[0].acquire()
+            acquired = True
+            async with state[1]:
+                loop = asyncio.get_running_loop()
+                wait = state[2] - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state[2] = loop.time() + self.interval
+        except BaseException:
+            # 等待时被取消：归还已获取的名额
+            if acquired:
+                state[0].release()
+            self._leave(host, state)
+            raise
+
+    def release(self, host):
+        state = self._hosts[host]
+        state[0].release()
+        self._leave(host, state)
+
+    def _leave(self, host, state):
+        state[3] -= 1
+        if state[3] == 0:
+            # 间隔到期后仍然空闲就删除该主机的条目
+            asyncio.get_running_loop().call_at(state[2], self._discard_idle, host, state)
+
+    def _discard_idle(self, host, state):
+        if state[3] == 0 and self._hosts.get(host) is state:
+            del self._hosts[host]
+
+    def __len__(self):
+        return len(self._hosts)
+
+
+class CrawlJob:
+    """One job's files; every method reads or writes the job directory"""
+
+    def __init__(self, job_id, directory=CRAWL_JOB_DIR):
+        self.id = job_id
+        self.path = os.path.join(directory, job_id)
+        self.job_path = os.path.join(self.path, 'job.json')
+        self.results_path = os.path.join(self.path, 'results.ndjson')
+        self._lock_file = None
+
+    def exists(self):
+        return os.path.exists(self.job_path)
+
+    def load(self):
+        with open(self.job_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, state):
+        _write_json(self.job_path, state)
+
+    def try_lock(self):
+        """获取任务的运行锁；其他进程正在运行该任务时返回False"""
+        if fcntl is None:
+            return True
+        self._lock_file = open(os.path.join(self.path, 'job.lock'), 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def is_running(self):
+        """是否有进程持有该任务的运行锁（无法判断时返回True）"""
+        if fcntl is None:
+            return True
+        try:
+            with open(os.path.join(self.path, 'job.lock'), 'a') as probe:
+                # 共享锁与运行者的排他锁冲突；拿到说明没有进程在运行该任务
+                fcntl.flock(probe, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                fcntl.flock(probe, fcntl.LOCK_UN)
+                return False
+        except OSError:
+            return True
+
+    def unlock(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def finished_indices(self):
+        """已有结果的URL序号；崩溃时写了一半的最后一行会被截掉"""
+        done = set()
+        try:
+            with open(self.results_path, 'rb+') as f:
+                valid = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        done.add(json.loads(line)["index"])
+                    except (ValueError, KeyError):
+                        break
+                    valid += len(line)
+                f.truncate(valid)
+        except FileNotFoundError:
+            pass
+        return done
+
+    def read_results(self, offset=0):
+        """Yield complete result lines from line number offset onwards"""
+        try:
+            with open(self.results_path, 'r', encoding='utf-8') as f:
+                for number, line in enumerate(f):
+                    if not line.endswith("\n"):
+                        return
+                    if number >= offset:
+                        yield line
+        except FileNotFoundError:
+            return
+
+
+class CrawlJobManager:
+    """Creates jobs and runs them on a background event loop in this process"""
+
+    def __init__(self, directory=CRAWL_JOB_DIR, concurrency=CRAWL_JOB_CONCURRENCY,
+                 parse_workers=CRAWL_JOB_PARSE_WORKERS):
+        self.directory = directory
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.client = AsyncPooledHTTPClient("crawl-jobs", pool_maxsize=concurrency, read_timeout=CRAWL_JOB_TIMEOUT)
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._slots = None
+        self._hosts = None
+        self._parse_pool = None
+        self._active = {}  # job_id -> 本进程中运行的任务的计数
+        self._revalidation_tasks = set()  # 持有后台重新验证任务的引用，防止被垃圾回收
+        self._fetching = 0
+
+    # ---- 后台事件循环 ----
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+
+            def run():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._slots = asyncio.Semaphore(self.concurrency)
+                self._hosts = _HostLimiter()
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="crawl-jobs", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _get_parse_pool(self):
+        if self.parse_workers > 0 and self._parse_pool is None:
+            # spawn：不从带有多个线程的web进程fork子进程；工作进程不会重新执行 app.py 的启动流程
+            self._parse_pool = create_process_pool(self.parse_workers)
+        return self._parse_pool
+
+    def _discard_parse_pool(self, pool):
+        """工作进程崩溃（如内存不足或lxml段错误）后，进程池不再可用：关闭它，下次重新创建"""
+        if self._parse_pool is pool:
+            self._parse_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---- 创建和恢复任务 ----
+
+    def create_job(self, urls=None, sitemap=None):
+        """Validate the input, write the job files and start it; returns the job id
+
+        Raises ValueError for an empty or invalid URL list or sitemap URL.
+        """
+        if sitemap is not None:
+            if not _is_http_url(sitemap):
+                raise ValueError("sitemap must be an http(s) URL")
+            urls = []
+        else:
+            if not isinstance(urls, list) or not urls:
+                raise ValueError("urls must be a non-empty list")
+            if not all(_is_http_url(url) for url in urls):
+                raise ValueError("Each URL must be an http(s) URL")
+            urls = self._dedupe(urls)
+            if len(urls) > CRAWL_JOB_MAX_URLS:
+                raise ValueError(f"At most {CRAWL_JOB_MAX_URLS} URLs per job")
+
+        job = CrawlJob(uuid.uuid4().hex, self.directory)
+        os.makedirs(job.path, exist_ok=True)
+        job.save({
+            "id": job.id,
+            "status": EXPANDING if sitemap is not None else QUEUED,
+            "sitemap": sitemap,
+            "urls": urls,
+            "total": len(urls),
+            "succeeded": 0,
+            "failed": 0,
+            "from_cache": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        })
+        self._start(job)
+        return job.id
+
+    @staticmethod
+    def _dedupe(urls):
+        seen = set()
+        unique = []
+        for url in urls:
+            key = normalize_url(url)
+            if key not in seen:
+                seen.add(key)
+                unique.append(url.strip())
+        return unique
+
+    def _start(self, job):
+        if not job.try_lock():
+            return False
+        self._ensure_loop()
+        asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+        return True
+
+    def resume_incomplete(self):
+        """Restart unfinished jobs that no other process is running; returns their ids"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        resumed = []
+        for name in sorted(names):
+            job = CrawlJob(name, self.directory)
+            if not valid_job_id(name) or not job.exists():
+                continue
+            try:
+                if job.load()["status"] in FINISHED_STATUSES:
+                    continue
+            except (OSError, ValueError):
+                continue
+            if self._start(job):
+                resumed.append(name)
+        if resumed:
+            print(f"恢复未完成的爬取任务: {resumed}")
+        return resumed
+
+    def get_job(self, job_id):
+        """job.json contents without the URL list, or None for an unknown job"""
+        if not valid_job_id(job_id):
+            return None
+        job = CrawlJob(job_id, self.directory)
+        try:
+            state = job.load()
+        except (OSError, ValueError):
+            return None
+        state.pop("urls", None)
+        state["done"] = state["succeeded"] + state["failed"]
+        state["progress"] = round(state["done"] / state["total"], 4) if state["total"] else 0.0
+        return state
+
+    def stream_results(self, job_id, offset=0, poll_interval=0.5, idle_timeout=CRAWL_JOB_STREAM_IDLE_TIMEOUT):
+        """Yield result lines as they are written, until the job finishes
+
+        The stream also ends when no process is running the job (its owner
+        died; it resumes on the next restart) or when no new result arrived
+        for idle_timeout seconds, so a stuck job does not hold a worker.
+        """
+        job = CrawlJob(job_id, self.directory)
+        last_result = time.monotonic()
+        while True:
+            finished = job.load()["status"] in FINISHED_STATUSES
+            orphaned = not finished and job_id not in self._active and not job.is_running()
+            for line in job.read_results(offset):
+                offset += 1
+                last_result = time.monotonic()
+                yield line
+            if finished or orphaned:
+                return
+            if time.monotonic() - last_result >= idle_timeout:
+                print(f"爬取任务 {job_id} 的结果流空闲超时")
+                return
+            time.sleep(poll_interval)
+
+    # ---- 运行任务（在后台事件循环中） ----
+
+    async def _run(self, job):
+        try:
+            state = job.load()
+            if state["status"] == EXPANDING:
+                try:
+                    state["urls"] = self._dedupe(await self._expand_sitemap(state["sitemap"]))
+                except Exception as e:
+                    print(f"读取sitemap失败: {str(e)}")
+                    state.update(status=FAILED, error=f"Failed to read sitemap: {str(e)}", finished_at=time.time())
+                    job.save(state)
+                    return
+                state["total"] = len(state["urls"])
+                state["status"] = QUEUED
+
+            done = job.finished_indices()
+            counts = {"succeeded": 0, "failed": 0, "from_cache": 0}
+            for line in job.read_results():
+                result = json.loads(line)
+                counts["succeeded" if result["status"] == "ok" else "failed"] += 1
+                counts["from_cache"] += result.get("source") == "cache"
+            state.update(counts, status=RUNNING, started_at=state["started_at"] or time.time())
+            job.save(state)
+            self._active[job.id] = counts
+            print(f"爬取任务 {job.id}: {len(state['urls'])} 个URL，已完成 {len(done)} 个")
+
+            pending = [(i, url) for i, url in enumerate(state["urls"]) if i not in done]
+            last_saved = time.monotonic()
+            with open(job.results_path, 'a', encoding='utf-8') as results:
+                tasks = [asyncio.ensure_future(self._crawl_one(i, url)) for i, url in pending]
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    results.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    results.flush()
+                    counts["succeeded" if result["status"] == "ok" else "failed"] += 1
+                    counts["from_cache"] += result["source"] == "cache"
+                    if time.monotonic() - last_saved >= CRAWL_JOB_PROGRESS_INTERVAL:
+                        state.update(counts)
+                        job.save(state)
+                        last_saved = time.monotonic()
+
+            state.update(counts, status=COMPLETED, finished_at=time.time())
+            job.save(state)
+            print(f"爬取任务 {job.id} 完成: 成功 {counts['succeeded']}，失败 {counts['failed']}")
+        except Exception as e:
+            # 任务文件损坏等意外错误：标记为失败，结果流和状态查询不会一直等待
+            print(f"爬取任务 {job.id} 出错: {str(e)}")
+            try:
+                state = job.load()
+                state.update(status=FAILED, error=f"Job failed: {str(e)}", finished_at=time.time())
+                job.save(state)
+            except (OSError, ValueError) as save_error:
+                print(f"无法记录爬取任务 {job.id} 的失败状态: {str(save_error)}")
+        finally:
+            self._active.pop(job.id, None)
+            job.unlock()
+
+    async def _expand_sitemap(self, url, depth=0):
+        """sitemap中的页面URL；sitemap索引会展开一层"""
+        response = await self._get(url, crawler_service.BROWSER_HEADERS)
+        response.raise_for_status()
+        content = response.content
+        if content[:2] == b"\x1f\x8b":  # .xml.gz
+            content = gzip.decompress(content)
+        text = content.decode('utf-8', errors='replace')
+        locations = [html.unescape(loc) for loc in _SITEMAP_LOC.findall(text)]
+        if "<sitemapindex" in text[:1000].lower() and depth == 0:
+            urls = []
+            for child in locations:
+                urls.extend(await self._expand_sitemap(child, depth + 1))
+                if len(urls) >= CRAWL_JOB_MAX_URLS:
+                    break
+            locations = urls
+        return [loc for loc in locations if _is_http_url(loc)][:CRAWL_JOB_MAX_URLS]
+
+    async def _crawl_one(self, index, url):
+        started = time.perf_counter()
+        result = {"index": index, "url": url}
+        async with self._slots:
+            try:
+                program_info, source = await self._fetch_and_parse(url)
+                result.update(status="ok", source=source, program=program_info)
+            except Exception as e:
+                result.update(status="error", source="fetch", error=str(e))
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def _fetch_and_parse(self, url):
+        cache = crawler_service.program_cache
+        entry, state = await asyncio.to_thread(cache.lookup, url)
+        if state == FRESH:
+            return entry["value"], "cache"
+        if state == STALE:
+            # 与 crawler_service 相同：先返回旧条目，再在后台重新验证
+            if cache.claim_revalidation(url):
+                task = asyncio.ensure_future(self._revalidate(url, entry))
+                self._revalidation_tasks.add(task)
+                task.add_done_callback(self._revalidation_tasks.discard)
+            return entry["value"], "cache"
+        return await self._fetch(url, entry)
+
+    async def _revalidate(self, url, entry):
+        """后台重新验证（stale-while-revalidate）；失败时保留旧条目"""
+        try:
+            async with self._slots:
+                await self._fetch(url, entry)
+        except Exception as e:
+            print(f"后台重新验证失败: {url}: {str(e)}")
+        finally:
+            crawler_service.program_cache.release_revalidation(url)
+
+    async def _get(self, url, headers):
+        """GET under the per-host concurrency limit and request spacing"""
+        host = urlsplit(url).hostname or ""
+        await self._hosts.acquire(host)
+        self._fetching += 1
+        try:
+            return await self.client.get(url, headers=headers)
+        finally:
+            self._fetching -= 1
+            self._hosts.release(host)
+
+    async def _fetch(self, url, entry):
+        """条件GET（有缓存条目时），解析并写入缓存；返回 (program_info, source)"""
+        cache = crawler_service.program_cache
+        response = await self._get(url, {**crawler_service.BROWSER_HEADERS, **cache.conditional_headers(entry)})
+
+        if response.status_code == 304 and entry is not None:
+            return (await asyncio.to_thread(cache.revalidated, url, entry))["value"], "not_modified"
+        response.raise_for_status()
+
+        program_info = await self._parse(response.text)
+        await asyncio.to_thread(cache.store, url, program_info, response.headers, entry is not None)
+        return program_info, "fetched"
+
+    async def _parse(self, text):
+        """在进程池中解析页面；进程池损坏时换一个新进程池重试一次"""
+        if self.parse_workers <= 0:
+            return await asyncio.to_thread(crawler_service.extract_program_info, text)
+        for attempt in range(2):
+            pool = self._get_parse_pool()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    pool, crawler_service.extract_program_info, text)
+            except BrokenProcessPool:
+                self._discard_parse_pool(pool)
+                if attempt:
+                    raise
+                print("解析进程池已损坏，使用新的进程池重试")
+
+    def stats(self):
+        return {
+            "active_jobs": len(self._active),
+            "fetching": self._fetching,
+            "concurrency": self.concurrency,
+            "per_host": CRAWL_JOB_PER_HOST,
+            "host_interval_seconds": CRAWL_JOB_HOST_INTERVAL,
+            "hosts_tracked": len(self._hosts) if self._hosts is not None else 0,
+            "parse_workers": self.parse_workers,
+            "revalidations_in_flight": len(self._revalidation_tasks)
+        }
+
+
+# 全局任务管理器
+manager = CrawlJobManager()
@@ -1,16 +1,16 @@
 import os
-import requests
 import json
 from dotenv import load_dotenv
 import time
 import re
+import threading
+from collections import OrderedDict
+from http_client import PooledHTTPClient, AsyncPooledHTTPClient, HTTP_CONNECT_TIMEOUT
+from response_cache import ResponseCache, make_cache_key
 
 # First load environment variables from .env file
 load_dotenv()
 
-# Add delay to ensure environment variables have time to load
-time.sleep(1)
-
 # Safely get API key from environment variables
 # 尝试多种可能的环境变量名称
 API_KEY = os.getenv('API') or os.getenv('DEEPSEEK_API_KEY') or os.getenv('DEEPSEEK_API')
@@ -21,8 +21,18 @@ print("API key前10个字符:", API_KEY[:10] if API_KEY else "None")  # 只打
 print("Environment variables:", list(os.environ.keys()))  # 打印所有环境变量名称（不打印值）
 
 # DeepSeek API configuration
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL', "https://api.deepseek.com/v1/chat/completions")
 DEEPSEEK_MODEL = "deepseek-chat"  # Alternatively, use "deepseek-coder" for code-related tasks
+DEEPSEEK_MAX_TOKENS = 2000
+DEEPSEEK_TEMPERATURE = 0.9  # 提高temperature以增加多样性
+
+# 会话存储配置（可通过环境变量覆盖）
+CHAT_SESSION_TOKEN_BUDGET = int(os.getenv('CHAT_SESSION_TOKEN_BUDGET', 6000))  # 每个会话保留的历史token上限
+CHAT_MAX_SESSIONS = int(os.getenv('CHAT_MAX_SESSIONS', 1000))  # 同时保留的会话数量上限
+CHAT_MAX_TOTAL_TOKENS = int(os.getenv('CHAT_MAX_TOTAL_TOKENS', 2000000))  # 所有会话合计的内存上限（按token估算）
+CHAT_SESSION_IDLE_TTL = int(os.getenv('CHAT_SESSION_IDLE_TTL', 3600))  # 空闲会话过期时间（秒）
+DEEPSEEK_PROBE_TIMEOUT = float(os.getenv('DEEPSEEK_PROBE_TIMEOUT', 10))  # 连接测试的读取超时（秒）
+DEEPSEEK_HEALTH_INTERVAL = int(os.getenv('DEEPSEEK_HEALTH_INTERVAL', 300))  # 后台健康检查间隔（秒）
 
 # System prompt
 SYSTEM_PROMPT = """You are a professional educational consultant assistant, specializing in helping students plan their learning paths and course selections. 
@@ -63,31 +73,248 @@ Your primary goal is to create highly personalized academic plans based on the s
 
 Use a friendly, encouraging, and professional tone throughout your response, providing detailed explanations while remaining concise and focused on actionable advice."""
 
+def estimate_tokens(text):
+    """粗略估算文本的token数量（约4个字符一个token）"""
+    return max(1, len(text) // 4)
+
+
+class ConversationStore:
+    """Session-keyed chat history with per-session token budget and LRU eviction"""
+
+    def __init__(self, session_token_budget=CHAT_SESSION_TOKEN_BUDGET, max_sessions=CHAT_MAX_SESSIONS,
+                 max_total_tokens=CHAT_MAX_TOTAL_TOKENS, idle_ttl=CHAT_SESSION_IDLE_TTL):
+        self.session_token_budget = session_token_budget
+        self.max_sessions = max_sessions
+        self.max_total_tokens = max_total_tokens
+        self.idle_ttl = idle_ttl
+        # session_id -> {"messages": [...], "tokens": int, "last_access": float}
+        # OrderedDict按访问顺序排列，最久未使用的会话在最前面
+        self._sessions = OrderedDict()
+        self._total_tokens = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_history(self, session_id):
+        """返回会话历史的副本（会话不存在时返回空列表）"""
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._touch(session_id, session)
+            return [dict(m) for m in session["messages"]]
+
+    def history_with(self, session_id, role, content):
+        """会话历史加上一条新消息（按token预算裁剪后）的副本，不写入会话
+
+        Used to build a request; the turn is saved with append_turn only
+        after the API call succeeds, so a failed call leaves no orphan message.
+        """
+        messages = self.get_history(session_id)
+        messages.append({"role": role, "content": content, "tokens": estimate_tokens(content)})
+        tokens = sum(m["tokens"] for m in messages)
+        while tokens > self.session_token_budget and len(messages) > 1:
+            tokens -= messages.pop(0)["tokens"]
+        return messages
+
+    def append(self, session_id, role, content):
+        """向会话追加一条消息，并按token预算裁剪最旧的消息"""
+        self.append_turn(session_id, (role, content))
+
+    def append_turn(self, session_id, *messages):
+        """向会话追加若干条 (role, content) 消息（如用户消息和助手回复），并按token预算裁剪最旧的消息"""
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = {"messages": [], "tokens": 0, "last_access": time.time()}
+                self._sessions[session_id] = session
+
+            for role, content in messages:
+                tokens = estimate_tokens(content)
+                session["messages"].append({"role": role, "content": content, "tokens": tokens})
+                session["tokens"] += tokens
+                self._total_tokens += tokens
+            self._touch(session_id, session)
+
+            # 超出会话预算时丢弃最旧的消息，但始终保留最新的一条
+            while session["tokens"] > self.session_token_budget and len(session["messages"]) > 1:
+                self._drop_oldest_message(session)
+
+            self._enforce_limits(keep=session_id)
+
+    def clear(self, session_id):
+        """删除一个会话"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_tokens -= session["tokens"]
+
+    def stats(self):
+        """返回存储的统计信息"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_tokens": self._total_tokens,
+                "max_sessions": self.max_sessions,
+                "max_total_tokens": self.max_total_tokens,
+                "session_token_budget": self.session_token_budget,
+                "evictions": self.evictions
+            }
+
+    def _touch(self, session_id, session):
+        session["last_access"] = time.time()
+        self._sessions.move_to_end(session_id)
+
+    def _drop_oldest_message(self, session):
+        dropped = session["messages"].pop(0)
+        session["tokens"] -= dropped["tokens"]
+        self._total_tokens -= dropped["tokens"]
+
+    def _evict_oldest_session(self):
+        _, session = self._sessions.popitem(last=False)
+        self._total_tokens -= session["tokens"]
+        self.evictions += 1
+
+    def _expire_idle(self):
+        """移除空闲时间超过TTL的会话（最旧的会话排在最前面）"""
+        if not self.idle_ttl:
+            return
+        cutoff = time.time() - self.idle_ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest["last_access"] >= cutoff:
+                break
+            self._evict_oldest_session()
+
+    def _enforce_limits(self, keep):
+        """按LRU顺序淘汰会话，直到满足会话数量和总内存上限"""
+        while len(self._sessions) > self.max_sessions or self._total_tokens > self.max_total_tokens:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep:
+                # 只剩当前会话时，裁剪它自己的历史
+                session = self._sessions[keep]
+                if len(session["messages"]) <= 1:
+                    break
+                self._drop_oldest_message(session)
+                continue
+            self._evict_oldest_session()
+
+
+def _redacted(headers):
+    """用于日志的请求头副本：不输出API密钥"""
+    return {name: ("Bearer ***" if name.lower() == "authorization" else value) for name, value in headers.items()}
+
+
+class HealthChecker:
+    """Runs a connectivity probe on a background thread, lazily and periodically
+    
+    The thread is only started on first use, so importing the service never
+    waits on the network. Status is "unknown" until the first probe finishes.
+    """
+
+    def __init__(self, probe, interval=DEEPSEEK_HEALTH_INTERVAL):
+        self.probe = probe
+        self.interval = interval
+        self.status = "unknown"
+        self.last_checked = None
+        self.last_success = None
+        self.last_error = None
+        self.latency_ms = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def ensure_started(self):
+        """启动后台检查线程（若尚未启动；fork出的新进程会重新启动）"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="deepseek-health", daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        """请求尽快重新检查（例如实际请求失败后）"""
+        self.ensure_started()
+        self._wake.set()
+
+    def record_success(self):
+        """实际请求成功时同步更新状态，无需等待下一次探测"""
+        self.status = "healthy"
+        self.last_success = time.time()
+        self.last_error = None
+
+    def check_now(self):
+        started = time.time()
+        try:
+            self.probe()
+            self.latency_ms = round((time.time() - started) * 1000, 1)
+            self.record_success()
+            print("DeepSeek API connection successful!")
+        except Exception as e:
+            self.latency_ms = round((time.time() - started) * 1000, 1)
+            self.status = "unhealthy"
+            self.last_error = str(e)
+            print(f"Error connecting to DeepSeek API: {str(e)}")
+        finally:
+            self.last_checked = time.time()
+
+    def _run(self):
+        while True:
+            self.check_now()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def report(self):
+        return {
+            "status": self.status,
+            "last_checked": self.last_checked,
+            "last_success": self.last_success,
+            "last_error": self.last_error,
+            "latency_ms": self.latency_ms,
+            "interval_seconds": self.interval
+        }
+
+
 class ChatService:
     def __init__(self):
-        """Initialize the chat service with API key and empty chat history"""
+        """Initialize the chat service with API key and an empty conversation store
+        
+        The API connection is not tested here; a background HealthChecker
+        probes it on first use and then periodically.
+        """
         self.api_key = API_KEY
         self.api_key_loaded = bool(self.api_key)
-        self.api_key_valid = False
-        self.chat_history = []
+        self.conversations = ConversationStore()
+        # 所有DeepSeek请求共用一个带连接池的客户端（keep-alive、超时、重试）
+        self.http = PooledHTTPClient("deepseek")
+        # 异步服务路径（asgi.py）使用的客户端
+        self.async_http = AsyncPooledHTTPClient("deepseek-async")
+        self.health = HealthChecker(self._test_api_connection)
+        # 课程计划和职业建议的提示词高度重复，缓存其回复
+        self.response_cache = ResponseCache()
         
         print("Creating ChatService instance...")
         print(f"API密钥加载状态: {self.api_key_loaded}")
         print(f"API密钥前10个字符: {self.api_key[:10] if self.api_key else 'None'}")
-        
-        # Test API connection
-        if self.api_key_loaded:
-            try:
-                print("Testing DeepSeek API connection...")
-                self._test_api_connection()
-                self.api_key_valid = True
-                print("DeepSeek API connection successful!")
-            except Exception as e:
-                print(f"Error connecting to DeepSeek API: {str(e)}")
-                self.api_key_valid = False
-        
         print("ChatService instance created")
     
+    @property
+    def api_key_valid(self):
+        """在探测确认API不可用之前都视为可用，避免启动时阻塞"""
+        return self.api_key_loaded and self.health.status != "unhealthy"
+    
+    def health_report(self):
+        """返回DeepSeek连接状态，供 /api/health 使用"""
+        if not self.api_key_loaded:
+            return {"status": "not_configured"}
+        self.health.ensure_started()
+        return self.health.report()
+    
     def _test_api_connection(self):
         """Test connection to DeepSeek API"""
         headers = {
@@ -105,44 +332,59 @@ class ChatService:
         }
         
         print(f"发送测试请求到DeepSeek API: URL={DEEPSEEK_API_URL}")
-        print(f"请求头: {json.dumps(headers, default=str)}")
+        print(f"请求头: {json.dumps(_redacted(headers), default=str)}")
         
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
+        # 测试请求不重试，并使用较短的超时
+        response = self.http.post(DEEPSEEK_API_URL, headers=headers, json=data, max_retries=0,
+                                  timeout=(HTTP_CONNECT_TIMEOUT, DEEPSEEK_PROBE_TIMEOUT))
         if response.status_code != 200:
             raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
     
-    def send_message(self, message):
-        """Send message to DeepSeek API and get reply"""
-        if not self.api_key_loaded or not self.api_key_valid:
-            # 不再使用硬编码的mock response，而是返回明确的错误信息
-            print(f"API密钥问题: loaded={self.api_key_loaded}, valid={self.api_key_valid}")
-            return self._generate_fallback_response(message)
-        
+    def _build_messages(self, message, session_id):
+        """构建发送给API的消息列表；session_id为None时不保留历史"""
+        if session_id is None:
+            history = [{"role": "user", "content": message}]
+        else:
+            # This session's history plus the user message (trimmed to the token budget)
+            # 用户消息在请求成功后才与回复一起保存（_save_turn），失败的请求不会留下孤立的用户消息
+            history = [{"role": m["role"], "content": m["content"]}
+                       for m in self.conversations.history_with(session_id, "user", message)]
+        return [{"role": "system", "content": SYSTEM_PROMPT}] + history
+    
+    def _save_turn(self, session_id, message, assistant_message):
+        """把一轮对话（用户消息和助手回复）一起加入会话历史"""
+        if session_id is not None:
+            self.conversations.append_turn(session_id, ("user", message), ("assistant", assistant_message))
+    
+    def _request_headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    def _request_payload(self, messages, stream=False):
+        data = {
+            "model": DEEPSEEK_MODEL,
+            "messages": messages,
+            "max_tokens": DEEPSEEK_MAX_TOKENS,
+            "temperature": DEEPSEEK_TEMPERATURE
+        }
+        if stream:
+            data["stream"] = True
+        return data
+    
+    def _request_completion(self, messages):
+        """Call DeepSeek API and return the assistant content, or None if the call failed"""
         try:
-            # Add user message to history
-            self.chat_history.append({"role": "user", "content": message})
-            
-            # Prepare full message history
-            messages = [{"role": "system", "content": SYSTEM_PROMPT}] + self.chat_history
-            
             # Call DeepSeek API
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": DEEPSEEK_MODEL,
-                "messages": messages,
-                "max_tokens": 2000,
-                "temperature": 0.9  # 提高temperature以增加多样性
-            }
+            headers = self._request_headers()
+            data = self._request_payload(messages)
             
             print(f"发送请求到DeepSeek API: URL={DEEPSEEK_API_URL}, 模型={DEEPSEEK_MODEL}")
-            print(f"请求头: {json.dumps(headers, default=str)}")
+            print(f"请求头: {json.dumps(_redacted(headers), default=str)}")
             print(f"请求数据: {json.dumps(data, default=str)[:200]}...")  # 只打印部分数据
             
-            response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
+            response = self.http.post(DEEPSEEK_API_URL, headers=headers, json=data)
             
             print(f"API响应状态码: {response.status_code}")
             if response.status_code != 200:
@@ -150,19 +392,154 @@ class ChatService:
             
             if response.status_code == 200:
                 response_data = response.json()
-                assistant_message = response_data["choices"][0]["message"]["content"]
-                
-                # Add assistant reply to history
-                self.chat_history.append({"role": "assistant", "content": assistant_message})
-                
-                return assistant_message
+                self.health.record_success()
+                return response_data["choices"][0]["message"]["content"]
             else:
                 print(f"API request failed with status code {response.status_code}: {response.text}")
-                return self._generate_fallback_response(message)
+                self.health.trigger()
+                return None
                 
         except Exception as e:
             print(f"Error sending message: {str(e)}")
+            self.health.trigger()
+            return None
+    
+    def send_message(self, message, session_id=None):
+        """Send message to DeepSeek API and get reply
+        
+        Messages sharing a session_id form one conversation; without a
+        session_id the message is sent on its own, with no history.
+        """
+        if self.api_key_loaded:
+            self.health.ensure_started()
+        if not self.api_key_loaded or not self.api_key_valid:
+            # 不再使用硬编码的mock response，而是返回明确的错误信息
+            print(f"API密钥问题: loaded={self.api_key_loaded}, valid={self.api_key_valid}")
+            return self._generate_fallback_response(message)
+        
+        # Prepare message history for this session
+        messages = self._build_messages(message, session_id)
+        assistant_message = self._request_completion(messages)
+        if assistant_message is None:
+            return self._generate_fallback_response(message)
+        
+        # Add the user message and the assistant reply to history
+        self._save_turn(session_id, message, assistant_message)
+        
+        return assistant_message
+    
+    async def _request_completion_async(self, messages):
+        """Async variant of _request_completion"""
+        try:
+            print(f"发送异步请求到DeepSeek API: URL={DEEPSEEK_API_URL}, 模型={DEEPSEEK_MODEL}")
+            response = await self.async_http.post(DEEPSEEK_API_URL, headers=self._request_headers(),
+                                                  json=self._request_payload(messages))
+            
+            if response.status_code == 200:
+                self.health.record_success()
+                return response.json()["choices"][0]["message"]["content"]
+            
+            print(f"API request failed with status code {response.status_code}: {response.text}")
+            self.health.trigger()
+            return None
+        except Exception as e:
+            print(f"Error sending message: {str(e)}")
+            self.health.trigger()
+            return None
+    
+    async def send_message_async(self, message, session_id=None):
+        """Async variant of send_message, used by the asyncio serving path"""
+        if self.api_key_loaded:
+            self.health.ensure_started()
+        if not self.api_key_loaded or not self.api_key_valid:
+            print(f"API密钥问题: loaded={self.api_key_loaded}, valid={self.api_key_valid}")
             return self._generate_fallback_response(message)
+        
+        messages = self._build_messages(message, session_id)
+        assistant_message = await self._request_completion_async(messages)
+        if assistant_message is None:
+            return self._generate_fallback_response(message)
+        
+        self._save_turn(session_id, message, assistant_message)
+        
+        return assistant_message
+    
+    def send_cached_message(self, message):
+        """Send a standalone prompt, reusing a cached reply for an equivalent prompt
+        
+        Only successful API replies are cached; fallback responses are not.
+        """
+        key = make_cache_key(message, DEEPSEEK_MODEL, system=SYSTEM_PROMPT,
+                             max_tokens=DEEPSEEK_MAX_TOKENS, temperature=DEEPSEEK_TEMPERATURE)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if self.api_key_loaded:
+            self.health.ensure_started()
+        if not self.api_key_loaded or not self.api_key_valid:
+            print(f"API密钥问题: loaded={self.api_key_loaded}, valid={self.api_key_valid}")
+            return self._generate_fallback_response(message)
+        
+        assistant_message = self._request_completion(self._build_messages(message, None))
+        if assistant_message is None:
+            return self._generate_fallback_response(message)
+        
+        self.response_cache.set(key, assistant_message)
+        return assistant_message
+    
+    def stream_message(self, message, session_id=None):
+        """Send message to DeepSeek API with stream=true and yield the reply in chunks
+        
+        The user message and the complete reply are added to the session
+        history once the stream ends; nothing is saved if no reply arrived.
+        If the API is unavailable the fallback response is yielded as one chunk.
+        """
+        if self.api_key_loaded:
+            self.health.ensure_started()
+        if not self.api_key_loaded or not self.api_key_valid:
+            print(f"API密钥问题: loaded={self.api_key_loaded}, valid={self.api_key_valid}")
+            yield self._generate_fallback_response(message)
+            return
+        
+        chunks = []
+        try:
+            messages = self._build_messages(message, session_id)
+            data = self._request_payload(messages, stream=True)
+            
+            print(f"发送流式请求到DeepSeek API: URL={DEEPSEEK_API_URL}, 模型={DEEPSEEK_MODEL}")
+            
+            with self.http.post(DEEPSEEK_API_URL, headers=self._request_headers(), json=data, stream=True) as response:
+                print(f"API响应状态码: {response.status_code}")
+                if response.status_code != 200:
+                    print(f"API request failed with status code {response.status_code}: {response.text}")
+                    self.health.trigger()
+                    yield self._generate_fallback_response(message)
+                    return
+                
+                # 上游返回SSE格式: 每行 "data: {...}"，以 "data: [DONE]" 结束
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    delta = json.loads(payload)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        chunks.append(delta)
+                        yield delta
+        except Exception as e:
+            print(f"Error streaming message: {str(e)}")
+            self.health.trigger()
+            if not chunks:
+                yield self._generate_fallback_response(message)
+                return
+        
+        if chunks:
+            self.health.record_success()
+        # Add the user message and the assistant reply to history
+        if chunks:
+            self._save_turn(session_id, message, "".join(chunks))
     
     def _generate_fallback_response(self, message):
         """生成备用响应，当API不可用时使用"""
@@ -497,7 +874,7 @@ Format your response in Markdown with:
 - Include an 'Additional Recommendations' section
 - Include a 'Summary' section
 """
-        return self.send_message(prompt)
+        return self.send_cached_message(prompt)
     
     def _generate_career_advice(self, program, career, interests):
         """使用DeepSeek API生成个性化职业发展建议"""
@@ -512,7 +889,7 @@ Based on a {program} background, generate a detailed career development plan for
 - Use a professional but friendly tone.
 - Format the response in Markdown with clear sections.
 """
-        return self.send_message(prompt)
+        return self.send_cached_message(prompt)
 
 # Create a singleton instance
 print("Creating ChatService instance...")
@@ -0,0 +1,179 @@
+import itertools
+import numpy as np
+
+# 专业顺序决定one-hot编码的列顺序，不能随意修改（修改后需要递增模型版本）
+MAJORS = ["CS", "MATH", "ENG", "BIO", "PHYS", "CHEM", "ECON", "PSYCH"]
+MAJOR_INDEX = {major: i for i, major in enumerate(MAJORS)}
+NUMERIC_FEATURES = ["semester", "gpa", "num_completed", "mean_grade"]
+
+
+def encode_majors(majors):
+    """专业名称 -> 整数编码；未知专业编码为-1（one-hot全为0）"""
+    return np.fromiter((MAJOR_INDEX.get(m, -1) for m in majors), dtype=np.int8, count=len(majors))
+
+
+class StudentFeatureStore:
+    """Columnar store of student rows, built once and shared by training, visualization and queries
+
+    Per-student scalars are NumPy arrays; completed courses and grades are
+    kept CSR-style (flat course_ids/grades arrays sliced by course_offsets),
+    so counts and mean grades are computed with array operations instead of
+    per-student Python loops.
+    """
+
+    def __init__(self, student_ids, major_codes, semester, gpa, course_offsets, course_ids, grades, course_codes):
+        self.student_ids = np.asarray(student_ids, dtype=np.int64)
+        self.major_codes = np.asarray(major_codes, dtype=np.int8)
+        self.semester = np.asarray(semester, dtype=np.float64)
+        self.gpa = np.asarray(gpa, dtype=np.float64)
+        self.course_offsets = np.asarray(course_offsets, dtype=np.int64)
+        self.course_ids = np.asarray(course_ids, dtype=np.int32)
+        self.grades = np.asarray(grades, dtype=np.float64)
+        self.course_codes = list(course_codes)
+
+        self.num_completed = np.diff(self.course_offsets).astype(np.float64)
+        # 用前缀和计算每个学生的成绩总和，空行自然为0
+        grade_cumsum = np.concatenate(([0.0], np.cumsum(self.grades)))
+        grade_sums = grade_cumsum[self.course_offsets[1:]] - grade_cumsum[self.course_offsets[:-1]]
+        self.mean_grade = np.divide(grade_sums, self.num_completed,
+                                    out=np.zeros(len(self.student_ids)), where=self.num_completed > 0)
+        self._build_id_index()
+
+    def _build_id_index(self):
+        """student_id -> 行号索引
+
+        学号较密集时使用直接寻址数组（O(1)查找，可随模型文件内存映射共享），
+        否则退回到有序数组上的二分查找。
+        """
+        n = len(self.student_ids)
+        max_id = int(self.student_ids.max()) if n else -1
+        if n and self.student_ids.min() >= 0 and max_id < 4 * n + 1024:
+            self._row_by_id = np.full(max_id + 1, -1, dtype=np.int64)
+            self._row_by_id[self.student_ids] = np.arange(n, dtype=np.int64)
+            self._sorted_ids = None
+            self._sorted_rows = None
+        else:
+            self._row_by_id = None
+            self._sorted_rows = np.argsort(self.student_ids, kind='stable')
+            self._sorted_ids = self.student_ids[self._sorted_rows]
+
+    def row_for(self, student_id):
+        """Row index of a student, or -1 if the id is not in the store"""
+        try:
+            student_id = int(student_id)
+        except (TypeError, ValueError):
+            return -1
+        if self._row_by_id is not None:
+            if 0 <= student_id < len(self._row_by_id):
+                return int(self._row_by_id[student_id])
+            return -1
+        pos = int(np.searchsorted(self._sorted_ids, student_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == student_id:
+            return int(self._sorted_rows[pos])
+        return -1
+
+    @classmethod
+    def from_records(cls, records, course_codes=None):
+        """Build the store from a list of student dicts (SyntheticStudentGenerator.iter_records format)
+
+        Only the flattening of each student's course list touches Python
+        objects; everything downstream is array arithmetic.
+        """
+        n = len(records)
+        if course_codes is None:
+            course_codes = sorted({c for r in records for c in r["completed_courses"]})
+        code_index = {code: i for i, code in enumerate(course_codes)}
+
+        counts = np.fromiter((len(r["completed_courses"]) for r in records), dtype=np.int64, count=n)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        total = int(offsets[-1])
+
+        course_ids = np.fromiter(
+            (code_index[c] for r in records for c in r["completed_courses"]), dtype=np.int32, count=total)
+        grades = np.fromiter(
+            itertools.chain.from_iterable(
+                (r["grades"].get(c, 0) for c in r["completed_courses"]) for r in records),
+            dtype=np.float64, count=total)
+
+        return cls(
+            student_ids=np.fromiter((r["student_id"] for r in records), dtype=np.int64, count=n),
+            major_codes=encode_majors([r["major"] for r in records]),
+            semester=np.fromiter((r["semester"] for r in records), dtype=np.float64, count=n),
+            gpa=np.fromiter((r["gpa"] for r in records), dtype=np.float64, count=n),
+            course_offsets=offsets,
+            course_ids=course_ids,
+            grades=grades,
+            course_codes=course_codes
+        )
+
+    @classmethod
+    def from_chunks(cls, chunks, course_codes):
+        """Concatenate column chunks (synthetic_data.SyntheticStudentGenerator output) into one store"""
+        chunks = list(chunks)
+        offsets, base = [np.zeros(1, dtype=np.int64)], 0
+        for chunk in chunks:
+            offsets.append(chunk["course_offsets"][1:] + base)
+            base += int(chunk["course_offsets"][-1])
+        return cls(
+            student_ids=np.concatenate([c["student_ids"] for c in chunks]),
+            major_codes=np.concatenate([c["major_codes"] for c in chunks]),
+            semester=np.concatenate([c["semester"] for c in chunks]),
+            gpa=np.concatenate([c["gpa"] for c in chunks]),
+            course_offsets=np.concatenate(offsets),
+            course_ids=np.concatenate([c["course_ids"] for c in chunks]),
+            grades=np.concatenate([c["grades"] for c in chunks]),
+            course_codes=course_codes
+        )
+
+    def columns(self, rows=None):
+        """CSR column dict (the from_chunks chunk format), optionally for a subset of rows"""
+        if rows is None:
+            rows = np.arange(len(self.student_ids))
+        counts = np.diff(self.course_offsets)[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # 选中行的课程在扁平数组中的位置
+        flat = np.repeat(self.course_offsets[rows] - offsets[:-1], counts) + np.arange(offsets[-1])
+        return {
+            "student_ids": self.student_ids[rows],
+            "major_codes": self.major_codes[rows],
+            "semester": self.semester[rows],
+            "gpa": self.gpa[rows],
+            "course_offsets": offsets,
+            "course_ids": self.course_ids[flat],
+            "grades": self.grades[flat]
+        }
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def numeric_matrix(self, rows=None):
+        """semester, gpa, num_completed, mean_grade 四列特征"""
+        columns = (self.semester, self.gpa, self.num_completed, self.mean_grade)
+        if rows is not None:
+            columns = tuple(c[rows] for c in columns)
+        return np.column_stack(columns)
+
+    def design_matrix(self, rows=None):
+        """Model input: the numeric features followed by a one-hot encoded major"""
+        major_codes = self.major_codes if rows is None else self.major_codes[rows]
+        return np.hstack([self.numeric_matrix(rows), one_hot_majors(major_codes)])
+
+    def major_names(self):
+        """每行的专业名称；编码为-1的未知专业标为 "Unknown"（不能直接用-1索引MAJORS）"""
+        return np.array(MAJORS + ["Unknown"])[np.where(self.major_codes >= 0, self.major_codes, len(MAJORS))]
+
+    def completed_courses(self, row):
+        """某个学生已完成的课程代码列表"""
+        start, end = self.course_offsets[row], self.course_offsets[row + 1]
+        return [self.course_codes[i] for i in self.course_ids[start:end]]
+
+
+def one_hot_majors(major_codes):
+    """整数编码 -> one-hot矩阵（-1对应全0行）"""
+    major_codes = np.asarray(major_codes)
+    one_hot = np.zeros((len(major_codes), len(MAJORS)), dtype=np.float64)
+    known = major_codes >= 0
+    one_hot[np.nonzero(known)[0], major_codes[known]] = 1.0
+    return one_hot
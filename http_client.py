@@ -0,0 +1,345 @@
+import os
+import json
+import random
+import asyncio
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# 异步客户端依赖aiohttp；未安装时同步路径仍然可用
+try:
+    import aiohttp
+    ASYNC_HTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    ASYNC_HTTP_AVAILABLE = False
+
+# 连接池与重试配置（可通过环境变量覆盖）
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))  # 缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))  # 每个主机保持的keep-alive连接数
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))  # 建立连接超时（秒）
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 120))  # 读取超时（秒），长的课程计划需要较长时间
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))  # 每个请求最多重试次数
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))  # 指数退避基数（秒）
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 8))  # 单次退避等待上限（秒）
+HTTP_ASYNC_POOL_MAXSIZE = int(os.getenv('HTTP_ASYNC_POOL_MAXSIZE', 256))  # 异步客户端的最大并发连接数
+
+# 这些状态码表示上游暂时不可用，值得重试
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 所有客户端实例，按名称注册，用于导出连接池指标
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class _HTTPClientBase:
+    """Configuration, retry backoff and counters shared by the sync and async clients"""
+
+    def __init__(self, name, pool_connections, pool_maxsize, connect_timeout, read_timeout,
+                 max_retries, backoff_factor, backoff_max):
+        self.name = name
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._requests_total = 0
+        self._retries_total = 0
+        self._errors_total = 0
+
+        with _clients_lock:
+            _clients[name] = self
+
+    def _backoff_delay(self, attempt, response):
+        """计算退避时间：优先使用Retry-After，否则指数退避加随机抖动"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        delay = self.backoff_factor * (2 ** attempt)
+        return min(delay + random.uniform(0, self.backoff_factor), self.backoff_max)
+
+    def _record_retry(self, attempt, delay, error, response):
+        with self._lock:
+            self._retries_total += 1
+        print(f"[{self.name}] 请求失败，{delay:.2f}秒后第{attempt}次重试: "
+              f"{error if error is not None else response.status_code}")
+
+    def _begin(self):
+        with self._lock:
+            self._requests_total += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def _end(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _record_error(self):
+        with self._lock:
+            self._errors_total += 1
+
+    def _pool_state(self):
+        return {}
+
+    def metrics(self):
+        """返回请求计数和连接池状态，用于根据并发量调整池大小"""
+        pools = self._pool_state()
+        with self._lock:
+            return {
+                "requests_total": self._requests_total,
+                "retries_total": self._retries_total,
+                "errors_total": self._errors_total,
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight,
+                "pool_connections": self.pool_connections,
+                "pool_maxsize": self.pool_maxsize,
+                "connect_timeout": self.connect_timeout,
+                "read_timeout": self.read_timeout,
+                "max_retries": self.max_retries,
+                "pools": pools
+            }
+
+
+class PooledHTTPClient(_HTTPClientBase):
+    """Keep-alive HTTP client with a bounded connection pool, timeouts and retries
+
+    Requests that fail to connect, or that come back with 429/5xx, are retried
+    with exponential backoff (honouring Retry-After) up to max_retries times.
+    Read timeouts are not retried, so a slow upstream costs at most one read_timeout.
+    """
+
+    def __init__(self, name, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR,
+                 backoff_max=HTTP_BACKOFF_MAX):
+        super().__init__(name, pool_connections, pool_maxsize, connect_timeout, read_timeout,
+                         max_retries, backoff_factor, backoff_max)
+
+        self.session = requests.Session()
+        # 重试由本类自己处理，这样可以统计次数并同时支持流式响应
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def request(self, method, url, max_retries=None, **kwargs):
+        """Send a request through the pool, retrying transient failures"""
+        if max_retries is None:
+            max_retries = self.max_retries
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        attempt = 0
+        while True:
+            response = None
+            error = None
+            self._begin()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # 包括连接超时；读取超时（ReadTimeout）不在此列，直接抛出
+                error = e
+            except Exception:
+                self._record_error()
+                raise
+            finally:
+                self._end()
+
+            if response is not None and response.status_code not in RETRY_STATUS_CODES:
+                return response
+
+            if attempt >= max_retries:
+                if error is not None:
+                    self._record_error()
+                    raise error
+                return response
+
+            delay = self._backoff_delay(attempt, response)
+            if response is not None:
+                response.close()
+            attempt += 1
+            self._record_retry(attempt, delay, error, response)
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _pool_state(self):
+        pools = {}
+        # urllib3为每个(scheme, host, port)维护一个连接池
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            # 队列中预先填充了None占位符，只统计真正打开的空闲连接
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_created": pool.num_connections,
+                "requests_sent": pool.num_requests,
+                "idle_connections": idle,
+                "maxsize": self.pool_maxsize
+            }
+        return pools
+
+
+class AsyncHTTPError(Exception):
+    """Raised by AsyncResponse.raise_for_status for 4XX/5XX responses"""
+
+
+class AsyncResponse:
+    """Fully read response returned by AsyncPooledHTTPClient (requests-like interface)"""
+
+    def __init__(self, status_code, headers, content, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise AsyncHTTPError(f"{self.status_code} error: {self.text[:200]}")
+
+
+class AsyncPooledHTTPClient(_HTTPClientBase):
+    """asyncio counterpart of PooledHTTPClient, backed by aiohttp
+
+    One process can keep hundreds of upstream calls in flight on a single
+    event loop. The aiohttp session is created lazily, one per event loop, and
+    response bodies are read before returning so connections go straight back
+    to the pool. Sessions of event loops that have since been closed are
+    released on the next request, and aclose() closes all of them.
+    """
+
+    def __init__(self, name, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_ASYNC_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR,
+                 backoff_max=HTTP_BACKOFF_MAX):
+        super().__init__(name, pool_connections, pool_maxsize, connect_timeout, read_timeout,
+                         max_retries, backoff_factor, backoff_max)
+        self._sessions = {}  # 事件循环 -> aiohttp会话
+        self._sessions_lock = threading.Lock()
+
+    async def _get_session(self):
+        if not ASYNC_HTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is required for the async HTTP client")
+        loop = asyncio.get_running_loop()
+        with self._sessions_lock:
+            session = self._sessions.get(loop)
+            if session is not None and not session.closed:
+                return session
+            # aiohttp的连接池绑定到创建它的事件循环
+            dead = self._pop_dead_sessions()
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_maxsize),
+                timeout=aiohttp.ClientTimeout(total=None, connect=self.connect_timeout,
+                                              sock_read=self.read_timeout)
+            )
+            self._sessions[loop] = session
+        for old in dead:
+            await self._close_session(old)
+        return session
+
+    def _pop_dead_sessions(self):
+        """取出事件循环已关闭的会话（调用者持有 _sessions_lock）"""
+        return [self._sessions.pop(loop) for loop in list(self._sessions) if loop.is_closed()]
+
+    async def _close_session(self, session):
+        # 所属事件循环已关闭时，aiohttp只把连接器标记为已关闭，不会在旧循环上调度任何操作
+        try:
+            await session.close()
+        except Exception as e:
+            print(f"[{self.name}] 关闭HTTP会话失败: {str(e)}")
+
+    async def request(self, method, url, max_retries=None, **kwargs):
+        """Send a request through the pool, retrying transient failures"""
+        if max_retries is None:
+            max_retries = self.max_retries
+        session = await self._get_session()
+        if "timeout" in kwargs and not isinstance(kwargs["timeout"], aiohttp.ClientTimeout):
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout,
+                                                      sock_read=kwargs["timeout"])
+        # 连接失败和连接超时可以安全重试；读取超时不重试
+        retryable = (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError,
+                     getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ClientConnectorError))
+        attempt = 0
+        while True:
+            response = None
+            error = None
+            self._begin()
+            try:
+                async with session.request(method, url, **kwargs) as raw:
+                    content = await raw.read()
+                    text = content.decode(raw.get_encoding(), errors="replace") if content else ""
+                    response = AsyncResponse(raw.status, raw.headers, content, text)
+            except retryable as e:
+                error = e
+            except Exception:
+                self._record_error()
+                raise
+            finally:
+                self._end()
+
+            if response is not None and response.status_code not in RETRY_STATUS_CODES:
+                return response
+
+            if attempt >= max_retries:
+                if error is not None:
+                    self._record_error()
+                    raise error
+                return response
+
+            delay = self._backoff_delay(attempt, response)
+            attempt += 1
+            self._record_retry(attempt, delay, error, response)
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    def _pool_state(self):
+        with self._sessions_lock:
+            connectors = [session.connector for session in self._sessions.values() if not session.closed]
+        if not connectors:
+            return {}
+        return {
+            "limit": self.pool_maxsize,
+            "event_loops": len(connectors),
+            "idle_connections": sum(len(conns) for connector in connectors for conns in connector._conns.values())
+        }
+
+    async def aclose(self):
+        """Close the sessions of every event loop this client has been used on"""
+        current = asyncio.get_running_loop()
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, {}
+        for loop, session in sessions.items():
+            if loop is not current and loop.is_running():
+                # 其他线程中仍在运行的事件循环：在该循环中关闭
+                try:
+                    future = asyncio.run_coroutine_threadsafe(session.close(), loop)
+                    await asyncio.wait_for(asyncio.wrap_future(future), timeout=5)
+                except Exception as e:
+                    print(f"[{self.name}] 关闭HTTP会话失败: {str(e)}")
+            else:
+                await self._close_session(session)
+
+
+def pool_metrics():
+    """Metrics for every registered client, keyed by client name"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.metrics() for client in clients}
@@ -0,0 +1,204 @@
+"""Database configuration and idempotent schema migrations
+
+DATABASE_URI selects the store. The default is an on-disk SQLite file in
+instance/, which every worker shares. SQLite files run in WAL mode, so
+readers do not block the writer. postgresql:// URIs get a pre-pinged
+connection pool. sqlite:///:memory: still works for throwaway runs.
+
+migrate() applies the numbered revisions in MIGRATIONS that the database
+has not seen yet. It records them in the schema_revision table and holds
+a lock while doing so, so concurrent workers run each revision exactly
+once and later starts skip seeding. Run it once before starting the
+workers:
+
+    python migrations.py
+"""
+import os
+import sqlite3
+from dotenv import load_dotenv
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+from models import db, Course, Student, Enrollment, course_prerequisites
+
+# 文件锁只在POSIX系统上可用；Windows开发环境下不加锁
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///instance/studypath.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # 每个进程的连接池大小
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # 秒；避免使用被服务器关闭的空闲连接
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))  # 写锁被占用时的等待时间
+
+
+def resolve_database_uri(uri=DATABASE_URI):
+    """相对路径的SQLite文件统一放在项目目录下，并确保目录存在"""
+    prefix = 'sqlite:///'
+    if not uri.startswith(prefix) or uri == 'sqlite:///:memory:':
+        return uri
+    path = uri[len(prefix):]
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return prefix + path
+
+
+def engine_options(uri):
+    """按数据库类型调整连接池参数"""
+    if uri == 'sqlite:///:memory:':
+        # 所有线程共享同一个内存数据库连接
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    if uri.startswith('sqlite'):
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": DB_POOL_RECYCLE
+    }
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新的SQLite连接：WAL模式允许读写并发，其余参数减少磁盘同步和锁等待"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA cache_size=-20000")  # 约20MB页缓存
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def configure_database(app, uri=DATABASE_URI):
+    uri = resolve_database_uri(uri)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+
+def _seed_initial_data():
+    """初始课程和学生数据（已存在的记录不会重复添加）"""
+    courses = [
+        Course(code="CS101", name="Introduction to Computer Science", credits=3, description="Basic concepts of computer science"),
+        Course(code="CS201", name="Data Structures", credits=4, description="Advanced data structures and algorithms"),
+        Course(code="MATH101", name="Calculus I", credits=4, description="Introduction to calculus"),
+    ]
+    students = [
+        Student(username="Alice Smith", email="alice@example.com", major="Computer Science"),
+        Student(username="Bob Johnson", email="bob@example.com", major="Mathematics"),
+    ]
+    for course in courses:
+        if not Course.query.filter_by(code=course.code).first():
+            db.session.add(course)
+    for student in students:
+        if not Student.query.filter_by(email=student.email).first():
+            db.session.add(student)
+
+
+def _revision_1():
+    """初始表结构和种子数据"""
+    db.create_all()
+    _seed_initial_data()
+
+
+def _revision_2():
+    """选课表和先修课程关联表的索引（新建的数据库在revision 1中已经创建）"""
+    for table in (Enrollment.__table__, course_prerequisites):
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+# (revision, description, function)；只能在末尾追加，已发布的修订不能修改
+MIGRATIONS = [
+    (1, "initial schema and seed data", _revision_1),
+    (2, "indexes on enrollment and course_prerequisites", _revision_2),
+]
+
+
+class _MigrationLock:
+    """同一台机器上的进程间文件锁；PostgreSQL另外使用advisory lock"""
+
+    ADVISORY_LOCK_ID = 728301
+
+    def __init__(self, uri):
+        self.uri = uri
+        self._file = None
+        self._connection = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.join(BASE_DIR, 'instance'), exist_ok=True)
+            self._file = open(os.path.join(BASE_DIR, 'instance', 'migrations.lock'), 'w')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        if self.uri.startswith('postgresql'):
+            # advisory lock属于连接，用一个单独的连接持有到迁移结束
+            self._connection = db.engine.connect()
+            self._connection.execute(text(f"SELECT pg_advisory_lock({self.ADVISORY_LOCK_ID})"))
+        return self
+
+    def __exit__(self, *exc):
+        if self._connection is not None:
+            self._connection.execute(text(f"SELECT pg_advisory_unlock({self.ADVISORY_LOCK_ID})"))
+            self._connection.close()
+            self._connection = None
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def current_revision():
+    db.session.execute(text("CREATE TABLE IF NOT EXISTS schema_revision (revision INTEGER NOT NULL)"))
+    revision = db.session.execute(text("SELECT MAX(revision) FROM schema_revision")).scalar()
+    return revision or 0
+
+
+def migrate(app):
+    """Apply pending revisions; returns the database's revision afterwards"""
+    with app.app_context():
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        # 已是最新版本时不加锁，直接返回
+        revision = current_revision()
+        db.session.commit()
+        if revision >= MIGRATIONS[-1][0]:
+            return revision
+
+        with _MigrationLock(uri):
+            revision = current_revision()
+            for number, description, apply in MIGRATIONS:
+                if number <= revision:
+                    continue
+                print(f"Applying database revision {number}: {description}")
+                apply()
+                db.session.execute(text("INSERT INTO schema_revision (revision) VALUES (:r)"), {"r": number})
+                db.session.commit()
+                revision = number
+        return revision
+
+
+def main():
+    # 只初始化数据库，不加载推荐模型等服务
+    from flask import Flask
+    app = Flask(__name__)
+    configure_database(app)
+    db.init_app(app)
+    revision = migrate(app)
+    print(f"Database {app.config['SQLALCHEMY_DATABASE_URI']} at revision {revision}")
+
+
+if __name__ == "__main__":
+    main()
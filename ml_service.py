@@ -1,7 +1,6 @@
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.neighbors import NearestNeighbors
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.manifold import TSNE
@@ -9,201 +8,366 @@ from sklearn.decomposition import PCA
 import matplotlib
 matplotlib.use('Agg')  # 使用非交互式后端
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import os
 import random
 import io
+import time
+import math
+import heapq
+import threading
+import copy
+import hashlib
+import model_store
+from neighbor_index import create_index, NEIGHBOR_INDEX_BACKEND
+from prereq_graph import PrerequisiteGraph
+from feature_store import StudentFeatureStore, MAJORS, MAJOR_INDEX
+from synthetic_data import build_catalog, SyntheticStudentGenerator, SYNTHETIC_DATA_SEED
+
+# 模型文件名称和版本：修改合成数据、特征或模型结构时需要递增版本号
+MODEL_ARTIFACT_NAME = "course_recommender"
+MODEL_ARTIFACT_VERSION = 6
+
+# 学生数据可视化：超过该行数时用PCA代替t-SNE（t-SNE在大数据集上需要数十秒以上）
+VISUALIZATION_PCA_THRESHOLD = int(os.getenv('VISUALIZATION_PCA_THRESHOLD', 5000))
+
+# 在线更新：新增/修改的学生行先进入增量缓冲区，后台定期合并进主索引
+RECOMMENDER_COMPACT_INTERVAL = int(os.getenv('RECOMMENDER_COMPACT_INTERVAL', 30))  # 合并间隔（秒）
+RECOMMENDER_DELTA_MAX = int(os.getenv('RECOMMENDER_DELTA_MAX', 5000))  # 缓冲区超过该行数时立即合并
+
+# 没有可选课程时返回的通用课程
+FALLBACK_COURSES = ["CS101", "CS201", "MATH101", "AI101", "ML101"]
+
+
+def _course_number(code):
+    """课程排序键：课程代码中的数字部分，没有数字时排在最后"""
+    return int(''.join(filter(str.isdigit, code))) if any(c.isdigit() for c in code) else 999
+
+
+# 学期规划的默认值：课程学分未知时按3学分计算，每学期最多16学分
+DEFAULT_COURSE_CREDITS = 3
+DEFAULT_SEMESTER_CREDIT_LIMIT = 16
+
+
+def _term_labels(start_term, count):
+    """"Fall 2025" -> ["Fall 2025", "Spring 2026", ...]；无法解析时使用 "Semester 1", "Semester 2", ..."""
+    parts = (start_term or "").split()
+    if len(parts) == 2 and parts[0].lower() in ("fall", "spring") and parts[1].isdigit():
+        term, year = parts[0].capitalize(), int(parts[1])
+        labels = []
+        for _ in range(count):
+            labels.append(f"{term} {year}")
+            if term == "Fall":
+                term, year = "Spring", year + 1
+            else:
+                term = "Fall"
+        return labels
+    return [f"Semester {i + 1}" for i in range(count)]
+
+
+class DegreePlanner:
+    """Deterministic semester-by-semester degree planner over the prerequisite DAG
+    
+    Plans the required courses plus any prerequisites they still need. Each
+    course's priority is its critical path: the number of semesters in the
+    longest chain of pending courses that depend on it. Every semester is
+    filled from the courses whose prerequisites are already done, in priority
+    order, up to the credit limit (Hu-style list scheduling). The plan reports
+    lower_bound_semesters, which is max(longest chain, total credits / limit).
+    When num_semesters equals it, no schedule can be shorter.
+    """
+    
+    def __init__(self, graph, default_credits=DEFAULT_COURSE_CREDITS):
+        self.graph = graph
+        self.default_credits = default_credits
+    
+    def _pending(self, required, done):
+        """需要修读的课程位置：要求的课程及其尚未完成的全部先修课程"""
+        pending = set()
+        stack = [self.graph.index[code] for code in required if code in self.graph.index]
+        while stack:
+            i = stack.pop()
+            if i in done or i in pending:
+                continue
+            pending.add(i)
+            stack.extend(self.graph.prereq_lists[i])
+        return pending
+    
+    def pending_courses(self, required, completed=()):
+        """Codes the plan will schedule for these required and completed courses"""
+        done = {self.graph.index[code] for code in completed if code in self.graph.index}
+        return sorted(self.graph.codes[i] for i in self._pending(required, done))
+    
+    def plan(self, required, completed=(), credit_limit=DEFAULT_SEMESTER_CREDIT_LIMIT, credits=None, start_term=None):
+        """Plan required courses into semesters; credits maps course code -> credit hours
+        
+        Raises ValueError if a single course exceeds the credit limit.
+        """
+        graph = self.graph
+        credits = credits or {}
+        done = {graph.index[code] for code in completed if code in graph.index}
+        pending = self._pending(required, done)
+        
+        course_credits = {i: credits.get(graph.codes[i]) or self.default_credits for i in pending}
+        too_large = sorted(graph.codes[i] for i, c in course_credits.items() if c > credit_limit)
+        if too_large:
+            raise ValueError(f"Courses exceed the {credit_limit}-credit semester limit: {', '.join(too_large)}")
+        
+        # 关键路径长度：按逆拓扑序计算从该课程开始最长的后续课程链（以学期计）
+        height = {}
+        for i in reversed(graph.topological_order()):
+            if i in pending:
+                height[i] = 1 + max((height[j] for j in graph.dependent_lists[i] if j in pending), default=0)
+        
+        def priority(i):
+            fanout = sum(1 for j in graph.dependent_lists[i] if j in pending)
+            code = graph.codes[i]
+            return (-height[i], -fanout, _course_number(code), code)
+        
+        waiting = {i: sum(1 for j in graph.prereq_lists[i] if j in pending) for i in pending}
+        ready = [(priority(i), i) for i in pending if waiting[i] == 0]
+        heapq.heapify(ready)
+        
+        semesters = []
+        while ready:
+            taken, skipped, load = [], [], 0
+            while ready:
+                item = heapq.heappop(ready)
+                i = item[1]
+                if load + course_credits[i] <= credit_limit:
+                    taken.append(i)
+                    load += course_credits[i]
+                else:
+                    skipped.append(item)
+            ready = skipped
+            heapq.heapify(ready)
+            
+            # 本学期修完的课程解锁下一学期可选的课程
+            for i in taken:
+                for j in graph.dependent_lists[i]:
+                    if j in waiting:
+                        waiting[j] -= 1
+                        if waiting[j] == 0:
+                            heapq.heappush(ready, (priority(j), j))
+            semesters.append((taken, load))
+        
+        total_credits = sum(course_credits.values())
+        labels = _term_labels(start_term, len(semesters))
+        return {
+            "semesters": [
+                {
+                    "term": label,
+                    "courses": [{"code": graph.codes[i], "credits": course_credits[i]} for i in taken],
+                    "credits": load
+                }
+                for label, (taken, load) in zip(labels, semesters)
+            ],
+            "num_semesters": len(semesters),
+            "lower_bound_semesters": max(max(height.values(), default=0), math.ceil(total_credits / credit_limit)),
+            "total_credits": total_credits,
+            "unknown_courses": [code for code in required if code not in graph.index]
+        }
+
+
+def _normalize_student(record):
+    """校验并整理在线更新的学生记录（SyntheticStudentGenerator.iter_records 的字典格式）；无效时抛出ValueError"""
+    major = record.get("major")
+    if not isinstance(major, str) or major not in MAJOR_INDEX:
+        # 未知专业没有one-hot列，合并后也无法在可视化中正确标注
+        raise ValueError(f"Invalid student record: unknown major {major!r} (expected one of {', '.join(MAJORS)})")
+    try:
+        return {
+            "student_id": int(record["student_id"]),
+            "major": major,
+            "semester": float(record.get("semester", 1)),
+            "gpa": float(record.get("gpa", 3.0)),
+            "completed_courses": [str(c) for c in record.get("completed_courses", [])],
+            "grades": {str(c): float(g) for c, g in dict(record.get("grades") or {}).items()}
+        }
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid student record: {str(e)}")
+
+
+def _store_digest(store):
+    """特征存储内容的哈希：相同的数据在任何进程中得到相同的模型版本"""
+    digest = hashlib.sha256()
+    for column in (store.student_ids, store.major_codes, store.semester, store.gpa,
+                   store.course_offsets, store.course_ids, store.grades):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    digest.update("\n".join(store.course_codes).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+class _DeltaRows:
+    """Student rows added or replaced since the last compaction
+    
+    Immutable snapshot: scaled with the index's scaler and searched by brute
+    force next to the main index. stale holds the main-store rows these
+    records replace, which queries skip.
+    """
+    
+    def __init__(self, records, store, scaler):
+        self.records = records  # student_id -> record
+        self.ids = list(records)
+        self.row_by_id = {student_id: j for j, student_id in enumerate(self.ids)}
+        self.courses = [records[student_id]["completed_courses"] for student_id in self.ids]
+        if self.ids:
+            features = StudentFeatureStore.from_records([records[i] for i in self.ids]).design_matrix()
+            self.scaled = scaler.transform(features)
+        else:
+            self.scaled = np.empty((0, scaler.n_features_in_))
+        stale = (store.row_for(student_id) for student_id in self.ids)
+        self.stale = np.array(sorted(row for row in stale if row >= 0), dtype=np.int64)
+    
+    def __len__(self):
+        return len(self.ids)
+
 
 class CourseRecommender:
     def __init__(self):
-        # 完全使用内存存储
         self.model = None
         self.preprocessor = None
-        self.training_data = None
         self.courses = None
         self.prerequisites = None
+        self.feature_store = None  # 列式学生特征存储
+        self.features = None  # 未缩放的训练特征矩阵
+        self.scaled_features = None  # 缩放后的特征矩阵（查询时直接按行读取）
+        self.model_version = None
+        self.prereq_graph = None  # 编译后的先修课程图（位掩码）
+        self._major_candidates = None  # 专业 -> 按推荐顺序排列的候选课程位置
+        self.planner = None  # 多学期课程规划
+        self._batch_tables = None  # 批量推荐用的查找表，首次使用时构建
+        self._visualization = None  # 当前模型版本的可视化PNG
+        self._visualization_thread = None  # (模型版本, 绘制线程)
+        self._visualization_lock = threading.Lock()
+        self._delta = None  # 尚未合并的在线更新
+        self._update_lock = threading.RLock()  # 保护主索引和增量缓冲区的替换
+        self._compact_lock = threading.Lock()
+        self._compact_event = threading.Event()
+        self._compactor = None
+        self._compactions = 0
+        self._last_compaction = None
         
-        # 不再使用文件路径
-        print("Generating synthetic data in memory")
+        # 优先加载已保存的模型文件；不存在时生成数据并训练一次，然后保存供所有worker共享
+        bundle, manifest = model_store.load_or_build(MODEL_ARTIFACT_NAME, MODEL_ARTIFACT_VERSION,
+                                                     self._build_artifact)
+        self._load_artifact(bundle)
+        if manifest is not None:
+            self.model_version = f"v{MODEL_ARTIFACT_VERSION}-{manifest['sha256'][:12]}"
+        else:
+            self.model_version = f"v{MODEL_ARTIFACT_VERSION}-memory-{int(time.time())}"
+        self._base_model_version = self.model_version
+        print(f"Course recommender ready (model {self.model_version})")
+    
+    def _build_artifact(self):
+        """生成合成数据并训练模型，返回需要保存的全部内容"""
+        print("Generating synthetic data and training model")
         self.generate_synthetic_data()
         self.train_model()
+        return {
+            "courses": self.courses,
+            "prerequisites": self.prerequisites,
+            "feature_store": self.feature_store,
+            "features": self.features,
+            "scaled_features": self.scaled_features,
+            "scaler": self.preprocessor,
+            "model": self.model
+        }
+    
+    def _load_artifact(self, bundle):
+        self.courses = bundle["courses"]
+        self.prerequisites = bundle["prerequisites"]
+        self.feature_store = bundle["feature_store"]
+        self.features = bundle["features"]
+        self.scaled_features = bundle["scaled_features"]
+        self.preprocessor = bundle["scaler"]
+        self.model = bundle["model"]
+        if self.model.backend != NEIGHBOR_INDEX_BACKEND:
+            # 配置的索引后端与模型文件不同：只需重建索引，不用重新训练
+            print(f"Rebuilding {NEIGHBOR_INDEX_BACKEND} neighbor index (artifact has {self.model.backend})")
+            self.model = create_index()
+            self.model.fit(self.scaled_features)
+        self._delta = _DeltaRows({}, self.feature_store, self.preprocessor)
+        self._compile_prerequisites()
+    
+    def _compile_prerequisites(self):
+        """加载时把先修关系编译成位掩码图，并为每个专业预先排好候选课程顺序"""
+        catalog = [code for groups in self.courses.values()
+                   for code in groups["core"] + groups["electives"] + groups["related"]]
+        self.prereq_graph = PrerequisiteGraph(self.prerequisites, catalog)
+        self._major_candidates = {}
+        for major, groups in self.courses.items():
+            # 先排序再筛选与先筛选再排序结果相同（稳定排序）
+            ordered = sorted(groups["core"] + groups["electives"] + groups["related"], key=_course_number)
+            self._major_candidates[major] = [self.prereq_graph.index[code] for code in ordered]
+        self.planner = DegreePlanner(self.prereq_graph)
+    
+    def degree_requirements(self, major):
+        """某个专业需要修读的全部课程；未知专业返回None"""
+        groups = self.courses.get(major)
+        if groups is None:
+            return None
+        return groups["core"] + groups["electives"] + groups["related"]
         
-    def generate_synthetic_data(self):
-        """生成合成训练数据"""
-        # Define course catalog
-        majors = ["CS", "MATH", "ENG", "BIO", "PHYS", "CHEM", "ECON", "PSYCH"]
-        
-        # Generate courses for each major
-        self.courses = {}
-        self.prerequisites = {}  # 添加先修课程关系
-        
-        for major in majors:
-            # Core courses for the major (sequential courses with prerequisites)
-            core_courses = [f"{major}{101+i*100}" for i in range(5)]
-            
-            # Elective courses for the major
-            elective_courses = [f"{major}E{201+i*50}" for i in range(8)]
-            
-            # Related courses from other majors
-            related_majors = random.sample([m for m in majors if m != major], 3)
-            related_courses = []
-            for related_major in related_majors:
-                related_courses.extend([f"{related_major}{101+i*100}" for i in range(2)])
-            
-            # Combine all courses for this major
-            self.courses[major] = {
-                "core": core_courses,
-                "electives": elective_courses,
-                "related": related_courses
-            }
-            
-            # 设置先修课程关系
-            # 核心课程的先修关系（每门课程依赖前一门）
-            for i in range(1, len(core_courses)):
-                self.prerequisites[core_courses[i]] = [core_courses[i-1]]
-            
-            # 选修课程的先修关系（依赖至少一门核心课程）
-            for i, elective in enumerate(elective_courses):
-                # 前半部分选修课依赖第一门核心课程
-                if i < len(elective_courses) // 2:
-                    self.prerequisites[elective] = [core_courses[0]]
-                # 后半部分选修课依赖第二门核心课程
-                else:
-                    self.prerequisites[elective] = [core_courses[1]]
-            
-            # 相关课程没有先修要求
-            for related in related_courses:
-                self.prerequisites[related] = []
-        
-        # Generate synthetic student data
-        num_students = 1000
-        self.training_data = []
+    def generate_synthetic_data(self, num_students=1000):
+        """生成合成训练数据（固定随机种子，结果可复现）
         
-        for i in range(num_students):
-            # Randomly select a major
-            major = random.choice(majors)
-            
-            # Randomly select semester (1-8)
-            semester = random.randint(1, 8)
-            
-            # Randomly select GPA (2.0-4.0)
-            gpa = round(random.uniform(2.0, 4.0), 2)
-            
-            # Select completed courses based on semester
-            all_courses = self.courses[major]["core"] + self.courses[major]["electives"] + self.courses[major]["related"]
-            
-            # The higher the semester, the more courses completed
-            num_completed = min(len(all_courses), int(semester * 1.5))
-            
-            # Ensure prerequisites are respected
-            completed_courses = []
-            available_courses = [c for c in all_courses if not self.prerequisites.get(c, [])]  # Start with courses that have no prerequisites
-            
-            while len(completed_courses) < num_completed and available_courses:
-                # Select a random available course
-                course = random.choice(available_courses)
-                completed_courses.append(course)
-                available_courses.remove(course)
-                
-                # Add new available courses based on prerequisites
-                for c in all_courses:
-                    if c not in completed_courses and c not in available_courses:
-                        prereqs = self.prerequisites.get(c, [])
-                        if all(p in completed_courses for p in prereqs):
-                            available_courses.append(c)
-            
-            # Generate grades for completed courses (higher GPA = higher grades)
-            grades = {}
-            for course in completed_courses:
-                # Base grade on student's GPA with some randomness
-                mean_grade = max(60, min(100, 60 + (gpa - 2.0) * 20))  # Map GPA 2.0-4.0 to grade 60-100
-                grade = max(60, min(100, int(random.gauss(mean_grade, 10))))  # Add normal distribution noise
-                grades[course] = grade
-            
-            # Add to training data
-            self.training_data.append({
-                "student_id": i + 1,
-                "major": major,
-                "semester": semester,
-                "gpa": gpa,
-                "completed_courses": completed_courses,
-                "grades": grades
-            })
+        The generator's column chunks go straight into the feature store; no
+        per-student dicts are built, and the store is the only copy of the
+        training rows that goes into the artifact.
+        """
+        self.courses, self.prerequisites = build_catalog(SYNTHETIC_DATA_SEED)
+        generator = SyntheticStudentGenerator(self.courses, self.prerequisites, seed=SYNTHETIC_DATA_SEED)
+        # 列式特征存储只构建一次，训练、可视化和查询共用
+        self.feature_store = StudentFeatureStore.from_chunks(generator.iter_chunks(num_students),
+                                                             generator.course_codes)
     
     def train_model(self):
         """训练推荐模型"""
-        # Extract features from training data
-        X = []
-        y = []
-        
-        for student in self.training_data:
-            # Create features
-            features = [
-                student["semester"],
-                student["gpa"],
-                len(student["completed_courses"]),
-                # Average grade
-                sum(student["grades"].values()) / len(student["grades"]) if student["grades"] else 0
-            ]
-            
-            # One-hot encode major
-            major_feature = [0] * 8  # Assuming 8 majors
-            major_idx = ["CS", "MATH", "ENG", "BIO", "PHYS", "CHEM", "ECON", "PSYCH"].index(student["major"])
-            major_feature[major_idx] = 1
-            
-            # Combine all features
-            X.append(features + major_feature)
-            
-            # Target is the next course they took (last one in their list)
-            if student["completed_courses"]:
-                y.append(student["completed_courses"][-1])
-            else:
-                y.append("")
+        self.features = self.feature_store.design_matrix()
         
         # Create preprocessor
         self.preprocessor = StandardScaler()
-        X_scaled = self.preprocessor.fit_transform(X)
+        self.scaled_features = self.preprocessor.fit_transform(self.features)
         
-        # Train nearest neighbors model
-        self.model = NearestNeighbors(n_neighbors=10, algorithm='ball_tree')
-        self.model.fit(X_scaled)
+        # Train nearest neighbors model（后端由 NEIGHBOR_INDEX_BACKEND 决定，默认精确的ball tree）
+        self.model = create_index()
+        self.model.fit(self.scaled_features)
     
-    def visualize_student_data(self):
-        """Visualize the synthetic student data"""
+    def visualize_student_data(self, fast=None, store=None):
+        """Visualize the synthetic student data (or the given feature store)
+        
+        Uses t-SNE, or PCA when fast is True (by default when there are more
+        than VISUALIZATION_PCA_THRESHOLD rows).
+        """
         try:
-            # Extract features from training data
-            X = []
-            majors = []
-            
-            for student in self.training_data:
-                # Create features
-                features = [
-                    student["semester"],
-                    student["gpa"],
-                    len(student["completed_courses"]),
-                    # Average grade
-                    sum(student["grades"].values()) / len(student["grades"]) if student["grades"] else 0
-                ]
-                
-                X.append(features)
-                majors.append(student["major"])
-            
-            # Convert to numpy array
-            X = np.array(X)
-            
-            # Apply t-SNE to reduce dimensions for visualization
-            X_embedded = TSNE(n_components=2, random_state=42).fit_transform(X)
+            # Extract features from the feature store
+            store = store if store is not None else self.feature_store
+            X = store.numeric_matrix()
+            majors = store.major_names()
+            if fast is None:
+                fast = len(X) > VISUALIZATION_PCA_THRESHOLD
+            
+            # Reduce dimensions for visualization
+            if fast:
+                X_embedded = PCA(n_components=2, random_state=42).fit_transform(X)
+                method = "PCA"
+            else:
+                X_embedded = TSNE(n_components=2, random_state=42).fit_transform(X)
+                method = "t-SNE"
             
-            # Create a figure
-            plt.figure(figsize=(10, 8))
+            # Create a figure（不使用pyplot的全局状态，可以在后台线程中绘制）
+            fig = Figure(figsize=(10, 8))
+            ax = fig.subplots()
             
             # Define colors for different majors
-            unique_majors = list(set(majors))
+            unique_majors = list(np.unique(majors))
             colors = plt.cm.rainbow(np.linspace(0, 1, len(unique_majors)))
             
             # Plot each major with a different color
             for i, major in enumerate(unique_majors):
-                indices = [j for j, m in enumerate(majors) if m == major]
-                plt.scatter(
+                indices = majors == major
+                ax.scatter(
                     X_embedded[indices, 0],
                     X_embedded[indices, 1],
                     c=[colors[i]],
@@ -211,56 +375,107 @@ class CourseRecommender:
                     alpha=0.7
                 )
             
-            plt.title("t-SNE Visualization of Student Data")
-            plt.legend()
-            plt.tight_layout()
+            ax.set_title(f"{method} Visualization of Student Data")
+            ax.legend()
+            fig.tight_layout()
             
             # 使用内存缓冲区而不是文件
             buf = io.BytesIO()
-            plt.savefig(buf, format='png')
+            fig.savefig(buf, format='png')
             buf.seek(0)
-            plt.close()
             
             return buf
         except Exception as e:
             print(f"Error generating visualization: {str(e)}")
             return None
     
+    def _visualization_path(self, version):
+        return os.path.join(model_store.MODEL_DIR, f"{MODEL_ARTIFACT_NAME}-{version}-students.png")
+    
+    def _set_visualization(self, version, png):
+        """缓存某个版本的图片；绘制期间模型已合并出新版本时丢弃，不能用新版本的ETag返回旧图片"""
+        with self._update_lock:
+            if self.model_version == version:
+                self._visualization = png
+                return True
+        return False
+    
+    def _remove_visualization(self, version):
+        """删除合并后已过时的版本的图片；基础模型的图片与模型文件一起保留，重启后仍然有效"""
+        if version == self._base_model_version:
+            return
+        path = self._visualization_path(version)
+        for stale_path in (path, f"{path}.lock"):
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+    
+    def _render_visualization(self, version, store):
+        def build():
+            buf = self.visualize_student_data(store=store)
+            if buf is None:
+                raise RuntimeError("visualization failed")
+            return buf.getvalue()
+        
+        try:
+            png = model_store.load_or_build_file(self._visualization_path(version), build)
+        except RuntimeError:
+            return  # 下次请求时重试
+        if not self._set_visualization(version, png):
+            # compact() 可能已经删除了该版本的文件，绘制完成时又写了一份
+            self._remove_visualization(version)
+    
+    def visualization_png(self):
+        """PNG bytes of the student visualization for the current model version
+        
+        The plot only changes when the model does, so it is rendered once per
+        model version in a background thread and cached in memory and next to
+        the model artifact. Returns None while it is still being rendered.
+        """
+        with self._update_lock:
+            version, store, png = self.model_version, self.feature_store, self._visualization
+        if png is not None:
+            return png
+        
+        # 其他worker可能已经绘制并保存
+        try:
+            with open(self._visualization_path(version), 'rb') as f:
+                png = f.read()
+            if self._set_visualization(version, png):
+                return png
+            return None
+        except OSError:
+            pass
+        
+        with self._visualization_lock:
+            rendering = self._visualization_thread
+            # 正在为旧版本绘制的线程不影响为当前版本开始绘制
+            if rendering is None or not rendering[1].is_alive() or rendering[0] != version:
+                thread = threading.Thread(target=self._render_visualization, args=(version, store), daemon=True)
+                self._visualization_thread = (version, thread)
+                thread.start()
+        return None
+    
     def get_recommendations(self, student_id=None, major=None, completed_courses=[], student_data=None):
         """Get course recommendations for a student"""
-        if student_id and student_id in [s["student_id"] for s in self.training_data]:
+        # 取一份一致的快照：后台合并可能同时替换主索引
+        with self._update_lock:
+            store, scaled, model, delta = self.feature_store, self.scaled_features, self.model, self._delta
+        
+        X_scaled, completed = self._student_row(student_id, store, scaled, delta) if student_id else (None, None)
+        
+        if X_scaled is not None:
             # Get recommendations for an existing student
-            student = next(s for s in self.training_data if s["student_id"] == student_id)
-            
-            # Extract student features
-            features = [
-                student["semester"],
-                student["gpa"],
-                len(student["completed_courses"]),
-                sum(student["grades"].values()) / len(student["grades"]) if student["grades"] else 0
-            ]
-            
-            # One-hot encode major
-            major_feature = [0] * 8  # Assuming 8 majors
-            major_idx = ["CS", "MATH", "ENG", "BIO", "PHYS", "CHEM", "ECON", "PSYCH"].index(student["major"])
-            major_feature[major_idx] = 1
-            
-            # Combine all features
-            X = [features + major_feature]
-            
-            # Scale features
-            X_scaled = self.preprocessor.transform(X)
-            
-            # Find nearest neighbors
-            distances, indices = self.model.kneighbors(X_scaled)
+            # Find nearest neighbors (main index plus rows updated online)
+            neighbors = self._neighbor_courses(X_scaled, store, model, delta)
             
             # Get recommendations based on what similar students took
             recommendations = []
-            seen_courses = set(student["completed_courses"])
+            seen_courses = set(completed)
             
-            for idx in indices[0]:
-                similar_student = self.training_data[idx]
-                for course in similar_student["completed_courses"]:
+            for courses in neighbors:
+                for course in courses:
                     if course not in seen_courses:
                         seen_courses.add(course)
                         recommendations.append(course)
@@ -273,75 +488,225 @@ class CourseRecommender:
                 # If no courses completed, recommend first core course
                 return self.courses[major]["core"][:1]
             
-            # Get all courses for this major
-            all_courses = self.courses[major]["core"] + self.courses[major]["electives"] + self.courses[major]["related"]
-            
-            # Find courses that haven't been taken yet but prerequisites are met
-            available_courses = []
-            for course in all_courses:
-                if course not in completed_courses:
-                    prereqs = self.prerequisites.get(course, [])
-                    if all(p in completed_courses for p in prereqs):
-                        available_courses.append(course)
-            
-            # Sort by course number (core courses first)
-            available_courses.sort(key=lambda x: int(''.join(filter(str.isdigit, x))))
-            
-            return available_courses[:5]  # Return top 5 recommendations
+            # Courses not taken yet whose prerequisites are met, core courses first
+            return self._get_next_courses(completed_courses, major)[:5]  # Return top 5 recommendations
         
         else:
             # Default recommendations (CS major)
             return self.courses["CS"]["core"][:5]
     
-    def _get_next_courses(self, completed_courses, major):
-        """使用规则方法获取下一步可学习的课程"""
-        all_courses = self.courses[major]["core"] + self.courses[major]["electives"] + self.courses[major]["related"]
+    def _student_row(self, student_id, store, scaled, delta):
+        """学生的缩放特征行和已完成课程；在线更新的记录优先，找不到时返回 (None, None)"""
+        try:
+            j = delta.row_by_id.get(int(student_id))
+        except (TypeError, ValueError):
+            return None, None
+        if j is not None:
+            return delta.scaled[j:j + 1], delta.courses[j]
+        
+        # O(1) 学号索引查找行号；直接取预先缩放好的特征行，无需重新计算和缩放
+        row = store.row_for(student_id)
+        if row < 0:
+            return None, None
+        return scaled[row:row + 1], store.completed_courses(row)
+    
+    def _neighbor_courses(self, X_scaled, store, model, delta, n_neighbors=10):
+        """Completed-course lists of the nearest students, closest first
         
-        # 找出所有尚未完成但先修课程要求已满足的课程
-        available_courses = []
-        for course in all_courses:
-            if course not in completed_courses:
-                prereqs = self.prerequisites.get(course, [])
-                if all(p in completed_courses for p in prereqs):
-                    available_courses.append(course)
+        Searches the main index, skipping rows replaced by online updates,
+        and brute-forces the small delta buffer, then merges by distance.
+        """
+        k = min(n_neighbors + len(delta.stale), len(store))
+        distances, indices = model.kneighbors(X_scaled, n_neighbors=k)
+        stale = set(delta.stale.tolist())
+        found = [(d, store.completed_courses(i)) for d, i in zip(distances[0], indices[0]) if i not in stale]
+        if len(delta):
+            delta_distances = np.sqrt(((delta.scaled - X_scaled) ** 2).sum(axis=1))
+            found.extend(zip(delta_distances, delta.courses))
+            found.sort(key=lambda item: item[0])  # 稳定排序：距离相同时主索引的结果在前
+        return [courses for _, courses in found[:n_neighbors]]
+    
+    def upsert_students(self, records):
+        """Add or replace student rows; returns the number of rows waiting for compaction
+        
+        Updates are visible to get_recommendations immediately through the
+        delta buffer. A background thread folds them into the feature store,
+        scaler and neighbor index every RECOMMENDER_COMPACT_INTERVAL seconds,
+        or as soon as the buffer holds RECOMMENDER_DELTA_MAX rows. Updates
+        live in this process only and are lost when the model is reloaded.
+        Raises ValueError for an invalid record.
+        """
+        records = [_normalize_student(record) for record in records]
+        if not records:
+            return len(self._delta)
         
-        # 按课程编号排序（核心课程优先）
-        available_courses.sort(key=lambda x: int(''.join(filter(str.isdigit, x))) if any(c.isdigit() for c in x) else 999)
+        with self._update_lock:
+            merged = dict(self._delta.records)
+            merged.update((record["student_id"], record) for record in records)
+            self._delta = _DeltaRows(merged, self.feature_store, self.preprocessor)
+            pending = len(merged)
+        
+        self._ensure_compactor()
+        if pending >= RECOMMENDER_DELTA_MAX:
+            self._compact_event.set()
+        return pending
+    
+    def compact(self):
+        """Fold buffered updates into a new feature store, scaler and neighbor index
         
-        return available_courses
+        The rebuild runs without holding the update lock, so queries keep
+        using the previous index until the swap. Returns True if anything was
+        merged.
+        """
+        with self._compact_lock:
+            with self._update_lock:
+                store, delta, scaler = self.feature_store, self._delta, copy.deepcopy(self.preprocessor)
+            if not len(delta):
+                return False
+            
+            started = time.time()
+            records = list(delta.records.values())
+            new_codes = {c for record in records for c in record["completed_courses"]} - set(store.course_codes)
+            course_codes = store.course_codes + sorted(new_codes)
+            keep = np.setdiff1d(np.arange(len(store)), delta.stale)
+            merged = StudentFeatureStore.from_chunks(
+                [store.columns(keep), StudentFeatureStore.from_records(records, course_codes).columns()], course_codes)
+            features = merged.design_matrix()
+            # 在合并后的数据上重新拟合缩放统计：被替换的旧记录不再计入均值和方差
+            scaled = scaler.fit_transform(features)
+            # 版本由合并后的内容决定，其他worker或重启后的进程不会把不同数据的可视化或ETag当作同一版本
+            version = f"{self._base_model_version}-c{_store_digest(merged)}"
+            model = create_index()
+            model.fit(scaled)
+            
+            with self._update_lock:
+                previous_version = self.model_version
+                # 合并期间到达的更新留在新的缓冲区中
+                remaining = {student_id: record for student_id, record in self._delta.records.items()
+                             if delta.records.get(student_id) is not record}
+                self.feature_store, self.features, self.scaled_features = merged, features, scaled
+                self.preprocessor, self.model = scaler, model
+                self._delta = _DeltaRows(remaining, merged, scaler)
+                self._compactions += 1
+                self._last_compaction = {"at": time.time(), "rows": len(records), "seconds": round(time.time() - started, 3)}
+                self.model_version = version
+                self._visualization = None
+            if previous_version != version:
+                self._remove_visualization(previous_version)
+            print(f"Compacted {len(records)} updated students into the recommender ({self.model_version})")
+            return True
+    
+    def _ensure_compactor(self):
+        with self._update_lock:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+                self._compactor.start()
+    
+    def _compaction_loop(self):
+        while True:
+            self._compact_event.wait(RECOMMENDER_COMPACT_INTERVAL)
+            self._compact_event.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting recommender updates: {str(e)}")
+    
+    def update_stats(self):
+        with self._update_lock:
+            return {
+                "model_version": self.model_version,
+                "students": len(self.feature_store),
+                "pending_updates": len(self._delta),
+                "compactions": self._compactions,
+                "last_compaction": self._last_compaction
+            }
+    
+    def _get_next_courses(self, completed_courses, major):
+        """使用规则方法获取下一步可学习的课程"""
+        candidates = self._major_candidates[major]  # 已按课程编号排序（核心课程优先）
+        
+        # 找出所有尚未完成但先修课程要求已满足的课程（位掩码判断）
+        done = self.prereq_graph.mask(completed_courses)
+        codes = self.prereq_graph.codes
+        return [codes[i] for i in self.prereq_graph.eligible(done, candidates)]
     
     def recommend_courses(self, student_data=None, num_recommendations=5):
-        """推荐课程给学生"""
+        """推荐课程给学生（与批量推荐使用同一实现，结果完全一致）"""
         # 从student_data中提取信息
         if student_data is None:
             return []
         
-        major = student_data.get('major', '')
-        completed_courses = student_data.get('completed_courses', [])
+        return self.recommend_courses_batch([student_data], num_recommendations)[0]
+    
+    def _get_batch_tables(self):
+        """Lookup tables for recommend_courses_batch, built once
         
-        # 如果没有完成任何课程，推荐该专业的第一门核心课程
-        if not completed_courses and major:
-            # 确保major存在于self.courses中
-            if major in self.courses:
-                return self.courses[major]["core"][:num_recommendations]
-            else:
-                # 如果专业不存在，返回CS专业的核心课程
-                return self.courses["CS"]["core"][:num_recommendations]
+        Returns (course_index, tables) where tables maps each major to its
+        candidate courses in recommendation order, their column indices and a
+        (num_courses x num_candidates) prerequisite matrix.
+        """
+        if self._batch_tables is not None:
+            return self._batch_tables
         
-        # 获取下一步可以学习的课程
-        available_courses = self._get_next_courses(completed_courses, major)
+        graph = self.prereq_graph
+        course_index = graph.index
         
-        # 如果没有可用课程，返回一些通用课程
-        if not available_courses:
-            # 返回一些通用的AI/ML课程
-            return ["CS101", "CS201", "MATH101", "AI101", "ML101"][:num_recommendations]
+        tables = {}
+        for major, candidates in self._major_candidates.items():
+            ordered = [graph.codes[i] for i in candidates]
+            columns = np.array(candidates, dtype=np.int64)
+            prereq_matrix = np.zeros((len(graph), len(candidates)), dtype=np.float32)
+            for j, i in enumerate(candidates):
+                prereq_matrix[graph.edge_prereq[graph.edge_course == i], j] = 1.0
+            tables[major] = (ordered, columns, prereq_matrix)
+        
+        self._batch_tables = (course_index, tables)
+        return self._batch_tables
+    
+    def recommend_courses_batch(self, students, num_recommendations=5):
+        """recommend_courses for many students at once; returns code lists in input order
+        
+        Students are grouped by major and each group is scored with one matrix
+        product: a candidate is available when it is not completed and the
+        number of its unmet prerequisites is zero.
+        """
+        course_index, tables = self._get_batch_tables()
+        results = [None] * len(students)
+        groups = {}
+        
+        for i, student in enumerate(students):
+            major = student.get('major', '')
+            completed_courses = student.get('completed_courses', [])
+            if not completed_courses and major:
+                # 没有完成任何课程：推荐该专业的核心课程（未知专业使用CS专业）
+                results[i] = self.courses.get(major, self.courses["CS"])["core"][:num_recommendations]
+            elif major not in tables:
+                # 未知专业没有候选课程，返回一些通用的AI/ML课程
+                results[i] = FALLBACK_COURSES[:num_recommendations]
+            else:
+                groups.setdefault(major, []).append(i)
+        
+        for major, rows in groups.items():
+            ordered, columns, prereq_matrix = tables[major]
+            
+            # 已完成课程矩阵（学生 x 课程），词表外的课程不影响结果
+            completed = np.zeros((len(rows), len(course_index)), dtype=np.float32)
+            for r, i in enumerate(rows):
+                cols = [course_index[c] for c in students[i].get('completed_courses', []) if c in course_index]
+                completed[r, cols] = 1.0
+            
+            unmet = (1.0 - completed) @ prereq_matrix
+            available = (unmet == 0) & (completed[:, columns] == 0)
+            
+            for r, i in enumerate(rows):
+                picks = np.flatnonzero(available[r])[:num_recommendations]
+                results[i] = [ordered[j] for j in picks] or FALLBACK_COURSES[:num_recommendations]
         
-        return available_courses[:num_recommendations]  # 确保最多返回指定数量的课程
+        return results
     
     def _check_prerequisites_met(self, course, completed_courses):
         """检查是否满足课程的先修要求"""
-        prereqs = self.prerequisites.get(course, [])
-        return all(prereq in completed_courses for prereq in prereqs)
+        return self.prereq_graph.prerequisites_met(course, self.prereq_graph.mask(completed_courses))
     
     def get_course_details(self, course_code):
         """Get details for a specific course"""
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import hashlib
+import joblib
+
+# 文件锁只在POSIX系统上可用；Windows开发环境下不加锁
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+
+class ArtifactChecksumError(Exception):
+    """The artifact on disk does not match the checksum in its manifest"""
+
+
+def artifact_path(name, version):
+    return os.path.join(MODEL_DIR, f"{name}-v{version}.joblib")
+
+
+def manifest_path(name, version):
+    return os.path.join(MODEL_DIR, f"{name}-v{version}.json")
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """分块计算文件的sha256，避免一次读入整个文件"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_artifact(name, version, bundle):
+    """Write the bundle and its manifest atomically; returns the manifest
+
+    The bundle is stored uncompressed so NumPy arrays inside it can be
+    memory-mapped on load and shared between worker processes.
+    """
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = artifact_path(name, version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(bundle, tmp_path)
+    checksum = file_checksum(tmp_path)
+    os.replace(tmp_path, path)
+
+    manifest = {
+        "name": name,
+        "version": version,
+        "sha256": checksum,
+        "size_bytes": os.path.getsize(path),
+        "created_at": time.time()
+    }
+    tmp_manifest = f"{manifest_path(name, version)}.{os.getpid()}.tmp"
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, manifest_path(name, version))
+    return manifest
+
+
+def load_artifact(name, version, mmap=True):
+    """Load a saved bundle after verifying its checksum; returns (bundle, manifest)
+
+    Raises FileNotFoundError if no artifact exists for this version and
+    ArtifactChecksumError if the file does not match its manifest.
+    """
+    with open(manifest_path(name, version)) as f:
+        manifest = json.load(f)
+    path = artifact_path(name, version)
+    checksum = file_checksum(path)
+    if checksum != manifest["sha256"]:
+        raise ArtifactChecksumError(f"Checksum mismatch for {path}: expected {manifest['sha256']}, got {checksum}")
+    # mmap_mode='r'：数组以只读方式映射，多个worker共享同一份页缓存
+    bundle = joblib.load(path, mmap_mode='r' if mmap else None)
+    return bundle, manifest
+
+
+class _ArtifactLock:
+    """进程间文件锁，保证只有一个worker负责训练和写入模型"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'w')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def load_or_build(name, version, build):
+    """Load the saved artifact for this version, or build and save it once
+
+    build() must return the bundle dict. Concurrent workers wait on a file
+    lock while the first one builds, then load the saved copy. If the model
+    directory is not writable the freshly built bundle is used in memory.
+    Returns (bundle, manifest); manifest is None for an unsaved bundle.
+    """
+    try:
+        return load_artifact(name, version)
+    except FileNotFoundError:
+        pass
+    except (ArtifactChecksumError, ValueError, EOFError) as e:
+        print(f"模型文件无效，将重新训练: {str(e)}")
+
+    bundle = None
+    try:
+        with _ArtifactLock(os.path.join(MODEL_DIR, f"{name}-v{version}.lock")):
+            # 等待锁期间其他worker可能已经完成训练
+            try:
+                return load_artifact(name, version)
+            except (FileNotFoundError, ArtifactChecksumError, ValueError, EOFError):
+                pass
+
+            print(f"Building model artifact {name} v{version}")
+            bundle = build()
+            save_artifact(name, version, bundle)
+            print(f"Saved model artifact to {artifact_path(name, version)}")
+    except OSError as e:
+        print(f"无法保存模型文件，仅在内存中使用: {str(e)}")
+        if bundle is None:
+            bundle = build()
+        return bundle, None
+
+    # 重新从磁盘加载，使用内存映射的数组
+    return load_artifact(name, version)
+
+
+def load_or_build_file(path, build):
+    """Read a derived file (e.g. a rendered plot), or build its bytes and write it once
+
+    Same locking as load_or_build: one worker runs build() while the others
+    wait and then read its output. Returns the file contents.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    data = None
+    try:
+        with _ArtifactLock(f"{path}.lock"):
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+
+            data = build()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"无法保存文件，仅在内存中使用: {str(e)}")
+        if data is None:
+            data = build()
+    return data
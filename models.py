@@ -1,12 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import aliased
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# 批量查询时每条语句最多包含的id数（SQLite对单条语句的参数个数有限制）
+IN_QUERY_CHUNK = 500
+
 # Association table for many-to-many relationship between courses and prerequisites
 course_prerequisites = db.Table('course_prerequisites',
     db.Column('course_id', db.Integer, db.ForeignKey('course.id'), primary_key=True),
-    db.Column('prerequisite_id', db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    db.Column('prerequisite_id', db.Integer, db.ForeignKey('course.id'), primary_key=True),
+    # 主键按(course_id, prerequisite_id)排序，反向查询（required_for）需要单独的索引
+    db.Index('ix_course_prerequisites_prerequisite_id', 'prerequisite_id', 'course_id')
 )
 
 class Course(db.Model):
@@ -27,7 +33,10 @@ class Course(db.Model):
         lazy='dynamic'
     )
     
-    def to_dict(self):
+    def to_dict(self, prerequisite_codes=None):
+        # prerequisite_codes由serialize_many批量查询后传入；单独调用时每门课程会额外查询一次
+        if prerequisite_codes is None:
+            prerequisite_codes = [p.code for p in self.prerequisites]
         return {
             'id': self.id,
             'code': self.code,
@@ -36,8 +45,43 @@ class Course(db.Model):
             'credits': self.credits,
             'difficulty_level': self.difficulty_level,
             'avg_study_hours': self.avg_study_hours,
-            'prerequisites': [p.code for p in self.prerequisites]
+            'prerequisites': prerequisite_codes
         }
+    
+    @classmethod
+    def prerequisite_codes(cls, course_ids=None):
+        """course_id -> list of prerequisite codes, for the given ids or (None) every course
+        
+        One query for all courses; one query per IN_QUERY_CHUNK ids otherwise.
+        """
+        prerequisite = aliased(cls)
+        query = db.session.query(course_prerequisites.c.course_id, prerequisite.code).join(
+            prerequisite, prerequisite.id == course_prerequisites.c.prerequisite_id
+        ).order_by(course_prerequisites.c.course_id, prerequisite.id)
+        
+        if course_ids is None:
+            rows = query.all()
+        else:
+            course_ids = list(course_ids)
+            rows = []
+            for start in range(0, len(course_ids), IN_QUERY_CHUNK):
+                chunk = course_ids[start:start + IN_QUERY_CHUNK]
+                rows.extend(query.filter(course_prerequisites.c.course_id.in_(chunk)).all())
+        
+        codes = {}
+        for course_id, code in rows:
+            codes.setdefault(course_id, []).append(code)
+        return codes
+    
+    @classmethod
+    def serialize_many(cls, courses, all_courses=False):
+        """to_dict for many courses without a prerequisite query per course
+        
+        Pass all_courses=True when courses is the whole table, so the
+        prerequisite codes come from one unfiltered query.
+        """
+        codes = cls.prerequisite_codes(None if all_courses else [course.id for course in courses])
+        return [course.to_dict(prerequisite_codes=codes.get(course.id, [])) for course in courses]
 
 class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -71,6 +115,30 @@ class Enrollment(db.Model):
     # Relationship with course
     course = db.relationship('Course', backref='enrollments')
     
+    # (student_id, status, course_id)覆盖按学生查询和按学生、状态汇总学分；course_id用于按课程查询选课记录
+    __table_args__ = (
+        db.Index('ix_enrollment_student_id_status', 'student_id', 'status', 'course_id'),
+        db.Index('ix_enrollment_course_id', 'course_id'),
+    )
+    
+    @classmethod
+    def credit_totals(cls, student_ids):
+        """student_id -> {status: credits}, from one aggregate query per IN_QUERY_CHUNK students
+        
+        Credits are summed in SQL (enrollment joined to course, grouped by
+        student and status) instead of loading every enrollment and its course.
+        """
+        student_ids = list(student_ids)
+        totals = {student_id: {} for student_id in student_ids}
+        for start in range(0, len(student_ids), IN_QUERY_CHUNK):
+            chunk = student_ids[start:start + IN_QUERY_CHUNK]
+            rows = db.session.query(cls.student_id, cls.status, db.func.sum(Course.credits)).join(
+                Course, Course.id == cls.course_id
+            ).filter(cls.student_id.in_(chunk)).group_by(cls.student_id, cls.status).all()
+            for student_id, status, credits in rows:
+                totals[student_id][status] = credits or 0
+        return totals
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,218 @@
+"""Nearest-neighbor indexes for the course recommender
+
+Every backend has the same interface as the sklearn estimator it replaces:
+
+    index = create_index()          # backend from NEIGHBOR_INDEX_BACKEND
+    index.fit(X)
+    distances, indices = index.kneighbors(X_query, n_neighbors=10)
+
+exact  sklearn NearestNeighbors with a ball tree (default, recall 1.0)
+ivf    inverted file: k-means coarse quantizer, search the n_probe closest lists
+lsh    random-hyperplane LSH: n_tables hash tables of n_bits each
+
+For the approximate backends, n_probe (ivf) and n_tables (lsh) set the
+recall/latency tradeoff. n_probe can also be passed per query.
+"""
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+NEIGHBOR_INDEX_BACKEND = os.getenv('NEIGHBOR_INDEX_BACKEND', 'exact')  # exact, ivf 或 lsh
+NEIGHBOR_COUNT = 10
+IVF_N_LISTS = int(os.getenv('IVF_N_LISTS', 0))  # 0 表示按数据量自动选择（约 sqrt(n)）
+IVF_N_PROBE = int(os.getenv('IVF_N_PROBE', 8))
+LSH_N_TABLES = int(os.getenv('LSH_N_TABLES', 6))
+LSH_N_BITS = int(os.getenv('LSH_N_BITS', 24))
+
+_ROW_CHUNK = 65536  # 分块计算距离，限制临时矩阵的内存
+
+
+def _squared_distances(X, Y):
+    """X 和 Y 每一行之间的平方欧氏距离"""
+    d = (X * X).sum(axis=1)[:, None] - 2.0 * X @ Y.T + (Y * Y).sum(axis=1)[None, :]
+    return np.maximum(d, 0.0, out=d)
+
+
+def _top_k(distances, candidates, n_neighbors):
+    """从候选行中选出距离最小的 n_neighbors 个，按距离排序"""
+    k = min(n_neighbors, len(candidates))
+    part = np.argpartition(distances, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+    order = part[np.argsort(distances[part], kind='stable')]
+    return np.sqrt(distances[order]), candidates[order]
+
+
+class ExactNeighborIndex:
+    """Exact search with a ball tree (the original recommender model)"""
+
+    backend = "exact"
+
+    def __init__(self, n_neighbors=NEIGHBOR_COUNT):
+        self.n_neighbors = n_neighbors
+        self._model = NearestNeighbors(n_neighbors=n_neighbors, algorithm='ball_tree')
+
+    def fit(self, X):
+        self._model.fit(X)
+        return self
+
+    def __len__(self):
+        return self._model.n_samples_fit_
+
+    def kneighbors(self, X, n_neighbors=None):
+        return self._model.kneighbors(X, n_neighbors=n_neighbors or self.n_neighbors)
+
+
+class _ApproximateIndex(ABC):
+    """近似索引的公共部分：保存训练数据，对候选行做精确重排
+
+    Subclasses implement fit (which must set _X) and _candidates.
+    """
+
+    def __init__(self, n_neighbors):
+        self.n_neighbors = n_neighbors
+        self._X = None
+
+    def __len__(self):
+        return len(self._X)
+
+    @abstractmethod
+    def fit(self, X):
+        """建立索引并保存训练数据（self._X），返回 self"""
+
+    @abstractmethod
+    def _candidates(self, x, **params):
+        """查询行 x 的候选行号（之后做精确重排）"""
+
+    def kneighbors(self, X, n_neighbors=None, **params):
+        n_neighbors = n_neighbors or self.n_neighbors
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        distances = np.full((len(X), n_neighbors), np.inf)
+        indices = np.full((len(X), n_neighbors), -1, dtype=np.int64)
+        for q, x in enumerate(X):
+            candidates = self._candidates(x, **params)
+            if len(candidates) < n_neighbors:
+                # 候选不足时退回全量搜索，保证总能返回 n_neighbors 个结果
+                candidates = np.arange(len(self._X))
+            d = _squared_distances(x[None, :], self._X[candidates])[0]
+            found_d, found_i = _top_k(d, candidates, n_neighbors)
+            distances[q, :len(found_d)] = found_d
+            indices[q, :len(found_i)] = found_i
+        return distances, indices
+
+
+class IVFNeighborIndex(_ApproximateIndex):
+    """Inverted-file index: rows are bucketed by their nearest k-means centroid
+
+    A query scans only the n_probe lists whose centroids are closest. More
+    probes give higher recall and higher latency.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, n_neighbors=NEIGHBOR_COUNT, n_lists=IVF_N_LISTS, n_probe=IVF_N_PROBE,
+                 n_iter=10, seed=42):
+        super().__init__(n_neighbors)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self._order = None  # 按所属列表排序后的行号
+        self._offsets = None  # 每个列表在 _order 中的起止位置
+
+    def _assign(self, X):
+        labels = np.empty(len(X), dtype=np.int64)
+        for start in range(0, len(X), _ROW_CHUNK):
+            block = X[start:start + _ROW_CHUNK]
+            labels[start:start + len(block)] = _squared_distances(block, self.centroids).argmin(axis=1)
+        return labels
+
+    def fit(self, X):
+        self._X = np.ascontiguousarray(X, dtype=np.float64)
+        n = len(self._X)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(self.seed)
+
+        # 在样本上训练k-means（每个中心约64个样本足够）
+        sample = self._X[rng.choice(n, size=min(n, 64 * n_lists), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = self._assign(sample)
+            sums = np.column_stack([np.bincount(labels, weights=sample[:, d], minlength=n_lists)
+                                    for d in range(sample.shape[1])])
+            counts = np.bincount(labels, minlength=n_lists)
+            nonempty = counts > 0
+            self.centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+        labels = self._assign(self._X)
+        self._order = np.argsort(labels, kind='stable')
+        self._offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=self._offsets[1:])
+        return self
+
+    def _candidates(self, x, n_probe=None):
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        d = _squared_distances(x[None, :], self.centroids)[0]
+        lists = np.argpartition(d, n_probe - 1)[:n_probe] if n_probe < len(d) else np.arange(len(d))
+        return np.concatenate([self._order[self._offsets[l]:self._offsets[l + 1]] for l in lists])
+
+
+class LSHNeighborIndex(_ApproximateIndex):
+    """Random-hyperplane LSH over centered rows
+
+    Each of the n_tables tables hashes a row to the sign pattern of n_bits
+    random projections. A query scans the union of its buckets. More tables
+    give higher recall; more bits give smaller buckets and lower latency.
+    """
+
+    backend = "lsh"
+
+    def __init__(self, n_neighbors=NEIGHBOR_COUNT, n_tables=LSH_N_TABLES, n_bits=LSH_N_BITS, seed=42):
+        super().__init__(n_neighbors)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.seed = seed
+        self._mean = None
+        self._planes = None
+        self._tables = None  # 每个表：(排序后的哈希值, 对应行号)
+
+    def _hash(self, X):
+        projections = np.einsum('nd,tbd->tnb', X - self._mean, self._planes) > 0
+        return projections.astype(np.int64) @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def fit(self, X):
+        self._X = np.ascontiguousarray(X, dtype=np.float64)
+        rng = np.random.default_rng(self.seed)
+        self._mean = self._X.mean(axis=0)
+        self._planes = rng.standard_normal((self.n_tables, self.n_bits, self._X.shape[1]))
+        self._tables = []
+        codes = np.concatenate([self._hash(self._X[s:s + _ROW_CHUNK]) for s in range(0, len(self._X), _ROW_CHUNK)],
+                               axis=1)
+        for t in range(self.n_tables):
+            order = np.argsort(codes[t], kind='stable')
+            self._tables.append((codes[t][order], order))
+        return self
+
+    def _candidates(self, x, n_tables=None):
+        codes = self._hash(x[None, :])[:, 0]
+        buckets = []
+        for t in range(min(n_tables or self.n_tables, self.n_tables)):
+            keys, rows = self._tables[t]
+            lo, hi = np.searchsorted(keys, codes[t], side='left'), np.searchsorted(keys, codes[t], side='right')
+            buckets.append(rows[lo:hi])
+        return np.unique(np.concatenate(buckets))
+
+
+BACKENDS = {
+    "exact": ExactNeighborIndex,
+    "ivf": IVFNeighborIndex,
+    "lsh": LSHNeighborIndex,
+}
+
+
+def create_index(backend=NEIGHBOR_INDEX_BACKEND, **params):
+    """根据名称创建邻居索引"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown neighbor index backend: {backend}")
+    return BACKENDS[backend](**params)
@@ -0,0 +1,226 @@
+"""Region-targeted OCR for vision crawler screenshots
+
+The vision crawler used to run Tesseract over the whole 1920px screenshot,
+again over up to three title crops, and again over a full screenshot after
+every expand button it clicked. An OcrSession reads all screenshots of one
+page instead:
+
+- Screenshots wider than OCR_MAX_WIDTH (HiDPI displays) are downsampled
+  to that width first.
+- Text regions are detected once per screenshot with OpenCV, on a copy
+  scaled by OCR_DETECT_SCALE: a morphological gradient, an Otsu threshold
+  and a closing kernel merge characters into blocks of lines, and each
+  block's bounding box becomes a region. Rules, photos and blank areas are
+  filtered out.
+- Each region is cropped from the full-size image and binarized (Otsu,
+  dark text on white) before it goes to Tesseract.
+- Regions are keyed by a hash of their binarized pixels. A screenshot
+  taken after a click mostly repeats the one before it, often shifted, so
+  only new or changed regions are OCR'd and the rest reuse the text
+  recognized earlier in the session. A screenshot identical to the
+  previous one is skipped entirely.
+- New regions are OCR'd in parallel on a process pool (OCR_WORKERS, 0
+  means in the calling thread). Its workers do not re-run the app startup
+  (see worker_pool).
+
+timings holds the milliseconds spent in each stage; the crawler reports it
+in vision_analysis.
+"""
+import os
+import time
+import hashlib
+import threading
+import contextlib
+from concurrent.futures.process import BrokenProcessPool
+from worker_pool import create_process_pool
+
+# OpenCV、Pillow和pytesseract只在非模拟模式下需要
+try:
+    import cv2
+    import numpy as np
+    import pytesseract
+    from PIL import Image
+    # 配置Tesseract OCR路径（Windows环境需要）；OCR工作进程也会导入本模块
+    import platform
+    if platform.system() == 'Windows':
+        pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    OCR_AVAILABLE = True
+except ImportError:
+    cv2 = None
+    OCR_AVAILABLE = False
+
+# OCR配置（可通过环境变量覆盖）
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', min(2, os.cpu_count() or 1)))  # 并行OCR的进程数，0 表示在当前线程中执行
+OCR_MAX_WIDTH = int(os.getenv('OCR_MAX_WIDTH', 1920))  # 更宽的截图先缩小到此宽度
+OCR_DETECT_SCALE = float(os.getenv('OCR_DETECT_SCALE', 0.5))  # 检测文本区域时使用的缩放比例
+OCR_TESSERACT_CONFIG = os.getenv('OCR_TESSERACT_CONFIG', '--psm 6')  # 每个区域按一个文本块识别
+OCR_MIN_REGION_HEIGHT = 8  # 低于此高度（像素）的区域视为噪点
+OCR_MAX_REGION_HEIGHT = 400  # 高于此高度的区域多半是图片而不是文本
+OCR_MIN_FILL = 0.08  # 区域内边缘像素的最低比例（分隔线和空白区域低于此值）
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # 每个工作进程只用一个线程运行Tesseract，避免与其他进程争抢CPU
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    if OCR_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn：不从带有多个线程的web进程fork子进程；工作进程不会重新执行 app.py 的启动流程
+            _pool = create_process_pool(OCR_WORKERS, initializer=_init_worker)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def recognize_region(crop):
+    """OCR one binarized region (runs in a pool worker)"""
+    return pytesseract.image_to_string(crop, config=OCR_TESSERACT_CONFIG).strip()
+
+
+def to_gray(image):
+    """PNG bytes, a PIL image or an RGB array -> grayscale array no wider than OCR_MAX_WIDTH"""
+    if isinstance(image, (bytes, bytearray)):
+        gray = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+    else:
+        array = np.asarray(image.convert('RGB') if isinstance(image, Image.Image) else image)
+        gray = array if array.ndim == 2 else cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+    if gray.shape[1] > OCR_MAX_WIDTH:
+        scale = OCR_MAX_WIDTH / gray.shape[1]
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def detect_text_regions(gray, scale=OCR_DETECT_SCALE):
+    """Bounding boxes (x, y, w, h) of text blocks in reading order"""
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale != 1 else gray
+    # 字符边缘处梯度大，背景色和渐变不影响结果
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # 横向连接同一行的字符，纵向只连接行距较小的相邻行
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(18 * scale)), max(1, int(6 * scale))))
+    blocks = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    height, width = gray.shape
+    regions = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h < OCR_MIN_REGION_HEIGHT * scale or w < h or h > OCR_MAX_REGION_HEIGHT * scale:
+            continue
+        if cv2.countNonZero(edges[y:y + h, x:x + w]) < OCR_MIN_FILL * w * h:
+            continue
+        # 映射回原图坐标，并留出少量边距
+        pad = 4
+        x0, y0 = max(int(x / scale) - pad, 0), max(int(y / scale) - pad, 0)
+        x1, y1 = min(int((x + w) / scale) + pad, width), min(int((y + h) / scale) + pad, height)
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+    # 按阅读顺序：先按行（粗略的纵坐标），再按横坐标
+    regions.sort(key=lambda r: (r[1] // 10, r[0]))
+    return regions
+
+
+def binarize(crop):
+    """Otsu threshold with dark text on a white background, as Tesseract expects"""
+    _, binary = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if cv2.countNonZero(binary) < binary.size / 2:
+        # 深色背景上的浅色文字
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def region_key(binary):
+    return hashlib.blake2b(binary.tobytes() + str(binary.shape).encode(), digest_size=16).hexdigest()
+
+
+class OcrSession:
+    """OCR of the screenshots of one page; regions already read are not OCR'd again"""
+
+    def __init__(self, recognizer=recognize_region, pool=None):
+        self.recognizer = recognizer
+        self.pool = pool
+        self.texts = {}  # 区域哈希 -> 识别出的文本
+        self.timings = {}
+        self.regions_detected = 0
+        self.regions_ocr = 0
+        self.regions_reused = 0
+        self.screenshots_skipped = 0
+        self._last_gray = None
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        """累计某个阶段的耗时（毫秒）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.timings[stage] = round(self.timings.get(stage, 0.0) + elapsed, 1)
+
+    def _recognize_all(self, crops):
+        pool = self.pool if self.pool is not None else _get_pool()
+        if pool is None or len(crops) < 2:
+            return [self.recognizer(crop) for crop in crops]
+        try:
+            return list(pool.map(self.recognizer, crops))
+        except BrokenProcessPool:
+            # 工作进程崩溃（如内存不足）：下次重新创建进程池
+            if self.pool is None:
+                _discard_pool()
+            raise
+
+    def read(self, image):
+        """OCR one screenshot; returns [(box, text)] for the regions that are new in this session"""
+        with self.timed("preprocess"):
+            gray = to_gray(image)
+            if self._last_gray is not None and np.array_equal(gray, self._last_gray):
+                # 点击后页面没有可见变化
+                self.screenshots_skipped += 1
+                return []
+            self._last_gray = gray
+
+        with self.timed("detect"):
+            regions = detect_text_regions(gray)
+            self.regions_detected += len(regions)
+
+        with self.timed("binarize"):
+            pending = {}
+            ordered = []
+            for x, y, w, h in regions:
+                binary = binarize(gray[y:y + h, x:x + w])
+                key = region_key(binary)
+                if key in self.texts or key in pending:
+                    self.regions_reused += 1
+                    continue
+                pending[key] = binary
+                ordered.append(((x, y, w, h), key))
+
+        with self.timed("ocr"):
+            keys = list(pending)
+            for key, text in zip(keys, self._recognize_all([pending[key] for key in keys])):
+                self.texts[key] = text
+            self.regions_ocr += len(keys)
+
+        return [(box, self.texts[key]) for box, key in ordered if self.texts[key]]
+
+    def stats(self):
+        return {
+            "text_regions_found": self.regions_detected,
+            "regions_ocr": self.regions_ocr,
+            "regions_reused": self.regions_reused,
+            "screenshots_skipped": self.screenshots_skipped,
+            "timings_ms": dict(self.timings)
+        }
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class PrerequisiteGraph:
+    """Prerequisite DAG compiled to bit positions
+
+    Every course code gets a bit position. Each course's prerequisites, and
+    any set of completed courses, are stored as an integer bitmask, so
+    "are all prerequisites met" is `prereq_mask & done == prereq_mask`.
+    Prerequisite edges are also kept as NumPy arrays, so eligibility across
+    the whole catalog costs a few array operations.
+    """
+
+    def __init__(self, prerequisites, courses=()):
+        codes = set(courses) | set(prerequisites)
+        for prereqs in prerequisites.values():
+            codes.update(prereqs)
+        self.codes = sorted(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+
+        self.prereq_masks = [0] * len(self.codes)
+        edge_course, edge_prereq = [], []
+        for code, prereqs in prerequisites.items():
+            i = self.index[code]
+            for prereq in prereqs:
+                j = self.index[prereq]
+                if not self.prereq_masks[i] >> j & 1:
+                    edge_course.append(i)
+                    edge_prereq.append(j)
+                self.prereq_masks[i] |= 1 << j
+        # 先修关系的边（课程 <- 先修课程），用于整个目录的向量化判断
+        self.edge_course = np.array(edge_course, dtype=np.int64)
+        self.edge_prereq = np.array(edge_prereq, dtype=np.int64)
+
+        # 邻接表：每门课程的先修课程和后续课程
+        self.prereq_lists = [[] for _ in self.codes]
+        self.dependent_lists = [[] for _ in self.codes]
+        for i, j in zip(edge_course, edge_prereq):
+            self.prereq_lists[i].append(j)
+            self.dependent_lists[j].append(i)
+        self._topological_order = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def topological_order(self):
+        """Course indices with every prerequisite before the courses that need it (Kahn's algorithm)
+
+        Raises ValueError if the prerequisites contain a cycle.
+        """
+        if self._topological_order is None:
+            indegree = [len(prereqs) for prereqs in self.prereq_lists]
+            order = [i for i, d in enumerate(indegree) if d == 0]
+            for i in order:
+                for j in self.dependent_lists[i]:
+                    indegree[j] -= 1
+                    if indegree[j] == 0:
+                        order.append(j)
+            if len(order) != len(self.codes):
+                cyclic = sorted(self.codes[i] for i, d in enumerate(indegree) if d > 0)
+                raise ValueError(f"Prerequisite cycle among: {', '.join(cyclic[:10])}")
+            self._topological_order = order
+        return self._topological_order
+
+    def mask(self, codes):
+        """课程代码集合 -> 位掩码；不在图中的课程被忽略（它们不可能是任何课程的先修课）"""
+        done = 0
+        for code in codes:
+            i = self.index.get(code)
+            if i is not None:
+                done |= 1 << i
+        return done
+
+    def prerequisites_met(self, code, done):
+        i = self.index.get(code)
+        if i is None:
+            return True
+        prereq_mask = self.prereq_masks[i]
+        return prereq_mask & done == prereq_mask
+
+    def eligible(self, done, candidates):
+        """Indices from candidates (in their order) not yet completed and with every prerequisite in done"""
+        if len(candidates) > 64:
+            # 候选课程较多时整数位运算的代价随目录大小增长，改用向量化判断
+            eligible = self.eligible_all(done)
+            return [i for i in candidates if eligible[i]]
+        masks = self.prereq_masks
+        return [i for i in candidates if not done >> i & 1 and masks[i] & done == masks[i]]
+
+    def done_array(self, done):
+        """位掩码 -> 长度为课程数的布尔数组"""
+        n = len(self.codes)
+        raw = np.frombuffer(done.to_bytes((n + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder='little', count=n).astype(bool)
+
+    def eligible_all(self, done):
+        """Boolean array over the whole catalog: not completed and all prerequisites met"""
+        done = self.done_array(done)
+        unmet = np.bincount(self.edge_course[~done[self.edge_prereq]], minlength=len(self.codes))
+        return (unmet == 0) & ~done
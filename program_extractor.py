@@ -0,0 +1,267 @@
+"""Single-pass extraction of program information from catalog pages
+
+extract_program_fields(html) returns the same fields as the BeautifulSoup
+extractor in crawler_service: title, description, courses, requirements,
+credits and raw_text_sample. It works in one lxml traversal instead of a
+dozen find_all scans over the tree.
+
+The traversal builds the page text once, as a list of segments, and
+records each element's start and end offset in it. Any element's
+get_text() is then a slice of that text. Text segments that contain a
+keyword are recorded per keyword, with their parent element. Headings,
+paragraphs, list items and lists are recorded by tag. The original
+selection rules (keyword order, then document order) are then applied to
+these records without walking the tree again.
+
+lxml is optional. crawler_service falls back to BeautifulSoup when
+LXML_AVAILABLE is False or lxml cannot parse the page.
+"""
+import re
+from bisect import bisect_right
+
+# lxml 未安装时由 crawler_service 回退到 BeautifulSoup 实现
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    etree = None
+    LXML_AVAILABLE = False
+
+TITLE_KEYWORDS = ['program', 'degree', 'major', 'bachelor', 'master', 'computer science', 'curriculum']
+DESCRIPTION_KEYWORDS = ['overview', 'introduction', 'about', 'description', 'program', 'curriculum']
+REQUIREMENT_KEYWORDS = ['requirement', 'prerequisite', 'admission', 'criteria', 'eligibility']
+TITLE_PARENTS = {'h1', 'h2', 'h3', 'h4', 'strong', 'b', 'div', 'p'}
+MAX_COURSES = 20
+MAX_REQUIREMENTS = 10
+
+COURSE_PATTERNS = [re.compile(p) for p in (
+    r'[A-Z]{2,4}\s*\d{3,4}[A-Z]?',  # 如 CS101, MATH101A
+    r'[A-Z]{2,4}\s*\d{3,4}[A-Z]?\s*[-:]\s*[A-Za-z\s]+',  # 如 CS101 - Introduction to Programming
+    r'[A-Za-z\s]+\s*\(\s*[A-Z]{2,4}\s*\d{3,4}[A-Z]?\s*\)'  # 如 Introduction to Programming (CS101)
+)]
+CREDIT_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'\d+\s*credits',
+    r'\d+\s*credit\s*hours',
+    r'total\s*of\s*\d+\s*credits',
+    r'minimum\s*of\s*\d+\s*credits',
+    r'requires\s*\d+\s*credits'
+)]
+_DIGIT = re.compile(r'\d+')
+
+_KEYWORDS = list(dict.fromkeys(TITLE_KEYWORDS + DESCRIPTION_KEYWORDS + REQUIREMENT_KEYWORDS))
+# 绝大多数文本段不含任何关键词，先用一个合并的模式快速排除
+_ANY_KEYWORD = re.compile('|'.join(re.escape(k) for k in _KEYWORDS), re.IGNORECASE)
+
+# 这些标签的内容不属于页面文本（与 BeautifulSoup 的 get_text() 一致）
+_SKIPPED_TAGS = {'script', 'style', 'template'}
+_RECORDED_TAGS = ('h1', 'h2', 'h3', 'p', 'li', 'ul')
+
+
+class _PageIndex:
+    """One traversal of the parsed page: text offsets, parents and keyword hits"""
+
+    def __init__(self, root):
+        self.tags = []
+        self.parents = []
+        self.starts = []  # 元素文本在 text 中的起止位置
+        self.ends = []
+        self.last_descendant = []  # 最后一个后代元素的序号，用于按文档顺序查找后代
+        self.by_tag = {tag: [] for tag in _RECORDED_TAGS}
+        self.keyword_parents = {k: [] for k in _KEYWORDS}  # 关键词 -> 包含它的文本段的父元素（文档顺序）
+        segments = []
+        length = 0
+
+        def add(text, parent):
+            nonlocal length
+            segments.append(text)
+            length += len(text)
+            if _ANY_KEYWORD.search(text):
+                lowered = text.lower()
+                for keyword in _KEYWORDS:
+                    if keyword in lowered:
+                        self.keyword_parents[keyword].append(parent)
+
+        stack = []
+        skipping = 0
+        # 注释和处理指令只有在请求 comment/pi 事件时才会被遍历到（各一个事件）
+        for event, el in etree.iterwalk(root, events=('start', 'end', 'comment', 'pi')):
+            tag = el.tag
+            if not isinstance(tag, str):
+                # 注释和处理指令本身不是文本，但它们后面的文本属于父元素
+                if el.tail and not skipping and stack:
+                    add(el.tail, stack[-1])
+                continue
+            if event == 'start':
+                index = len(self.tags)
+                self.tags.append(tag)
+                self.parents.append(stack[-1] if stack else -1)
+                self.starts.append(length)
+                self.ends.append(length)
+                self.last_descendant.append(index)
+                if tag in self.by_tag:
+                    self.by_tag[tag].append(index)
+                stack.append(index)
+                if tag in _SKIPPED_TAGS:
+                    skipping += 1
+                elif el.text and not skipping:
+                    add(el.text, index)
+            else:
+                index = stack.pop()
+                if tag in _SKIPPED_TAGS:
+                    skipping -= 1
+                self.ends[index] = length
+                self.last_descendant[index] = len(self.tags) - 1
+                if el.tail and not skipping and stack:
+                    add(el.tail, stack[-1])
+
+        self.text = ''.join(segments)
+
+    def element_text(self, index):
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def next_element(self, tag, after):
+        """find_next(tag)：文档顺序中在 after 之后开始的第一个该标签元素"""
+        indices = self.by_tag[tag]
+        position = bisect_right(indices, after)
+        return indices[position] if position < len(indices) else -1
+
+    def descendants(self, tag, index):
+        indices = self.by_tag[tag]
+        return indices[bisect_right(indices, index):bisect_right(indices, self.last_descendant[index])]
+
+
+def _parse(html):
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    # 空文档没有根元素
+    return etree.fromstring(html, etree.HTMLParser(encoding='utf-8')) if html.strip() else None
+
+
+def _find_title(page):
+    # 方法1: 常见标题标签（按 h1、h2、h3 的顺序）
+    for tag in ('h1', 'h2', 'h3'):
+        for index in page.by_tag[tag]:
+            title_text = page.element_text(index).strip()
+            if 5 < len(title_text) < 100:  # 合理的标题长度
+                return title_text
+    # 方法2: 包含关键词的文本所在的元素
+    for keyword in TITLE_KEYWORDS:
+        for parent in page.keyword_parents[keyword]:
+            if page.tags[parent] in TITLE_PARENTS:
+                title_text = page.element_text(parent).strip()
+                if 5 < len(title_text) < 100:
+                    return title_text
+    return ""
+
+
+def _find_courses(page):
+    # 按模式顺序查找，得到足够的课程后不再运行后面的（较慢的）模式
+    courses = []
+    seen = set()
+    for pattern in COURSE_PATTERNS:
+        for match in pattern.finditer(page.text):
+            course = match.group(0).strip()
+            if course not in seen and len(course) > 3:
+                seen.add(course)
+                courses.append(course)
+                if len(courses) >= MAX_COURSES:
+                    return courses
+    if courses:
+        return courses
+    # 如果没有找到课程，尝试查找列表项（包含数字和字母）
+    for index in page.by_tag['li']:
+        item_text = page.element_text(index).strip()
+        if _DIGIT.search(item_text) and 10 < len(item_text) < 200:
+            courses.append(item_text)
+            if len(courses) >= MAX_COURSES:
+                break
+    return courses
+
+
+def _find_credits(page):
+    for pattern in CREDIT_PATTERNS:
+        match = pattern.search(page.text)
+        if match:
+            return match.group(0)
+    return ""
+
+
+def _find_description(page):
+    # 查找包含关键词的段落（文本直接在 p 中，或在 p 的子元素中）
+    for keyword in DESCRIPTION_KEYWORDS:
+        for parent in page.keyword_parents[keyword]:
+            if page.tags[parent] == 'p':
+                candidate = parent
+            elif page.parents[parent] != -1 and page.tags[page.parents[parent]] == 'p':
+                candidate = page.parents[parent]
+            else:
+                continue
+            desc_text = page.element_text(candidate).strip()
+            if len(desc_text) > 50:  # 只考虑较长的段落
+                return desc_text
+    # 如果没有找到，使用前几个段落
+    for index in page.by_tag['p'][:5]:
+        p_text = page.element_text(index).strip()
+        if len(p_text) > 50:
+            return p_text
+    return ""
+
+
+def _find_requirements(page):
+    requirements = []
+    for keyword in REQUIREMENT_KEYWORDS:
+        for parent in page.keyword_parents[keyword]:
+            # 包含要求的段落或列表项
+            if page.tags[parent] in ('p', 'li', 'div'):
+                requirements.append(page.element_text(parent).strip())
+            # 父元素之后的第一个列表中的列表项
+            next_ul = page.next_element('ul', parent)
+            if next_ul != -1:
+                for li in page.descendants('li', next_ul):
+                    req_text = page.element_text(li).strip()
+                    if len(req_text) > 10:
+                        requirements.append(req_text)
+            if len(requirements) >= MAX_REQUIREMENTS:
+                return requirements[:MAX_REQUIREMENTS]
+    return requirements
+
+
+def extract_program_fields(html):
+    """Extracted fields of a program page; empty values where nothing was found"""
+    root = _parse(html)
+    if root is None:
+        page_text = ""
+        page = None
+    else:
+        page = _PageIndex(root)
+        page_text = page.text
+    print(f"提取的文本内容长度: {len(page_text)}")
+
+    program_info = {
+        "title": "",
+        "description": "",
+        "courses": [],
+        "requirements": [],
+        "credits": "",
+        "raw_text_sample": page_text[:1000]  # 添加原始文本样本用于调试
+    }
+    if page is None:
+        return program_info
+
+    program_info["title"] = _find_title(page)
+    if program_info["title"]:
+        print(f"找到标题: {program_info['title']}")
+
+    program_info["courses"] = _find_courses(page)
+    print(f"找到课程数量: {len(program_info['courses'])}")
+
+    program_info["credits"] = _find_credits(page)
+    if program_info["credits"]:
+        print(f"找到学分要求: {program_info['credits']}")
+
+    program_info["description"] = _find_description(page)
+    if program_info["description"]:
+        print(f"找到描述: {program_info['description'][:100]}...")
+
+    program_info["requirements"] = _find_requirements(page)
+    return program_info
@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 回复缓存配置（可通过环境变量覆盖）
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')  # memory 或 disk
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 86400))  # 缓存有效期（秒）
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024))  # 最多缓存条目数
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'response_cache'))
+
+
+def normalize_prompt(prompt):
+    """统一空白和大小写，使只在格式上不同的提示词得到相同的缓存键"""
+    return re.sub(r'\s+', ' ', prompt).strip().casefold()
+
+
+def make_cache_key(prompt, model, **params):
+    """Content-addressed key: sha256 over the normalized prompt, model and request parameters"""
+    material = json.dumps({
+        "prompt": normalize_prompt(prompt),
+        "model": model,
+        "params": params
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process backend: an OrderedDict in LRU order with per-entry expiry"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCacheBackend:
+    """On-disk backend: one JSON file per key, shared by every worker process
+
+    File mtime is the last-access time, so LRU eviction survives restarts.
+    Writes go through a temp file and os.replace so readers never see partial entries.
+
+    Eviction scans the directory, so it is amortized: each process keeps an
+    approximate entry count, and only scans when that count passes
+    max_entries, or every rescan_every writes to pick up entries written by
+    other processes. A scan then evicts down to 90% of max_entries.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, max_entries=RESPONSE_CACHE_MAX_ENTRIES, rescan_every=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.rescan_every = rescan_every or max(64, max_entries // 8)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._count = None  # 估计的条目数，None 表示尚未扫描
+        self._writes_since_scan = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] < time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)  # 记录访问时间，用于LRU淘汰
+        except OSError:
+            pass
+        return entry["value"]
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, f, ensure_ascii=False)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._count is not None and not existed:
+                self._count += 1
+            self._writes_since_scan += 1
+            scan = (self._count is None or self._count > self.max_entries
+                    or self._writes_since_scan >= self.rescan_every)
+        if scan:
+            self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            return
+        with self._lock:
+            if self._count is not None:
+                self._count = max(self._count - 1, 0)
+
+    def clear(self):
+        for name in self._entry_names():
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        with self._lock:
+            self._count = None
+
+    def _entry_names(self):
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return []
+
+    def _evict(self):
+        """扫描目录；超过条目上限时，按访问时间批量删除最旧的文件（删到上限的90%）"""
+        names = self._entry_names()
+        excess = len(names) - self.max_entries
+        with self._lock:
+            self._count = len(names)
+            self._writes_since_scan = 0
+        if excess <= 0:
+            return
+        excess = len(names) - (self.max_entries - self.max_entries // 10)
+        entries = []
+        for name in names:
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except OSError:
+                continue
+        removed = 0
+        for _, name in sorted(entries)[:excess]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += removed
+            self._count = max(self._count - removed, 0)
+
+    def __len__(self):
+        return len(self._entry_names())
+
+
+def create_backend(name=RESPONSE_CACHE_BACKEND):
+    """根据配置名称创建缓存后端"""
+    if name == 'disk':
+        return DiskCacheBackend()
+    if name == 'memory':
+        return MemoryCacheBackend()
+    raise ValueError(f"Unknown response cache backend: {name}")
+
+
+class ResponseCache:
+    """TTL + LRU cache for LLM replies with hit/miss counters
+
+    Any object with get(key), set(key, value, ttl), delete(key), clear() and
+    __len__ can be used as the backend.
+    """
+
+    def __init__(self, backend=None, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend if backend is not None else create_backend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "ttl_seconds": self.ttl
+        }
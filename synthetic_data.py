@@ -0,0 +1,247 @@
+"""Seeded, chunked generator for synthetic student records
+
+Used both for the recommender's training data and for load-test fixtures
+with millions of students. Students are produced in fixed-size chunks of
+NumPy columns (CSR-style course lists, the same layout as
+StudentFeatureStore), so memory depends on the chunk size only.
+
+    python synthetic_data.py --students 2000000 --out fixtures/students.npz
+    python synthetic_data.py --students 2000000 --out fixtures/students.parquet   # requires pyarrow
+"""
+import os
+import random
+import zipfile
+import argparse
+import numpy as np
+from feature_store import MAJORS, MAJOR_INDEX
+
+# Parquet输出需要pyarrow（可选依赖）；未安装时只支持NPZ
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+SYNTHETIC_DATA_SEED = int(os.getenv('SYNTHETIC_DATA_SEED', 42))
+SYNTHETIC_CHUNK_SIZE = int(os.getenv('SYNTHETIC_CHUNK_SIZE', 50000))
+
+CHUNK_COLUMNS = ("student_ids", "major_codes", "semester", "gpa", "course_offsets", "course_ids", "grades")
+
+
+def build_catalog(seed=SYNTHETIC_DATA_SEED, majors=MAJORS):
+    """Course catalog and prerequisites; returns (courses, prerequisites)"""
+    rng = random.Random(seed)
+    courses = {}
+    prerequisites = {}
+
+    for major in majors:
+        # 核心课程（依次依赖前一门）
+        core_courses = [f"{major}{101+i*100}" for i in range(5)]
+        # 选修课程
+        elective_courses = [f"{major}E{201+i*50}" for i in range(8)]
+        # 其他专业的相关课程
+        related_majors = rng.sample([m for m in majors if m != major], 3)
+        related_courses = []
+        for related_major in related_majors:
+            related_courses.extend([f"{related_major}{101+i*100}" for i in range(2)])
+
+        courses[major] = {
+            "core": core_courses,
+            "electives": elective_courses,
+            "related": related_courses
+        }
+
+        for i in range(1, len(core_courses)):
+            prerequisites[core_courses[i]] = [core_courses[i-1]]
+        # 前半部分选修课依赖第一门核心课程，后半部分依赖第二门
+        for i, elective in enumerate(elective_courses):
+            prerequisites[elective] = [core_courses[0] if i < len(elective_courses) // 2 else core_courses[1]]
+        # 相关课程没有先修要求
+        for related in related_courses:
+            prerequisites[related] = []
+
+    return courses, prerequisites
+
+
+class _MajorTable:
+    """一个专业的候选课程，以及用于线性时间更新可选课程的依赖计数"""
+
+    def __init__(self, all_courses, prerequisites, course_index):
+        local = {code: i for i, code in enumerate(all_courses)}
+        self.course_ids = [course_index[code] for code in all_courses]
+        self.unmet = [len(set(prerequisites.get(code, []))) for code in all_courses]
+        self.dependents = [[] for _ in all_courses]
+        for i, code in enumerate(all_courses):
+            for prereq in set(prerequisites.get(code, [])):
+                if prereq in local:
+                    self.dependents[local[prereq]].append(i)
+        self.roots = [i for i, count in enumerate(self.unmet) if count == 0]
+
+
+class SyntheticStudentGenerator:
+    """Generates students in seeded chunks; chunk k is reproducible on its own
+
+    Each student picks completed courses one at a time, uniformly from the
+    courses whose prerequisites are already completed (as in the original
+    generator). Availability is tracked with per-course unmet-prerequisite
+    counters, so each pick costs O(1) plus its outgoing edges.
+    """
+
+    def __init__(self, courses, prerequisites, seed=SYNTHETIC_DATA_SEED, chunk_size=SYNTHETIC_CHUNK_SIZE):
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.majors = [major for major in MAJORS if major in courses]
+        self.course_codes = sorted({code for groups in courses.values()
+                                    for code in groups["core"] + groups["electives"] + groups["related"]})
+        course_index = {code: i for i, code in enumerate(self.course_codes)}
+        self.tables = [
+            _MajorTable(courses[major]["core"] + courses[major]["electives"] + courses[major]["related"],
+                        prerequisites, course_index)
+            for major in self.majors
+        ]
+        self.max_picks = max(len(table.course_ids) for table in self.tables)
+
+    def generate_chunk(self, chunk_index, size, first_id=1):
+        """一个分块的列式数据（与StudentFeatureStore相同的布局）"""
+        rng = np.random.default_rng([self.seed, chunk_index])
+        major_slots = rng.integers(len(self.majors), size=size)
+        semester = rng.integers(1, 9, size=size)
+        gpa = np.round(rng.uniform(2.0, 4.0, size=size), 2)
+        # 学期越高完成的课程越多
+        targets = np.minimum((semester * 1.5).astype(np.int64),
+                             np.array([len(t.course_ids) for t in self.tables])[major_slots])
+        draws = rng.random((size, self.max_picks))
+
+        counts = np.zeros(size, dtype=np.int64)
+        course_ids = []
+        for s in range(size):
+            table = self.tables[major_slots[s]]
+            unmet = table.unmet.copy()
+            available = table.roots.copy()
+            row_draws = draws[s]
+            picked = 0
+            while picked < targets[s] and available:
+                j = int(row_draws[picked] * len(available))
+                course = available[j]
+                available[j] = available[-1]
+                available.pop()
+                course_ids.append(table.course_ids[course])
+                picked += 1
+                for dependent in table.dependents[course]:
+                    unmet[dependent] -= 1
+                    if unmet[dependent] == 0:
+                        available.append(dependent)
+            counts[s] = picked
+
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # 成绩以GPA为中心加正态噪声（GPA 2.0-4.0 对应 60-100分）
+        mean_grade = np.clip(60 + (gpa - 2.0) * 20, 60, 100)
+        noise = rng.normal(0.0, 10.0, size=int(offsets[-1]))
+        grades = np.clip(np.trunc(np.repeat(mean_grade, counts) + noise), 60, 100)
+
+        major_codes = np.array([MAJOR_INDEX[m] for m in self.majors], dtype=np.int8)[major_slots]
+        return {
+            "student_ids": np.arange(first_id, first_id + size, dtype=np.int64),
+            "major_codes": major_codes,
+            "semester": semester.astype(np.int8),
+            "gpa": gpa,
+            "course_offsets": offsets,
+            "course_ids": np.array(course_ids, dtype=np.int32),
+            "grades": grades.astype(np.int16)
+        }
+
+    def iter_chunks(self, num_students):
+        for chunk_index, start in enumerate(range(0, num_students, self.chunk_size)):
+            size = min(self.chunk_size, num_students - start)
+            yield self.generate_chunk(chunk_index, size, first_id=start + 1)
+
+    def iter_records(self, num_students):
+        """逐个产生训练数据格式的学生字典"""
+        for chunk in self.iter_chunks(num_students):
+            offsets = chunk["course_offsets"]
+            for s in range(len(chunk["student_ids"])):
+                start, end = offsets[s], offsets[s + 1]
+                completed_courses = [self.course_codes[i] for i in chunk["course_ids"][start:end]]
+                yield {
+                    "student_id": int(chunk["student_ids"][s]),
+                    "major": MAJORS[chunk["major_codes"][s]],
+                    "semester": int(chunk["semester"][s]),
+                    "gpa": float(chunk["gpa"][s]),
+                    "completed_courses": completed_courses,
+                    "grades": dict(zip(completed_courses, chunk["grades"][start:end].tolist()))
+                }
+
+    def write_npz(self, path, num_students):
+        """Stream chunks into an NPZ archive, one entry per column per chunk
+
+        Entries are named "<column>/<chunk>.npy"; course codes are stored
+        once as "course_codes.npy". Read back with iter_npz_chunks.
+        """
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            with archive.open("course_codes.npy", 'w') as f:
+                np.lib.format.write_array(f, np.array(self.course_codes))
+            for chunk_index, chunk in enumerate(self.iter_chunks(num_students)):
+                for column in CHUNK_COLUMNS:
+                    with archive.open(f"{column}/{chunk_index:06d}.npy", 'w', force_zip64=True) as f:
+                        np.lib.format.write_array(f, chunk[column])
+
+    def write_parquet(self, path, num_students):
+        """Stream chunks into a Parquet file, one row group per chunk"""
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        codes = pa.array(self.course_codes)
+        majors = pa.array(MAJORS)
+        writer = None
+        try:
+            for chunk in self.iter_chunks(num_students):
+                offsets = pa.array(chunk["course_offsets"].astype(np.int32))
+                table = pa.table({
+                    "student_id": chunk["student_ids"],
+                    "major": pa.DictionaryArray.from_arrays(chunk["major_codes"], majors),
+                    "semester": chunk["semester"],
+                    "gpa": chunk["gpa"],
+                    "completed_courses": pa.ListArray.from_arrays(
+                        offsets, pa.DictionaryArray.from_arrays(chunk["course_ids"], codes)),
+                    "grades": pa.ListArray.from_arrays(offsets, pa.array(chunk["grades"]))
+                })
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def iter_npz_chunks(path):
+    """读取write_npz写出的文件，逐块返回 (course_codes, chunk)"""
+    with np.load(path, allow_pickle=False) as archive:
+        course_codes = archive["course_codes"].tolist()
+        chunk_names = sorted(name.split("/", 1)[1] for name in archive.files if name.startswith("student_ids/"))
+        for name in chunk_names:
+            yield course_codes, {column: archive[f"{column}/{name}"] for column in CHUNK_COLUMNS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, required=True)
+    parser.add_argument("--out", required=True, help="output path ending in .npz or .parquet")
+    parser.add_argument("--seed", type=int, default=SYNTHETIC_DATA_SEED)
+    parser.add_argument("--chunk-size", type=int, default=SYNTHETIC_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    courses, prerequisites = build_catalog(args.seed)
+    generator = SyntheticStudentGenerator(courses, prerequisites, seed=args.seed, chunk_size=args.chunk_size)
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if args.out.endswith(".parquet"):
+        generator.write_parquet(args.out, args.students)
+    else:
+        generator.write_npz(args.out, args.students)
+    print(f"Wrote {args.students} students to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
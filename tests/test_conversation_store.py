@@ -0,0 +1,93 @@
+"""ConversationStore budgets and eviction, and chat turns saved only on success
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deepseek_service
+from deepseek_service import ConversationStore, estimate_tokens
+
+
+def contents(store, session_id):
+    return [m["content"] for m in store.get_history(session_id)]
+
+
+def test_session_budget_drops_oldest_messages_but_keeps_the_latest():
+    store = ConversationStore(session_token_budget=10, max_sessions=10, max_total_tokens=1000, idle_ttl=0)
+    for text in ["a" * 16, "b" * 16, "c" * 16]:  # 4 tokens each
+        store.append("s", "user", text)
+    assert contents(store, "s") == ["b" * 16, "c" * 16]
+    assert store.stats()["total_tokens"] == 8
+
+    # 单条消息超出预算时仍然保留
+    store.append("s", "user", "d" * 80)
+    assert contents(store, "s") == ["d" * 80]
+    assert store.stats()["total_tokens"] == estimate_tokens("d" * 80)
+
+
+def test_least_recently_used_session_is_evicted():
+    store = ConversationStore(session_token_budget=100, max_sessions=2, max_total_tokens=1000, idle_ttl=0)
+    store.append("a", "user", "hello")
+    store.append("b", "user", "hello")
+    store.get_history("a")  # a 变为最近使用
+    store.append("c", "user", "hello")
+    assert contents(store, "b") == []
+    assert contents(store, "a") == ["hello"]
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["sessions"] == 2
+
+
+def test_total_token_limit_evicts_other_sessions_then_trims_the_current_one():
+    store = ConversationStore(session_token_budget=100, max_sessions=10, max_total_tokens=10, idle_ttl=0)
+    store.append("a", "user", "x" * 24)  # 6 tokens
+    store.append("b", "user", "y" * 24)
+    assert contents(store, "a") == []
+    assert store.stats()["total_tokens"] == 6
+
+    store.append("b", "assistant", "z" * 24)
+    assert contents(store, "b") == ["z" * 24]
+    assert store.stats()["total_tokens"] == 6
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(deepseek_service.time, "time", lambda: now[0])
+    store = ConversationStore(session_token_budget=100, max_sessions=10, max_total_tokens=1000, idle_ttl=60)
+    store.append("old", "user", "hello")
+    now[0] += 30
+    store.append("new", "user", "hello")
+    now[0] += 45
+    assert contents(store, "old") == []
+    assert contents(store, "new") == ["hello"]
+    assert store.stats()["total_tokens"] == estimate_tokens("hello")
+
+
+def test_history_with_does_not_store_and_append_turn_stores_both():
+    store = ConversationStore(session_token_budget=10, max_sessions=10, max_total_tokens=1000, idle_ttl=0)
+    store.append_turn("s", ("user", "a" * 16), ("assistant", "b" * 16))
+    preview = store.history_with("s", "user", "c" * 16)
+    assert [m["content"] for m in preview] == ["b" * 16, "c" * 16]
+    assert contents(store, "s") == ["a" * 16, "b" * 16]
+    assert store.stats()["total_tokens"] == 8
+
+
+def test_failed_reply_leaves_no_orphan_user_message(monkeypatch):
+    service = deepseek_service.chat_service
+    monkeypatch.setattr(service, "conversations", ConversationStore(idle_ttl=0))
+    monkeypatch.setattr(service, "api_key_loaded", True)
+    monkeypatch.setattr(service.health, "status", "healthy")
+    monkeypatch.setattr(service.health, "ensure_started", lambda: None)
+    sent = []
+
+    monkeypatch.setattr(service, "_request_completion", lambda messages: sent.append(messages))
+    service.send_message("first try", "s")
+    assert contents(service.conversations, "s") == []
+
+    monkeypatch.setattr(service, "_request_completion", lambda messages: sent.append(messages) or "reply")
+    service.send_message("first try", "s")
+    service.send_message("follow-up", "s")
+    assert [m["role"] for m in sent[-1]] == ["system", "user", "assistant", "user"]
+    assert contents(service.conversations, "s") == ["first try", "reply", "follow-up", "reply"]
@@ -0,0 +1,97 @@
+"""CrawlCache fresh/stale/expired transitions and the disk backend's entry limit
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import crawl_cache
+from crawl_cache import CrawlCache, normalize_url, FRESH, STALE, EXPIRED, MISS
+from response_cache import MemoryCacheBackend, DiskCacheBackend
+
+URL = "https://example.edu/programs/cs"
+HEADERS = {"ETag": '"v1"', "Last-Modified": "Wed, 01 Oct 2025 00:00:00 GMT"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(crawl_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache():
+    return CrawlCache(MemoryCacheBackend(max_entries=100), ttl=100, stale_ttl=50, max_age=1000)
+
+
+def test_entry_goes_fresh_stale_expired_then_miss(cache, clock):
+    assert cache.lookup(URL) == (None, MISS)
+    cache.store(URL, {"title": "CS"}, HEADERS)
+    states = []
+    for age in (0, 99, 100, 149, 150, 999, 1001):
+        clock[0] = 1_000_000.0 + age
+        entry, state = cache.lookup(URL)
+        states.append(state)
+    assert states == [FRESH, FRESH, STALE, STALE, EXPIRED, EXPIRED, MISS]
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["expired"], stats["misses"]) == (2, 2, 2, 2)
+
+
+def test_not_modified_resets_age_without_changing_the_entry(cache, clock):
+    stored = cache.store(URL, {"title": "CS"}, HEADERS)
+    clock[0] += 120
+    entry, state = cache.lookup(URL)
+    assert state == STALE
+    assert cache.conditional_headers(entry) == {"If-None-Match": '"v1"', "If-Modified-Since": HEADERS["Last-Modified"]}
+
+    cache.revalidated(URL, entry)
+    entry, state = cache.lookup(URL)
+    assert state == FRESH
+    assert entry["value"] == {"title": "CS"} and entry["fetched_at"] == stored["fetched_at"]
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_no_store_response_removes_the_entry(cache, clock):
+    cache.store(URL, {"title": "CS"}, HEADERS)
+    assert cache.store(URL, {"title": "CS"}, {"Cache-Control": "private, no-store"}, revalidating=True) is None
+    assert cache.lookup(URL) == (None, MISS)
+
+
+def test_only_one_background_revalidation_per_url(cache):
+    assert cache.claim_revalidation(URL)
+    assert not cache.claim_revalidation(URL + "#section")
+    assert cache.stats()["revalidations_in_flight"] == 1
+    cache.release_revalidation(URL)
+    assert cache.claim_revalidation(URL)
+
+
+def test_equivalent_urls_share_an_entry(cache):
+    cache.store("HTTPS://Example.EDU:443/p?b=2&a=1&utm_source=x#top", {"title": "P"}, {})
+    entry, state = cache.lookup("https://example.edu/p?a=1&b=2")
+    assert state == FRESH and entry["value"] == {"title": "P"}
+    assert normalize_url("http://example.edu") == "http://example.edu/"
+    assert normalize_url("http://example.edu:8080/x") != normalize_url("http://example.edu/x")
+
+
+def test_disk_backend_stays_within_max_entries(tmp_path):
+    backend = DiskCacheBackend(str(tmp_path), max_entries=50, rescan_every=16)
+    for i in range(400):
+        backend.set(f"k{i}", {"i": i}, ttl=60)
+        assert len(backend) <= 50
+    assert backend.get("k399") == {"i": 399}
+    assert backend.evictions == 400 - len(backend)
+
+
+def test_disk_backend_notices_entries_written_by_another_process(tmp_path):
+    ours = DiskCacheBackend(str(tmp_path), max_entries=50, rescan_every=16)
+    theirs = DiskCacheBackend(str(tmp_path), max_entries=1000)
+    ours.set("first", 1, ttl=60)
+    for i in range(200):
+        theirs.set(f"other{i}", i, ttl=60)
+    for i in range(16):
+        ours.set(f"k{i}", i, ttl=60)
+    assert len(ours) <= 50
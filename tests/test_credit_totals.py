@@ -0,0 +1,68 @@
+"""Enrollment.credit_totals matches summing each student's enrollments in Python
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用内存数据库（迁移会写入种子课程），不触碰 instance/ 下的数据库文件
+os.environ['DATABASE_URI'] = 'sqlite:///:memory:'
+
+import pytest
+import models
+from app import app
+from models import db, Course, Student, Enrollment
+
+STATUSES = ["planned", "in-progress", "completed"]
+
+
+@pytest.fixture(scope="module")
+def student_ids():
+    """几个学生及随机的选课记录（包括没有选课的学生和重复选同一门课的情况）"""
+    rng = random.Random(18)
+    with app.app_context():
+        courses = Course.query.all()
+        ids = []
+        for n in range(12):
+            student = Student(username=f"credit-test-{n}", email=f"credit-test-{n}@example.com", major="CS")
+            db.session.add(student)
+            db.session.flush()
+            ids.append(student.id)
+            for _ in range(rng.randint(0, 8) if n else 0):
+                db.session.add(Enrollment(student_id=student.id, course_id=rng.choice(courses).id,
+                                          semester="Fall 2025", status=rng.choice(STATUSES)))
+        db.session.commit()
+    return ids
+
+
+def reference_totals(student_id):
+    totals = {}
+    for enrollment in Enrollment.query.filter_by(student_id=student_id).all():
+        totals[enrollment.status] = totals.get(enrollment.status, 0) + enrollment.course.credits
+    return totals
+
+
+def test_credit_totals_match_per_enrollment_sums(student_ids, monkeypatch):
+    monkeypatch.setattr(models, "IN_QUERY_CHUNK", 5)  # 多个分块
+    with app.app_context():
+        totals = Enrollment.credit_totals(student_ids + [10 ** 9])
+        assert totals[student_ids[0]] == {}
+        assert totals[10 ** 9] == {}
+        for student_id in student_ids:
+            assert totals[student_id] == reference_totals(student_id)
+
+
+def test_batch_progress_matches_single_endpoint(student_ids):
+    client = app.test_client()
+    response = client.post('/api/students/progress', json={"student_ids": student_ids + [10 ** 9, student_ids[0]]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["missing"] == [10 ** 9]
+    assert sorted(body["progress"]) == sorted(str(i) for i in student_ids)
+    for student_id in student_ids:
+        single = client.get(f'/api/student/{student_id}/progress').get_json()
+        assert body["progress"][str(student_id)] == single
+    assert body["progress"][str(student_ids[0])]["completion_percentage"] == 0
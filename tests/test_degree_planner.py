@@ -0,0 +1,91 @@
+"""DegreePlanner produces valid plans within its reported bounds
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用内存数据库（迁移会写入种子课程），不触碰 instance/ 下的数据库文件
+os.environ['DATABASE_URI'] = 'sqlite:///:memory:'
+
+import pytest
+from prereq_graph import PrerequisiteGraph
+from ml_service import DegreePlanner
+
+
+def planner_for(prerequisites):
+    return DegreePlanner(PrerequisiteGraph(prerequisites))
+
+
+def check_valid(plan, prerequisites, completed, credit_limit):
+    """每门课程只出现一次，先修课程在更早的学期或已完成，且每学期不超过学分上限"""
+    semester_of = {}
+    for s, semester in enumerate(plan["semesters"]):
+        assert semester["credits"] == sum(c["credits"] for c in semester["courses"]) <= credit_limit
+        for course in semester["courses"]:
+            assert course["code"] not in semester_of
+            semester_of[course["code"]] = s
+    for code, s in semester_of.items():
+        for prereq in prerequisites.get(code, []):
+            assert prereq in completed or semester_of[prereq] < s
+    assert plan["num_semesters"] == len(plan["semesters"]) >= plan["lower_bound_semesters"]
+    return semester_of
+
+
+def test_prerequisite_chain_takes_one_semester_per_course():
+    plan = planner_for({"B": ["A"], "C": ["B"]}).plan(["C"], credit_limit=30, start_term="Fall 2025")
+    assert [[c["code"] for c in s["courses"]] for s in plan["semesters"]] == [["A"], ["B"], ["C"]]
+    assert [s["term"] for s in plan["semesters"]] == ["Fall 2025", "Spring 2026", "Fall 2026"]
+    assert plan["num_semesters"] == plan["lower_bound_semesters"] == 3
+
+
+def test_credit_limit_bound_is_met_for_independent_courses():
+    prerequisites = {f"X{i}": [] for i in range(7)}
+    plan = planner_for(prerequisites).plan(list(prerequisites), credit_limit=9)
+    check_valid(plan, prerequisites, set(), 9)
+    assert plan["total_credits"] == 21
+    assert plan["num_semesters"] == plan["lower_bound_semesters"] == 3
+
+
+def test_completed_courses_are_skipped_and_missing_prerequisites_added():
+    prerequisites = {"B": ["A"], "C": ["B", "D"], "D": []}
+    plan = planner_for(prerequisites).plan(["C", "ZZ999"], completed=["A"], credit_limit=6)
+    semester_of = check_valid(plan, prerequisites, {"A"}, 6)
+    assert set(semester_of) == {"B", "C", "D"}
+    assert plan["unknown_courses"] == ["ZZ999"]
+
+
+def test_course_over_the_credit_limit_is_rejected():
+    with pytest.raises(ValueError, match="CS101"):
+        planner_for({"CS101": []}).plan(["CS101"], credit_limit=3, credits={"CS101": 4})
+
+
+def test_random_catalogs_give_valid_plans():
+    rng = random.Random(12)
+    for _ in range(30):
+        codes = [f"C{i:02d}" for i in range(30)]
+        prerequisites = {code: rng.sample(codes[:i], min(i, rng.randint(0, 2))) for i, code in enumerate(codes)}
+        credits = {code: rng.choice([1, 3, 4]) for code in codes}
+        completed = set(rng.sample(codes, 5))
+        required = rng.sample(codes, 10)
+        limit = rng.choice([6, 12, 16])
+        planner = planner_for(prerequisites)
+        plan = planner.plan(required, completed=completed, credit_limit=limit, credits=credits)
+        semester_of = check_valid(plan, prerequisites, completed, limit)
+        assert sorted(semester_of) == planner.pending_courses(required, completed)
+
+
+@pytest.mark.parametrize("body", [
+    {"required_courses": "CS101"},
+    {"required_courses": ["CS101", 101]},
+    {"completed_courses": "CS101"},
+    {"major": ["CS"]},
+    {"credit_limit": 0},
+])
+def test_plan_endpoint_rejects_invalid_input(body):
+    from app import app
+    response = app.test_client().post('/api/plan', json=body)
+    assert response.status_code == 400
@@ -0,0 +1,76 @@
+"""Neighbor index backends: exact results, approximate recall and the backend contract
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from neighbor_index import create_index, _ApproximateIndex, IVFNeighborIndex
+
+
+def clustered(n=3000, dims=12, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 5, size=(clusters, dims))
+    return centers[rng.integers(clusters, size=n)] + rng.normal(0, 1, size=(n, dims))
+
+
+def brute_force(X, queries, k):
+    d = ((queries[:, None, :] - X[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(d, axis=1, kind='stable')[:, :k]
+
+
+def recall(found, expected):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+
+def test_exact_index_matches_brute_force():
+    X = clustered()
+    queries = X[:50] + 0.01
+    _, indices = create_index("exact").fit(X).kneighbors(queries, n_neighbors=10)
+    assert recall(indices, brute_force(X, queries, 10)) == 1.0
+
+
+@pytest.mark.parametrize("backend", ["ivf", "lsh"])
+def test_approximate_recall(backend):
+    X = clustered()
+    queries = clustered(n=100, seed=1)
+    expected = brute_force(X, queries, 10)
+    distances, indices = create_index(backend).fit(X).kneighbors(queries, n_neighbors=10)
+    assert recall(indices, expected) >= 0.9
+    # 返回的距离是真实距离，并按从近到远排列
+    true = np.sqrt(((queries[:, None, :] - X[indices]) ** 2).sum(axis=2))
+    assert np.allclose(distances, true)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+
+def test_ivf_probing_every_list_is_exact():
+    X = clustered()
+    queries = clustered(n=50, seed=2)
+    index = IVFNeighborIndex(n_lists=16).fit(X)
+    _, indices = index.kneighbors(queries, n_neighbors=10, n_probe=16)
+    assert recall(indices, brute_force(X, queries, 10)) == 1.0
+
+
+@pytest.mark.parametrize("backend", ["ivf", "lsh"])
+def test_sparse_candidates_fall_back_to_a_full_scan(backend):
+    X = clustered(n=200)
+    params = {"n_lists": 200, "n_probe": 1} if backend == "ivf" else {"n_bits": 48}
+    distances, indices = create_index(backend, **params).fit(X).kneighbors(X[:5] + 100, n_neighbors=10)
+    assert np.all(indices >= 0) and np.all(np.isfinite(distances))
+
+
+def test_backend_contract():
+    with pytest.raises(ValueError):
+        create_index("annoy")
+
+    class MissingCandidates(_ApproximateIndex):
+        def fit(self, X):
+            self._X = X
+            return self
+
+    with pytest.raises(TypeError):
+        MissingCandidates(10)
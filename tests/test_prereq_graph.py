@@ -0,0 +1,59 @@
+"""PrerequisiteGraph eligibility matches a plain set-based check
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from prereq_graph import PrerequisiteGraph
+
+
+def random_catalog(rng, n):
+    """随机的先修关系DAG：每门课程只依赖编号更小的课程"""
+    codes = [f"C{i:03d}" for i in range(n)]
+    prerequisites = {code: rng.sample(codes[:i], min(i, rng.randint(0, 3))) for i, code in enumerate(codes)}
+    return codes, prerequisites
+
+
+def reference_eligible(prerequisites, done, candidates):
+    return [code for code in candidates
+            if code not in done and all(p in done for p in prerequisites.get(code, []))]
+
+
+@pytest.mark.parametrize("n", [20, 200])  # 200门课程时走向量化路径（超过64个候选）
+def test_eligible_matches_set_reference(n):
+    rng = random.Random(n)
+    codes, prerequisites = random_catalog(rng, n)
+    graph = PrerequisiteGraph(prerequisites, codes)
+    for _ in range(50):
+        done = set(rng.sample(codes, rng.randint(0, n)))
+        candidates = rng.sample(codes, rng.randint(1, n))
+        found = [graph.codes[i] for i in graph.eligible(graph.mask(done), [graph.index[c] for c in candidates])]
+        assert found == reference_eligible(prerequisites, done, candidates)
+        for code in candidates:
+            assert graph.prerequisites_met(code, graph.mask(done)) == all(p in done for p in prerequisites[code])
+
+
+def test_unknown_courses_and_duplicate_edges():
+    graph = PrerequisiteGraph({"B": ["A", "A"], "C": ["B"]}, ["A", "B", "C"])
+    assert graph.mask(["A", "NOT_A_COURSE"]) == graph.mask(["A"])
+    assert graph.prerequisites_met("NOT_A_COURSE", 0)
+    assert graph.prereq_lists[graph.index["B"]] == [graph.index["A"]]
+    assert [graph.codes[i] for i in graph.eligible(graph.mask(["A"]), range(len(graph)))] == ["B"]
+    assert [graph.codes[i] for i in graph.eligible(0, range(len(graph)))] == ["A"]
+
+
+def test_topological_order_puts_prerequisites_first_and_detects_cycles():
+    rng = random.Random(7)
+    codes, prerequisites = random_catalog(rng, 100)
+    graph = PrerequisiteGraph(prerequisites, codes)
+    position = {graph.codes[i]: p for p, i in enumerate(graph.topological_order())}
+    assert len(position) == len(codes)
+    assert all(position[p] < position[code] for code, prereqs in prerequisites.items() for p in prereqs)
+
+    with pytest.raises(ValueError, match="cycle"):
+        PrerequisiteGraph({"A": ["B"], "B": ["A"]}).topological_order()
@@ -0,0 +1,74 @@
+"""The single-pass lxml extractor returns the same fields as the BeautifulSoup extractor
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from crawler_service import _extract_program_fields_soup
+from program_extractor import extract_program_fields, LXML_AVAILABLE, MAX_COURSES
+
+pytestmark = pytest.mark.skipif(not LXML_AVAILABLE, reason="lxml is not installed")
+
+FIELDS = ["title", "description", "courses", "requirements", "credits"]
+WORDS = ["Introduction", "Advanced", "Topics", "Systems", "Theory", "Design", "Analysis", "Programming"]
+
+PAGES = {
+    "empty": "",
+    "headings in order": "<html><body><h2>Overview of study</h2><h1>Hi</h1><h1>Mathematics, BA</h1></body></html>",
+    "title from keyword element": "<div><span>x</span><strong>Bachelor of Arts in History</strong></div>",
+    "keyword inside script is ignored": """<html><head><script>var program = "Computer Science degree";</script>
+        </head><body><p>The program overview: a long paragraph about the degree and what students learn in it.</p>
+        </body></html>""",
+    "description in nested element": """<p>Intro text <em>about the curriculum and its many fine courses</em>
+        continues here for a while.</p><p>Short program.</p>""",
+    "comments split text": """<p>Program <!-- note --> overview with enough words to be a description of it.</p>
+        <h3>Requirements</h3><ul><li>Admission requirement: a completed application</li>
+        <li>Prerequisite: MATH101</li></ul>""",
+    "list-item course fallback": """<h1>Nursing Program</h1><ul><li>Clinical Practice 1 with a long name</li>
+        <li>short 2</li><li>Anatomy and Physiology 2 (lab)</li></ul>""",
+    "credits variants": "<p>This degree requires 128 credits in total, or a minimum of 120 credits.</p>",
+    "entities and inline tags": """<h1>Computer&nbsp;Science &amp; Engineering</h1><p>CS 101 &ndash; Intro to
+        <b>Programming</b>; see also Data Structures (CS201) and MATH 221A: Calculus.</p>""",
+}
+
+
+def synthetic_page(num_courses, rng):
+    def words(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    courses = "".join(
+        f'<div class="courseblock"><p><strong>{rng.choice(["CS", "MATH", "ECE"])} {rng.randint(100, 499)} - '
+        f'{words(3)}</strong> ({rng.choice([3, 4])} credits)</p><p>Prerequisite: CS{rng.randint(100, 399)}. '
+        f'{words(20)}.</p></div>'
+        for _ in range(num_courses))
+    return f"""<!DOCTYPE html><html><head><title>Catalog</title><style>p {{ margin: 0 }}</style></head>
+<body><nav><ul>{"".join(f"<li><a href='#'>{words(2)}</a></li>" for _ in range(20))}</ul></nav>
+<h1>Computer Science, Bachelor of Science</h1>
+<h2>Overview</h2><p>The <strong>Computer Science program</strong> provides {words(30)}.</p>
+<h2>Degree Requirements</h2><p>Admission requirements include {words(12)}.</p>
+<ul>{"".join(f"<li>{words(5)} ({rng.randint(3, 12)} credits)</li>" for _ in range(8))}</ul>
+<div id="courses">{courses}</div><footer><script>track();</script></footer></body></html>"""
+
+
+def both(html, capsys):
+    old, new = _extract_program_fields_soup(html), extract_program_fields(html)
+    capsys.readouterr()  # 两个实现都会打印调试信息
+    return old, new
+
+
+@pytest.mark.parametrize("name", list(PAGES))
+def test_edge_cases_match_the_soup_extractor(name, capsys):
+    old, new = both(PAGES[name], capsys)
+    assert {field: new[field] for field in FIELDS} == {field: old[field] for field in FIELDS}
+
+
+@pytest.mark.parametrize("num_courses", [0, 5, 60])
+def test_synthetic_catalog_pages_match_the_soup_extractor(num_courses, capsys):
+    old, new = both(synthetic_page(num_courses, random.Random(num_courses)), capsys)
+    assert {field: new[field] for field in FIELDS} == {field: old[field] for field in FIELDS}
+    assert len(new["courses"]) <= MAX_COURSES
@@ -0,0 +1,52 @@
+"""/api/recommendations and /api/recommendations/batch must agree
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用内存数据库（迁移会写入种子课程），不触碰 instance/ 下的数据库文件
+os.environ['DATABASE_URI'] = 'sqlite:///:memory:'
+
+import pytest
+from app import app
+from ml_service import FALLBACK_COURSES
+
+STUDENTS = [
+    {"major": "CS", "completed_courses": []},
+    {"major": "CS", "completed_courses": ["CS101"]},
+    {"major": "CS", "completed_courses": ["CS101", "MATH101", "CS201"]},
+    {"major": "Data Science", "completed_courses": ["CS101"]},
+    {"major": "Underwater Basket Weaving", "completed_courses": []},
+    {"major": "Underwater Basket Weaving", "completed_courses": ["CS101"]},
+    {"major": "", "completed_courses": ["CS101"]},
+]
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_batch_matches_single_endpoint(client):
+    response = client.post('/api/recommendations/batch', json={"students": STUDENTS})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["index"] for line in lines] == list(range(len(STUDENTS)))
+
+    for student, line in zip(STUDENTS, lines):
+        single = client.post('/api/recommendations', json=student)
+        assert single.status_code == 200, student
+        assert single.get_json() == line["recommendations"], student
+
+
+def test_unknown_major_with_completed_courses_gets_fallback(client):
+    response = client.post('/api/recommendations', json={"major": "Underwater Basket Weaving",
+                                                         "completed_courses": ["CS101"]})
+    assert response.status_code == 200
+    codes = [course["code"] for course in response.get_json()]
+    # 只返回数据库中存在的课程，顺序与推荐顺序一致
+    assert codes and codes == [code for code in FALLBACK_COURSES[:5] if code in codes]
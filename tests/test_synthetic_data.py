@@ -0,0 +1,66 @@
+"""SyntheticStudentGenerator output is reproducible and respects prerequisites
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from feature_store import MAJORS, StudentFeatureStore
+from synthetic_data import build_catalog, SyntheticStudentGenerator, iter_npz_chunks, CHUNK_COLUMNS
+
+
+def make_generator(seed=42, chunk_size=64):
+    courses, prerequisites = build_catalog(seed)
+    return courses, prerequisites, SyntheticStudentGenerator(courses, prerequisites, seed=seed, chunk_size=chunk_size)
+
+
+def test_same_seed_gives_the_same_chunks():
+    _, _, first = make_generator()
+    _, _, second = make_generator()
+    for a, b in zip(first.iter_chunks(300), second.iter_chunks(300)):
+        for column in CHUNK_COLUMNS:
+            assert np.array_equal(a[column], b[column])
+    _, _, other = make_generator(seed=7)
+    assert not np.array_equal(next(first.iter_chunks(64))["course_ids"], next(other.iter_chunks(64))["course_ids"])
+
+
+def test_records_are_valid_students():
+    courses, prerequisites, generator = make_generator()
+    records = list(generator.iter_records(500))
+    assert [r["student_id"] for r in records] == list(range(1, 501))
+    for record in records:
+        groups = courses[record["major"]]
+        allowed = groups["core"] + groups["electives"] + groups["related"]
+        completed = record["completed_courses"]
+        assert len(set(completed)) == len(completed)
+        assert all(code in allowed for code in completed)
+        # 课程按选课顺序排列：每门课程的先修课程都在它之前
+        for position, code in enumerate(completed):
+            assert all(p in completed[:position] for p in prerequisites.get(code, []))
+        assert len(completed) <= int(record["semester"] * 1.5)
+        assert 1 <= record["semester"] <= 8 and 2.0 <= record["gpa"] <= 4.0
+        assert all(60 <= grade <= 100 for grade in record["grades"].values())
+    assert {r["major"] for r in records} == set(MAJORS)
+
+
+def test_feature_store_from_chunks_matches_from_records():
+    _, _, generator = make_generator()
+    from_chunks = StudentFeatureStore.from_chunks(generator.iter_chunks(300), generator.course_codes)
+    from_records = StudentFeatureStore.from_records(list(generator.iter_records(300)))
+    assert np.array_equal(from_chunks.design_matrix(), from_records.design_matrix())
+    assert all(from_chunks.completed_courses(i) == from_records.completed_courses(i) for i in range(300))
+
+
+def test_npz_round_trip(tmp_path):
+    _, _, generator = make_generator()
+    path = str(tmp_path / "students.npz")
+    generator.write_npz(path, 200)
+    loaded = list(iter_npz_chunks(path))
+    assert len(loaded) == 4
+    for (course_codes, chunk), expected in zip(loaded, generator.iter_chunks(200)):
+        assert course_codes == generator.course_codes
+        for column in CHUNK_COLUMNS:
+            assert np.array_equal(chunk[column], expected[column])
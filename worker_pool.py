@@ -0,0 +1,80 @@
+"""Process pools whose workers do not re-run the main script
+
+With the 'spawn' start method, multiprocessing makes every worker
+re-import the parent's __main__ module first. Under `python app.py` that
+means each parse or OCR worker repeats the whole app startup: loading the
+model, running migrations, building the chat service and resuming crawl
+jobs.
+
+create_process_pool() uses a spawn context whose workers are started
+without the main-module entry in their preparation data, so they import
+only the modules their task functions and initializer live in. Nothing in
+the parent process is changed. Task functions therefore must not be
+defined in the main script.
+
+On Windows the standard spawn context is used and workers still import
+the main script.
+"""
+import io
+import os
+import multiprocessing
+from multiprocessing import context, reduction, spawn, util
+from concurrent.futures import ProcessPoolExecutor
+
+# 子进程启动时会根据这两个键导入主模块
+_MAIN_KEYS = ('init_main_from_name', 'init_main_from_path')
+
+if os.name == 'posix':
+    from multiprocessing import popen_spawn_posix
+
+    class _WorkerPopen(popen_spawn_posix.Popen):
+        """popen_spawn_posix.Popen without the main-module entry in the preparation data"""
+
+        def _launch(self, process_obj):
+            from multiprocessing import resource_tracker
+            tracker_fd = resource_tracker.getfd()
+            self._fds.append(tracker_fd)
+            prep_data = spawn.get_preparation_data(process_obj._name)
+            for key in _MAIN_KEYS:
+                prep_data.pop(key, None)
+            fp = io.BytesIO()
+            context.set_spawning_popen(self)
+            try:
+                reduction.dump(prep_data, fp)
+                reduction.dump(process_obj, fp)
+            finally:
+                context.set_spawning_popen(None)
+
+            parent_r = child_w = child_r = parent_w = None
+            try:
+                parent_r, child_w = os.pipe()
+                child_r, parent_w = os.pipe()
+                cmd = spawn.get_command_line(tracker_fd=tracker_fd, pipe_handle=child_r)
+                self._fds.extend([child_r, child_w])
+                self.pid = util.spawnv_passfds(spawn.get_executable(), cmd, self._fds)
+                self.sentinel = parent_r
+                with open(parent_w, 'wb', closefd=False) as f:
+                    f.write(fp.getbuffer())
+            finally:
+                self.finalizer = util.Finalize(self, util.close_fds,
+                                               [fd for fd in (parent_r, parent_w) if fd is not None])
+                for fd in (child_r, child_w):
+                    if fd is not None:
+                        os.close(fd)
+
+    class _WorkerProcess(context.SpawnProcess):
+        @staticmethod
+        def _Popen(process_obj):
+            return _WorkerPopen(process_obj)
+
+    class _WorkerContext(context.SpawnContext):
+        Process = _WorkerProcess
+
+    _worker_context = _WorkerContext()
+else:
+    _worker_context = multiprocessing.get_context('spawn')
+
+
+def create_process_pool(max_workers, initializer=None):
+    """spawn进程池；工作进程不导入主模块"""
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, mp_context=_worker_context)